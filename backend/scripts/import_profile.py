@@ -0,0 +1,130 @@
+"""
+Informe de coste de importación (cold start) por handler.
+
+Importa cada backend/src/handlers/<handler>/app.py en un proceso nuevo con
+`python -X importtime`, con el layer (dependencies/python) en el path como en
+Lambda, y lista el coste acumulado (propio + dependencias) de cada módulo
+que arrastra el import.
+
+Uso:
+    python backend/scripts/import_profile.py                  # todos los handlers
+    python backend/scripts/import_profile.py lambda_dynamo --top 15
+    python backend/scripts/import_profile.py --json > import-times.json
+    python backend/scripts/import_profile.py --env XRAY_ENABLED=false
+
+Las variables de entorno que los handlers leen al importar (TABLE_NAME, ...)
+tienen valores ficticios; ningún import hace llamadas de red.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[2]
+HANDLERS_DIR = ROOT / "backend" / "src" / "handlers"
+LAYER_DIR = ROOT / "dependencies" / "python"
+
+DUMMY_ENV = {
+    "AWS_DEFAULT_REGION": "us-east-1",
+    "AWS_REGION": "us-east-1",
+    "AWS_ACCESS_KEY_ID": "profile",
+    "AWS_SECRET_ACCESS_KEY": "profile",
+    "TABLE_NAME": "profile-table",
+    "CONNECTIONS_TABLE": "profile-connections",
+    "QUEUE_URL": "https://sqs.us-east-1.amazonaws.com/000000000000/profile",
+    # Sin daemon de X-Ray fuera de Lambda
+    "AWS_XRAY_CONTEXT_MISSING": "IGNORE_ERROR",
+}
+
+
+def find_handlers():
+    return sorted(str(p.parent.relative_to(HANDLERS_DIR)) for p in HANDLERS_DIR.glob("**/app.py"))
+
+
+def parse_importtime(stderr):
+    """
+    Líneas 'import time: self [us] | cumulative | módulo' -> lista de
+    (profundidad, módulo, self_us, cumulative_us). La sangría del nombre indica
+    quién importó a quién.
+    """
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3:
+            continue
+        raw_name = parts[2][1:]
+        depth = (len(raw_name) - len(raw_name.lstrip())) // 2
+        rows.append((depth, raw_name.strip(), int(parts[0]), int(parts[1])))
+    return rows
+
+
+def profile_handler(handler, extra_env=None):
+    env = dict(os.environ)
+    env.update(DUMMY_ENV)
+    env.update(extra_env or {})
+    handler_dir = HANDLERS_DIR / handler
+    env["PYTHONPATH"] = os.pathsep.join([str(handler_dir), str(LAYER_DIR)])
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app"],
+        cwd=handler_dir, env=env, capture_output=True, text=True,
+    )
+    rows = parse_importtime(proc.stderr)
+    error = None
+    if proc.returncode != 0:
+        lines = proc.stderr.strip().splitlines()
+        error = lines[-1] if lines else f"exit {proc.returncode}"
+
+    # Todo lo que cuelga de "import app" (los imports del arranque del intérprete no cuentan)
+    app_row = next((r for r in rows if r[0] == 0 and r[1] == "app"), None)
+    app_index = rows.index(app_row) if app_row else len(rows)
+    # -X importtime escribe cada módulo después de sus dependencias: las de app
+    # son el bloque con sangría justo antes de su línea
+    first = app_index
+    while first > 0 and rows[first - 1][0] > 0:
+        first -= 1
+    handler_rows = rows[first:app_index]
+    modules = sorted(
+        ({"module": name, "depth": depth, "self_ms": round(self_us / 1000, 2), "cumulative_ms": round(cum_us / 1000, 2)}
+         for depth, name, self_us, cum_us in handler_rows),
+        key=lambda r: r["cumulative_ms"], reverse=True,
+    )
+    return {
+        "handler": handler,
+        "total_ms": round(app_row[3] / 1000, 2) if app_row else None,
+        "modules": modules,
+        "error": error,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("handlers", nargs="*", help="handlers a perfilar (por defecto, todos)")
+    parser.add_argument("--top", type=int, default=10, help="módulos a mostrar por handler")
+    parser.add_argument("--json", action="store_true", help="salida JSON")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="variable de entorno extra para el import (repetible)")
+    args = parser.parse_args(argv)
+
+    extra_env = dict(item.split("=", 1) for item in args.env)
+    reports = [profile_handler(h, extra_env) for h in (args.handlers or find_handlers())]
+
+    if args.json:
+        print(json.dumps(reports, indent=2))
+        return 0
+
+    for report in sorted(reports, key=lambda r: r["total_ms"] or 0, reverse=True):
+        if report["error"]:
+            print(f"{report['handler']}: ERROR {report['error']}")
+            continue
+        print(f"{report['handler']}: {report['total_ms']:.1f} ms")
+        for row in report["modules"][:args.top]:
+            print(f"    {row['cumulative_ms']:9.1f} ms  {'  ' * (row['depth'] - 1)}{row['module']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+"""
+Redrive de una DLQ a su cola de origen desde la línea de comandos, con el
+mismo código que la función DlqRedriveFunction (router_common.redrive).
+
+Uso:
+    python backend/scripts/redrive_dlq.py https://sqs.../sqs-2-dlq --rate 100 --workers 8
+    python backend/scripts/redrive_dlq.py DLQ_URL --target https://sqs.../sqs-2 --max-messages 1000
+    python backend/scripts/redrive_dlq.py DLQ_URL --contains '"tenant": "acme"' --dry-run
+    python backend/scripts/redrive_dlq.py DLQ_URL --transform mymodule:fix_payload
+
+Sin --target, el destino es la cola cuya redrive policy apunta a la DLQ. Los
+mensajes se envían con sus MessageAttributes (ContentEncoding incluido) y
+solo se borran de la DLQ los que SQS confirma como enviados. Ctrl+C para la
+pasada: lo ya reenviado está borrado y el resto sigue en la DLQ.
+
+Credenciales y región: las habituales de boto3 (AWS_PROFILE, AWS_REGION...).
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(ROOT / "dependencies" / "python"))
+
+from router_common import redrive  # noqa: E402
+
+
+def _print_progress(stats):
+    print(
+        f"received={stats['received']} sent={stats['sent']} skipped={stats['skipped']} "
+        f"failed={stats['failed']} rate={stats['rate']}/s elapsed={stats['elapsedSeconds']}s",
+        file=sys.stderr,
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("dlq_url", help="URL de la DLQ")
+    parser.add_argument("--target", help="URL de la cola destino (por defecto, la de origen de la DLQ)")
+    parser.add_argument("--rate", type=float, default=redrive.REDRIVE_RATE, help="mensajes/s (<= 0 sin límite)")
+    parser.add_argument("--workers", type=int, default=redrive.REDRIVE_WORKERS, help="bucles de receive en paralelo")
+    parser.add_argument("--max-messages", type=int, help="procesar como mucho N mensajes de la DLQ")
+    parser.add_argument("--contains", help="solo los mensajes cuyo cuerpo decodificado contiene este texto")
+    parser.add_argument("--filter", help="filtro a medida: modulo:funcion(message) -> bool")
+    parser.add_argument("--transform", help="transformación: modulo:funcion(message) -> {Body, MessageAttributes} | None")
+    parser.add_argument("--delete-skipped", action="store_true", help="borrar de la DLQ los mensajes filtrados")
+    parser.add_argument("--dry-run", action="store_true", help="recibir y filtrar sin enviar ni borrar")
+    parser.add_argument("--visibility-timeout", type=int, help="segundos que los mensajes recibidos quedan ocultos")
+    parser.add_argument("--progress-seconds", type=float, default=5, help="intervalo del informe de progreso")
+    args = parser.parse_args(argv)
+
+    # Filtros y transformaciones a medida se importan desde el directorio actual
+    sys.path.insert(0, ".")
+    filters = []
+    if args.contains:
+        filters.append(redrive.contains(args.contains))
+    if args.filter:
+        filters.append(redrive.load_callable(args.filter))
+    keep = (lambda message: all(f(message) for f in filters)) if filters else None
+    transform = redrive.load_callable(args.transform) if args.transform else None
+
+    try:
+        stats = redrive.redrive(
+            args.dlq_url,
+            target_url=args.target,
+            rate=args.rate,
+            workers=args.workers,
+            keep=keep,
+            transform=transform,
+            delete_skipped=args.delete_skipped,
+            dry_run=args.dry_run,
+            max_messages=args.max_messages,
+            visibility_timeout=args.visibility_timeout,
+            progress=_print_progress,
+            progress_seconds=args.progress_seconds,
+        )
+    except KeyboardInterrupt:
+        print("Interrupted", file=sys.stderr)
+        return 130
+    print(json.dumps(stats, indent=2))
+    return 1 if stats["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
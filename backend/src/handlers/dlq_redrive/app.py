@@ -0,0 +1,85 @@
+import json
+import os
+
+from router_common import clients, logs, metrics, redrive
+
+logger = logs.get_logger("dlq_redrive")
+
+# DLQ y cola destino por defecto (el evento puede indicar otras)
+DLQ_URL = os.environ.get("DLQ_URL")
+TARGET_QUEUE_URL = os.environ.get("TARGET_QUEUE_URL")
+# Margen antes del timeout de Lambda para terminar los lotes en curso
+TIME_MARGIN_SECONDS = int(os.environ.get("REDRIVE_TIME_MARGIN_SECONDS", "30"))
+# Si la DLQ no quedó vacía al agotarse el tiempo, la función se vuelve a invocar (asíncrona)
+REDRIVE_CONTINUE = os.environ.get("REDRIVE_CONTINUE", "true").lower() == "true"
+
+
+def _progress(stats):
+    logger.info("Redrive progress", extra={"redrive": {k: v for k, v in stats.items() if k != "errors"}})
+
+
+@metrics.handler("dlq_redrive")
+@logs.handler(logger)
+def lambda_handler(event, context):
+    """
+    Evento (todos opcionales):
+        {"dlqUrl", "targetUrl", "rate", "workers", "maxMessages",
+         "contains": "texto", "filter": "modulo:funcion", "transform": "modulo:funcion",
+         "deleteSkipped": false, "dryRun": false, "continue": true}
+    """
+    event = event or {}
+    dlq_url = event.get("dlqUrl") or DLQ_URL
+    if not dlq_url:
+        raise ValueError("dlqUrl is required (event or DLQ_URL)")
+
+    filters = []
+    if event.get("contains"):
+        filters.append(redrive.contains(event["contains"]))
+    if event.get("filter"):
+        filters.append(redrive.load_callable(event["filter"]))
+    keep = (lambda message: all(f(message) for f in filters)) if filters else None
+    transform = redrive.load_callable(event["transform"]) if event.get("transform") else None
+
+    time_limit = None
+    if context is not None:
+        time_limit = max(1, context.get_remaining_time_in_millis() / 1000 - TIME_MARGIN_SECONDS)
+
+    stats = redrive.redrive(
+        dlq_url,
+        target_url=event.get("targetUrl") or TARGET_QUEUE_URL,
+        rate=event.get("rate"),
+        workers=event.get("workers"),
+        keep=keep,
+        transform=transform,
+        delete_skipped=bool(event.get("deleteSkipped")),
+        dry_run=bool(event.get("dryRun")),
+        max_messages=event.get("maxMessages"),
+        time_limit=time_limit,
+        progress=_progress,
+    )
+
+    m = metrics.current()
+    m.records_in(stats["received"])
+    m.records_out(stats["sent"])
+    if stats["failed"]:
+        m.count("RedriveFailures", stats["failed"])
+    if stats["errors"]:
+        logger.warning("Redrive errors (first %d)", len(stats["errors"]), extra={"errors": stats["errors"]})
+
+    # Pasada cortada por tiempo: se continúa en otra invocación con lo que quede
+    # (no si se abortó por errores de receive: volvería a fallar)
+    max_messages = event.get("maxMessages")
+    remaining = None if max_messages is None else max_messages - stats["received"]
+    if (not stats["drained"] and not stats["aborted"] and not event.get("dryRun")
+            and event.get("continue", REDRIVE_CONTINUE)
+            and (remaining is None or remaining > 0) and context is not None):
+        next_event = dict(event, dlqUrl=dlq_url, maxMessages=remaining, **{"pass": event.get("pass", 1) + 1})
+        clients.client("lambda").invoke(
+            FunctionName=context.invoked_function_arn,
+            InvocationType="Event",
+            Payload=json.dumps(next_event).encode("utf-8"),
+        )
+        logger.info("DLQ not drained; continuing in pass %d", next_event["pass"])
+        stats["continued"] = True
+
+    return stats
@@ -1,18 +1,18 @@
 import os
 import json
-import boto3
 import uuid
 import time
-import logging
 
-from aws_xray_sdk.core import xray_recorder, patch_all
-patch_all()
+from router_common import clients, xray
+xray.patch(("botocore",))
 
-# Logger
-logger = logging.getLogger()
-logger.setLevel(logging.INFO)
+from router_common import codec, envelope, logs, metrics
+from router_common.hops import HopRecorder
 
-sqs = boto3.client("sqs")
+# Logger JSON (nivel: LOG_LEVEL_EB_TO_SQS2 / LOG_LEVEL)
+logger = logs.get_logger("eb_to_sqs2")
+
+sqs = clients.client("sqs")
 QUEUE_URL = os.environ.get("QUEUE_URL")
 
 # Configuración de reintentos para send_message_batch
@@ -28,7 +28,7 @@ def send_batch_with_retries(entries):
     """
     # Intento inicial
     resp = sqs.send_message_batch(QueueUrl=QUEUE_URL, Entries=entries)
-    logger.info("send_message_batch response: %s", json.dumps(resp, ensure_ascii=False))
+    logger.debug("send_message_batch response: %s", logs.payload(resp))
     failed = resp.get("Failed", [])
     successful = resp.get("Successful", [])
 
@@ -52,12 +52,13 @@ def send_batch_with_retries(entries):
         if not retry_entries:
             break
 
+        metrics.current().count("Retries", len(retry_entries))
         sleep_time = RETRY_BACKOFF_BASE * attempt
         logger.warning("Retrying %d failed entries (attempt %d) after %.2fs", len(retry_entries), attempt, sleep_time)
         time.sleep(sleep_time)
 
         resp_retry = sqs.send_message_batch(QueueUrl=QUEUE_URL, Entries=retry_entries)
-        logger.info("send_message_batch retry response (attempt %d): %s", attempt, json.dumps(resp_retry, ensure_ascii=False))
+        logger.debug("send_message_batch retry response (attempt %d): %s", attempt, logs.payload(resp_retry))
         accumulated_responses.append(resp_retry)
 
         # Calcular los fallos que persisten
@@ -67,6 +68,8 @@ def send_batch_with_retries(entries):
     # Al final, persistent_failed contiene los que no pudieron encolarse
     return accumulated_responses, persistent_failed
 
+@metrics.handler("eb_to_sqs2")
+@logs.handler(logger)
 def lambda_handler(event, context):
     if not QUEUE_URL:
         logger.error("QUEUE_URL no está configurada en las variables de entorno")
@@ -77,24 +80,22 @@ def lambda_handler(event, context):
 
     try:
         detail = event.get("detail", {})
-        # soportar tanto evento con detail.messages como un detail único
-        messages = detail.get("messages", [detail])
-
-        if not isinstance(messages, list):
-            messages = [messages]
-
-        # Normalizar messages a strings JSON si son dicts/otros
+        # EventBridge ya entrega el detail como objeto: el envelope del dispatcher.
+        # Se mantiene el formato anterior con detail.messages (varios mensajes)
+        if envelope.is_envelope(detail) or not isinstance(detail.get("messages"), list):
+            messages = [detail]
+        else:
+            messages = detail["messages"]
+
+        hop = HopRecorder("eb_to_sqs2")
+        m = metrics.current()
+        m.records_in(len(messages))
         normalized = []
-        for m in messages:
-            if isinstance(m, str):
-                # dejar tal cual
-                normalized.append(m)
-            else:
-                try:
-                    normalized.append(json.dumps(m, ensure_ascii=False))
-                except Exception:
-                    # si no se puede serializar, usar str()
-                    normalized.append(str(m))
+        for message in messages:
+            env = envelope.decode(message)
+            env.trace = hop.observe(env.trace) or env.trace
+            normalized.append(codec.encode_sqs(env.to_dict()))
+        hop.flush()
 
         # Crear lotes (batches) de hasta 10
         batches = [normalized[i:i+10] for i in range(0, len(normalized), 10)]
@@ -106,12 +107,9 @@ def lambda_handler(event, context):
             # Construir entries con Id único por batch
             entries = []
             for msg in batch:
-                entries.append({
-                    "Id": str(uuid.uuid4()),
-                    "MessageBody": msg
-                })
+                entries.append({"Id": str(uuid.uuid4()), **msg})
 
-            logger.info("Enviando batch con %d entries a SQS", len(entries))
+            logger.debug("Enviando batch con %d entries a SQS", len(entries))
             acc_responses, failed_entries = send_batch_with_retries(entries)
 
             # Registrar resultados de este batch
@@ -123,13 +121,14 @@ def lambda_handler(event, context):
             }
             all_batch_results.append(batch_summary)
 
+            m.records_out(len(entries) - len(failed_entries))
             if failed_entries:
                 # Añadir a la lista persistente para reportar
                 persistent_failures.extend(failed_entries)
 
         if persistent_failures:
             # Si hubo fallos persistentes, devolvemos 500 con detalles para debug/reintento
-            logger.error("Algunos mensajes fallaron de forma persistente y no se pudieron encolar: %s", json.dumps(persistent_failures, ensure_ascii=False))
+            logger.error("Algunos mensajes fallaron de forma persistente y no se pudieron encolar: %s", logs.payload(persistent_failures))
             return {
                 "statusCode": 500,
                 "body": json.dumps({
@@ -142,7 +141,7 @@ def lambda_handler(event, context):
             }
 
         # Todo enviado con éxito (tras reintentos si los hubo)
-        logger.info("Todos los batches enviados correctamente (%d batches)", len(all_batch_results))
+        logger.info("Todos los batches enviados correctamente", extra={"batches": len(all_batch_results), "records": len(messages)})
         return {
             "statusCode": 200,
             "body": json.dumps({
@@ -2,28 +2,60 @@
 import os
 import json
 import time
-import logging
 import uuid
 import urllib.parse
 import datetime
-import boto3
 import requests
+from requests.adapters import HTTPAdapter
 from requests.auth import HTTPBasicAuth
 from botocore.exceptions import ClientError
 
-from aws_xray_sdk.core import patch_all
-patch_all()
+from router_common import circuit_breaker, clients, idempotency, logs, metrics, secrets_cache, xray
+xray.patch(("botocore", "requests"))
 
-logger = logging.getLogger()
-logger.setLevel(logging.INFO)
+logger = logs.get_logger("index_to_opensearch")
 
-s3 = boto3.client("s3")
-secrets = boto3.client("secretsmanager")
+s3 = clients.client("s3")
 
 OPENSEARCH_ENDPOINT = os.environ.get("OPENSEARCH_ENDPOINT")
 OPENSEARCH_INDEX = os.environ.get("OPENSEARCH_INDEX", "messages")
+# Dónde se escribe cada documento:
+#   "single":   siempre en OPENSEARCH_INDEX (comportamiento original)
+#   "daily":    índices diarios OPENSEARCH_INDEX-YYYY.MM.DD según @timestamp
+#   "rollover": OPENSEARCH_INDEX es un alias de escritura que ISM va rotando
+OPENSEARCH_INDEX_MODE = os.environ.get("OPENSEARCH_INDEX_MODE", "single").lower()
+OPENSEARCH_SHARDS = int(os.environ.get("OPENSEARCH_SHARDS", "1"))
+OPENSEARCH_REPLICAS = int(os.environ.get("OPENSEARCH_REPLICAS", "1"))
+# refresh_interval alto = menos refrescos de segmentos durante la ingesta bulk
+OPENSEARCH_REFRESH_INTERVAL = os.environ.get("OPENSEARCH_REFRESH_INTERVAL", "30s")
+OPENSEARCH_ROLLOVER_MAX_SIZE = os.environ.get("OPENSEARCH_ROLLOVER_MAX_SIZE", "30gb")
+OPENSEARCH_ROLLOVER_MAX_AGE = os.environ.get("OPENSEARCH_ROLLOVER_MAX_AGE", "1d")
 MASTER_SECRET_ARN = os.environ.get("OPENSEARCH_MASTER_SECRET_ARN")
 
+# Bootstrap de saved objects (index-pattern, visualizaciones, saved search, dashboard).
+#   "container": se provisiona en el primer documento de cada contenedor y se vuelve a
+#                comprobar cuando expira el TTL del marcador.
+#   "event":     solo se provisiona con un evento explícito {"action": "bootstrap"}.
+SAVED_OBJECTS_BOOTSTRAP = os.environ.get("SAVED_OBJECTS_BOOTSTRAP", "container").lower()
+SAVED_OBJECTS_TTL_SECONDS = int(os.environ.get("SAVED_OBJECTS_TTL_SECONDS", "3600"))
+# Un paso fallido no se reintenta hasta pasados SAVED_OBJECTS_RETRY_SECONDS, el doble
+# con cada fallo seguido (máximo SAVED_OBJECTS_TTL_SECONDS): el index-pattern puede
+# tardar ~60 s en fallar y no debe bloquear cada lote
+SAVED_OBJECTS_RETRY_SECONDS = int(os.environ.get("SAVED_OBJECTS_RETRY_SECONDS", "30"))
+
+# Marcador por contenedor y paso: resultado, cuándo volver a comprobarlo y fallos seguidos
+SAVED_OBJECT_STEPS = ("index_template", "index_pattern_id", "dashboard_id")
+_saved_objects_marker = {step: {"value": None, "expires_at": 0.0, "failures": 0} for step in SAVED_OBJECT_STEPS}
+
+# Bulk API: límites por petición _bulk y reintentos de items rechazados
+BULK_MAX_DOCS = int(os.environ.get("BULK_MAX_DOCS", "500"))
+BULK_MAX_BYTES = int(os.environ.get("BULK_MAX_BYTES", str(5 * 1024 * 1024)))
+BULK_MAX_RETRIES = int(os.environ.get("BULK_MAX_RETRIES", "3"))
+BULK_RETRY_BACKOFF = float(os.environ.get("BULK_RETRY_BACKOFF", "0.5"))  # segundos (se duplica por intento)
+# Solo se reintentan los items rechazados por presión (429) o conflicto de versión (409)
+RETRYABLE_BULK_STATUSES = {409, 429}
+HTTP_POOL_SIZE = int(os.environ.get("HTTP_POOL_SIZE", "10"))
+
 # Cabeceras compatibles: kbn-xsrf (Kibana style) y osd-xsrf (OpenSearch Dashboards)
 XSFR_HEADERS = {
     "kbn-xsrf": "true",
@@ -31,55 +63,241 @@ XSFR_HEADERS = {
     "Content-Type": "application/json"
 }
 
+# Sesión HTTP keep-alive compartida por todo el contenedor
+def _build_http_session():
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+    session.mount("https://", adapter)
+    return session
+
+http = _build_http_session()
+
+# Con el dominio saturado (429/5xx, timeouts) se deja de enviar _bulk: el lote
+# vuelve a la cola SQS, que hace de cola de reintentos con su visibility timeout
+opensearch_breaker = circuit_breaker.CircuitBreaker("opensearch-bulk")
+
+# Notificaciones S3 ya indexadas (SQS entrega al menos una vez): se saltan sin GET ni _bulk
+index_guard = idempotency.Idempotency("index_to_opensearch")
+
 # ---------------- helpers ----------------
-def get_master_credentials():
+def get_master_credentials(force_refresh=False):
+    """Credenciales master desde la caché de secretos (TTL por contenedor)."""
     if not MASTER_SECRET_ARN:
         raise RuntimeError("OPENSEARCH_MASTER_SECRET_ARN no definido")
     try:
-        resp = secrets.get_secret_value(SecretId=MASTER_SECRET_ARN)
-        secret_string = resp.get("SecretString")
-        if not secret_string:
-            raise RuntimeError("SecretString vacío en Secrets Manager")
-        data = json.loads(secret_string)
+        data = secrets_cache.get_secret_json(MASTER_SECRET_ARN, force_refresh=force_refresh)
         username = data.get("username")
         password = data.get("password")
         if not username or not password:
             raise RuntimeError("Secret missing username/password")
-        logger.info("Master credentials fetched (username=%s)", username)
         return username, password
     except ClientError:
         logger.exception("Error leyendo secret")
         raise
 
+def get_master_auth(force_refresh=False):
+    username, password = get_master_credentials(force_refresh=force_refresh)
+    return HTTPBasicAuth(username, password)
+
+def _send_with_auth_refresh(method, url, auth=None, session=None, **kwargs):
+    """
+    Envía la petición con las credenciales cacheadas. Si OpenSearch responde 401
+    (p.ej. el secreto se rotó), fuerza el refresco del secreto y reintenta una vez.
+    La usan también los pasos de provisionamiento (session = la que reciben).
+    """
+    session = session or http
+    r = session.request(method, url, auth=auth or get_master_auth(), **kwargs)
+    if r.status_code == 401:
+        logger.warning("OpenSearch returned 401; refreshing master credentials")
+        r = session.request(method, url, auth=get_master_auth(force_refresh=True), **kwargs)
+    return r
+
 def index_document_basic(index_name, doc, doc_id=None, username=None, password=None):
     auth = None
     if username and password:
         auth = HTTPBasicAuth(username, password)
     if doc_id:
         url = f"https://{OPENSEARCH_ENDPOINT}/{index_name}/_doc/{doc_id}"
-        logger.info("Indexing (idempotent) to %s", url)
-        r = requests.put(url, auth=auth, json=doc, timeout=15, verify=True)
+        logger.debug("Indexing (idempotent) to %s", url)
+        r = _send_with_auth_refresh("PUT", url, auth=auth, json=doc, timeout=15, verify=True)
     else:
         url = f"https://{OPENSEARCH_ENDPOINT}/{index_name}/_doc"
-        logger.info("Indexing (auto-id) to %s", url)
-        r = requests.post(url, auth=auth, json=doc, timeout=15, verify=True)
+        logger.debug("Indexing (auto-id) to %s", url)
+        r = _send_with_auth_refresh("POST", url, auth=auth, json=doc, timeout=15, verify=True)
     r.raise_for_status()
     return r.json()
 
-def mapping_field_exists(session, auth, index, field):
+def build_bulk_chunks(actions, max_docs=BULK_MAX_DOCS, max_bytes=BULK_MAX_BYTES):
     """
-    Comprueba si un campo existe en el mapping del índice.
+    Agrupa acciones {"index", "id", "doc"} en cuerpos NDJSON para _bulk, limitados
+    por número de documentos y por bytes. Devuelve [(body_bytes, actions), ...].
     """
-    try:
-        url = f"https://{OPENSEARCH_ENDPOINT}/{index}/_mapping/field/{field}"
-        r = session.get(url, headers=XSFR_HEADERS, auth=auth, timeout=10, verify=True)
-        logger.info("field check %s status=%s", field, r.status_code)
-        if r.status_code == 200:
-            body = r.json()
-            return field in json.dumps(body)
-    except Exception as e:
-        logger.warning("mapping_field_exists exception: %s", e)
-    return False
+    chunks = []
+    lines = []
+    items = []
+    size = 0
+    for action in actions:
+        meta = {"_index": action["index"]}
+        if action.get("id"):
+            meta["_id"] = action["id"]
+        entry = (
+            json.dumps({"index": meta}) + "\n" + json.dumps(action["doc"], ensure_ascii=False) + "\n"
+        ).encode("utf-8")
+        if items and (len(items) >= max_docs or size + len(entry) > max_bytes):
+            chunks.append((b"".join(lines), items))
+            lines, items, size = [], [], 0
+        lines.append(entry)
+        items.append(action)
+        size += len(entry)
+    if items:
+        chunks.append((b"".join(lines), items))
+    return chunks
+
+def send_bulk(body):
+    url = f"https://{OPENSEARCH_ENDPOINT}/_bulk"
+    r = _send_with_auth_refresh("POST", url, data=body, headers={"Content-Type": "application/x-ndjson"}, timeout=30, verify=True)
+    r.raise_for_status()
+    return r.json()
+
+def bulk_index_documents(actions):
+    """
+    Indexa las acciones con _bulk y analiza el resultado de cada item.
+    Solo se reintentan (con backoff exponencial) los items rechazados con 429/409;
+    el resto de errores por item se devuelven sin reintentar.
+    Devuelve (indexed_count, failed) con failed = [(action, error), ...].
+    """
+    pending = list(actions)
+    indexed = 0
+    failed = []
+    attempt = 0
+    while pending:
+        retry = []
+        for body, items in build_bulk_chunks(pending):
+            resp = opensearch_breaker.call(send_bulk, body)
+            if not resp.get("errors"):
+                indexed += len(items)
+                continue
+            for action, result in zip(items, resp.get("items", [])):
+                op = result.get("index") or next(iter(result.values()), {})
+                status = op.get("status", 500)
+                if status < 300:
+                    indexed += 1
+                elif status in RETRYABLE_BULK_STATUSES and attempt < BULK_MAX_RETRIES:
+                    retry.append(action)
+                else:
+                    failed.append((action, op.get("error") or status))
+        if retry:
+            attempt += 1
+            sleep_time = BULK_RETRY_BACKOFF * (2 ** (attempt - 1))
+            logger.warning("Retrying %d rejected bulk items (attempt %d) after %.2fs", len(retry), attempt, sleep_time)
+            time.sleep(sleep_time)
+        pending = retry
+    logger.info("Bulk indexing done: indexed=%d failed=%d", indexed, len(failed))
+    return indexed, failed
+
+def resolve_write_index(doc):
+    """Índice (o alias) donde escribir el documento según OPENSEARCH_INDEX_MODE."""
+    if OPENSEARCH_INDEX_MODE == "daily":
+        day = None
+        ts = doc.get("@timestamp")
+        if isinstance(ts, str):
+            try:
+                day = datetime.datetime.fromisoformat(ts.replace("Z", "+00:00"))
+            except ValueError:
+                day = None
+        if day is None:
+            day = datetime.datetime.now(datetime.timezone.utc)
+        elif day.tzinfo is None:
+            # Sin offset se asume UTC, como @timestamp en OpenSearch
+            day = day.replace(tzinfo=datetime.timezone.utc)
+        # El día del índice es el de UTC, no el de la hora local del offset
+        return f"{OPENSEARCH_INDEX}-{day.astimezone(datetime.timezone.utc):%Y.%m.%d}"
+    return OPENSEARCH_INDEX
+
+def build_index_template():
+    """
+    Plantilla con mappings explícitos para todos los índices OPENSEARCH_INDEX*.
+    dynamic=false evita que campos arbitrarios inflen el mapping (siguen en _source).
+    """
+    text_with_keyword = {"type": "text", "fields": {"keyword": {"type": "keyword", "ignore_above": 256}}}
+    settings = {
+        "number_of_shards": OPENSEARCH_SHARDS,
+        "number_of_replicas": OPENSEARCH_REPLICAS,
+        "refresh_interval": OPENSEARCH_REFRESH_INTERVAL
+    }
+    if OPENSEARCH_INDEX_MODE == "rollover":
+        settings["plugins.index_state_management.rollover_alias"] = OPENSEARCH_INDEX
+    return {
+        "index_patterns": [f"{OPENSEARCH_INDEX}*"],
+        "priority": 100,
+        "template": {
+            "settings": settings,
+            "mappings": {
+                "dynamic": False,
+                "properties": {
+                    "@timestamp": {"type": "date"},
+                    "sender": {"type": "keyword"},
+                    "message": text_with_keyword,
+                    "eventType": {"type": "keyword"},
+                    "item": {
+                        "properties": {
+                            "MessageId": {"type": "keyword"},
+                            "Message": text_with_keyword
+                        }
+                    }
+                }
+            }
+        }
+    }
+
+def ensure_index_template(session, auth):
+    url = f"https://{OPENSEARCH_ENDPOINT}/_index_template/{OPENSEARCH_INDEX}-template"
+    r = _send_with_auth_refresh("PUT", url, session=session, auth=auth, json=build_index_template(), timeout=15, verify=True)
+    logger.info("put index template status=%s body=%s", r.status_code, r.text[:500])
+    return r.status_code in (200, 201)
+
+def ensure_rollover_alias(session, auth):
+    """
+    Crea la política ISM de rollover y el primer índice (OPENSEARCH_INDEX-000001)
+    con el alias de escritura, si el alias aún no existe.
+    """
+    policy_url = f"https://{OPENSEARCH_ENDPOINT}/_plugins/_ism/policies/{OPENSEARCH_INDEX}-rollover"
+    policy = {
+        "policy": {
+            "description": f"Rollover for {OPENSEARCH_INDEX}",
+            "default_state": "hot",
+            "states": [{
+                "name": "hot",
+                "actions": [{"rollover": {
+                    "min_primary_shard_size": OPENSEARCH_ROLLOVER_MAX_SIZE,
+                    "min_index_age": OPENSEARCH_ROLLOVER_MAX_AGE
+                }}],
+                "transitions": []
+            }],
+            "ism_template": [{"index_patterns": [f"{OPENSEARCH_INDEX}-*"], "priority": 100}]
+        }
+    }
+    r = _send_with_auth_refresh("PUT", policy_url, session=session, auth=auth, json=policy, timeout=15, verify=True)
+    logger.info("put ISM policy status=%s", r.status_code)
+    # 409: la política ya existe
+    if r.status_code not in (200, 201, 409):
+        return False
+
+    alias_url = f"https://{OPENSEARCH_ENDPOINT}/_alias/{OPENSEARCH_INDEX}"
+    if _send_with_auth_refresh("HEAD", alias_url, session=session, auth=auth, timeout=10, verify=True).status_code == 200:
+        return True
+    first_index = urllib.parse.quote(f"<{OPENSEARCH_INDEX}-000001>")
+    r = _send_with_auth_refresh(
+        "PUT",
+        f"https://{OPENSEARCH_ENDPOINT}/{first_index}",
+        session=session,
+        auth=auth,
+        json={"aliases": {OPENSEARCH_INDEX: {"is_write_index": True}}},
+        timeout=15,
+        verify=True
+    )
+    logger.info("create first rollover index status=%s body=%s", r.status_code, r.text[:500])
+    return r.status_code in (200, 201)
 
 def create_index_pattern_post(session, auth, title, time_field=None, attempts=6):
     url = f"https://{OPENSEARCH_ENDPOINT}/_dashboards/api/saved_objects/index-pattern"
@@ -89,7 +307,7 @@ def create_index_pattern_post(session, auth, title, time_field=None, attempts=6)
     for attempt in range(attempts):
         try:
             logger.info("Attempt %d: creating index-pattern '%s'", attempt+1, title)
-            r = session.post(url, headers=XSFR_HEADERS, auth=auth, json=payload, timeout=15, verify=True)
+            r = _send_with_auth_refresh("POST", url, session=session, headers=XSFR_HEADERS, auth=auth, json=payload, timeout=15, verify=True)
             logger.info("create_index_pattern status=%s body=%s", r.status_code, r.text[:1000])
             if r.status_code in (200, 201):
                 return r.json().get("id")
@@ -106,7 +324,7 @@ def find_index_pattern(session, auth, title):
     url = f"https://{OPENSEARCH_ENDPOINT}/_dashboards/api/saved_objects/_find"
     params = {"type": "index-pattern", "search": title, "search_fields": "title", "per_page": 100}
     try:
-        r = session.get(url, headers=XSFR_HEADERS, auth=auth, params=params, timeout=15, verify=True)
+        r = _send_with_auth_refresh("GET", url, session=session, headers=XSFR_HEADERS, auth=auth, params=params, timeout=15, verify=True)
         r.raise_for_status()
         for so in r.json().get("saved_objects", []):
             if so.get("attributes", {}).get("title") == title:
@@ -141,7 +359,7 @@ def create_visualization_histogram(session, auth, title, index_pattern_id, time_
             }
         }
     }
-    r = session.post(url, headers=XSFR_HEADERS, auth=auth, json=payload, timeout=15, verify=True)
+    r = _send_with_auth_refresh("POST", url, session=session, headers=XSFR_HEADERS, auth=auth, json=payload, timeout=15, verify=True)
     logger.info("create_visualization_histogram status=%s body=%s", r.status_code, r.text[:800])
     if r.status_code in (200, 201):
         return r.json().get("id")
@@ -175,7 +393,7 @@ def create_visualization_terms(session, auth, title, index_pattern_id, field):
             }
         }
     }
-    r = session.post(url, headers=XSFR_HEADERS, auth=auth, json=payload, timeout=15, verify=True)
+    r = _send_with_auth_refresh("POST", url, session=session, headers=XSFR_HEADERS, auth=auth, json=payload, timeout=15, verify=True)
     logger.info("create_visualization_terms status=%s body=%s", r.status_code, r.text[:800])
     if r.status_code in (200, 201):
         return r.json().get("id")
@@ -187,7 +405,7 @@ def find_visualization(session, auth, title):
     url = f"https://{OPENSEARCH_ENDPOINT}/_dashboards/api/saved_objects/_find"
     params = {"type": "visualization", "search": title, "search_fields": "title", "per_page": 100}
     try:
-        r = session.get(url, headers=XSFR_HEADERS, auth=auth, params=params, timeout=15, verify=True)
+        r = _send_with_auth_refresh("GET", url, session=session, headers=XSFR_HEADERS, auth=auth, params=params, timeout=15, verify=True)
         r.raise_for_status()
         for so in r.json().get("saved_objects", []):
             if so.get("attributes", {}).get("title") == title:
@@ -208,7 +426,7 @@ def create_saved_search(session, auth, title, index_pattern_id):
             })
         }
     }
-    r = session.post(url, headers=XSFR_HEADERS, auth=auth, json=payload, timeout=15, verify=True)
+    r = _send_with_auth_refresh("POST", url, session=session, headers=XSFR_HEADERS, auth=auth, json=payload, timeout=15, verify=True)
     logger.info("create_saved_search status=%s body=%s", r.status_code, r.text[:800])
     if r.status_code in (200, 201):
         return r.json().get("id")
@@ -220,7 +438,7 @@ def find_saved_search(session, auth, title):
     url = f"https://{OPENSEARCH_ENDPOINT}/_dashboards/api/saved_objects/_find"
     params = {"type": "search", "search": title, "search_fields": "title", "per_page": 100}
     try:
-        r = session.get(url, headers=XSFR_HEADERS, auth=auth, params=params, timeout=15, verify=True)
+        r = _send_with_auth_refresh("GET", url, session=session, headers=XSFR_HEADERS, auth=auth, params=params, timeout=15, verify=True)
         r.raise_for_status()
         for so in r.json().get("saved_objects", []):
             if so.get("attributes", {}).get("title") == title:
@@ -254,7 +472,7 @@ def create_dashboard_with_panels(session, auth, title, panels, index_pattern_id=
             "name": "indexPattern_0",
             "type": "index-pattern"
         })
-    r = session.post(url, headers=XSFR_HEADERS, auth=auth, json=payload, timeout=15, verify=True)
+    r = _send_with_auth_refresh("POST", url, session=session, headers=XSFR_HEADERS, auth=auth, json=payload, timeout=15, verify=True)
     logger.info("create_dashboard_with_panels status=%s body=%s", r.status_code, r.text[:1200])
     if r.status_code in (200, 201):
         return r.json().get("id")
@@ -266,7 +484,7 @@ def find_dashboard(session, auth, title):
     url = f"https://{OPENSEARCH_ENDPOINT}/_dashboards/api/saved_objects/_find"
     params = {"type": "dashboard", "search": title, "search_fields": "title", "per_page": 100}
     try:
-        r = session.get(url, headers=XSFR_HEADERS, auth=auth, params=params, timeout=15, verify=True)
+        r = _send_with_auth_refresh("GET", url, session=session, headers=XSFR_HEADERS, auth=auth, params=params, timeout=15, verify=True)
         r.raise_for_status()
         for so in r.json().get("saved_objects", []):
             if so.get("attributes", {}).get("title") == title:
@@ -275,53 +493,32 @@ def find_dashboard(session, auth, title):
         pass
     return None
 
-# ---------------- handler ----------------
-def lambda_handler(event, context):
-    logger.info("Event received: %s", json.dumps(event))
-
-    # parse bucket/key
-    bucket = event.get("bucket") or event.get("detail", {}).get("bucket", {}).get("name")
-    key = event.get("key") or event.get("detail", {}).get("object", {}).get("key")
-    logger.info("Parsed bucket=%s key=%s", bucket, key)
-
-    body_text = None
-    if bucket and key:
-        try:
-            resp = s3.get_object(Bucket=bucket, Key=key)
-            body_text = resp["Body"].read().decode("utf-8", errors="ignore")
-            logger.info("Read S3 object s3://%s/%s len=%d", bucket, key, len(body_text))
-        except Exception as e:
-            logger.exception("Error reading S3 object")
-            return {"status": "error_read_s3", "error": str(e)}
-
-    # get master creds
+# ---------------- saved objects bootstrap ----------------
+def provision_index_template(session, auth):
+    """Plantilla de índice (y alias de rollover) antes de que un documento cree el índice."""
     try:
-        username, password = get_master_credentials()
-    except Exception as e:
-        logger.exception("Cannot fetch master credentials")
-        return {"status": "error_secret", "error": str(e)}
-
-    auth = HTTPBasicAuth(username, password)
-    session = requests.Session()
+        template_ok = ensure_index_template(session, auth)
+        if template_ok and OPENSEARCH_INDEX_MODE == "rollover":
+            template_ok = ensure_rollover_alias(session, auth)
+        return template_ok
+    except Exception:
+        logger.exception("Error creating index template")
+        return False
 
-    # ensure index-pattern
+def provision_index_pattern(session, auth):
     index_pattern_title = OPENSEARCH_INDEX if OPENSEARCH_INDEX.endswith("*") else f"{OPENSEARCH_INDEX}*"
     idx_id = find_index_pattern(session, auth, index_pattern_title)
     if not idx_id:
         idx_id = create_index_pattern_post(session, auth, index_pattern_title, time_field='@timestamp')
     logger.info("Index-pattern id=%s", idx_id)
+    return idx_id
 
-    # create visualizations/dashboard but only if fields exist
+def provision_dashboard(session, auth, idx_id):
+    """Visualizaciones, saved search y dashboard ('sender' siempre está mapeado por la plantilla)."""
+    dash_id = None
     try:
         hist_id = find_visualization(session, auth, "Messages over time") or create_visualization_histogram(session, auth, "Messages over time", idx_id, time_field='@timestamp')
-        # Check if 'sender' field exists in mapping. If not, skip terms viz.
-        sender_field = "sender"
-        sender_exists = mapping_field_exists(session, auth, OPENSEARCH_INDEX, sender_field)
-        if not sender_exists:
-            logger.info("Field '%s' not present in mapping; will skip Terms visualization", sender_field)
-            terms_id = None
-        else:
-            terms_id = find_visualization(session, auth, "Top senders (sample)") or create_visualization_terms(session, auth, "Top senders (sample)", idx_id, field=sender_field)
+        terms_id = find_visualization(session, auth, "Top senders (sample)") or create_visualization_terms(session, auth, "Top senders (sample)", idx_id, field="sender")
 
         # ensure saved_search
         search_id = find_saved_search(session, auth, "Recent messages") or create_saved_search(session, auth, "Recent messages", idx_id)
@@ -341,29 +538,218 @@ def lambda_handler(event, context):
         logger.info("Dashboard id=%s", dash_id)
     except Exception:
         logger.exception("Error creating saved objects")
+    return dash_id
 
-    # index document: try to derive sender if missing, ensure @timestamp
-    if body_text:
+def _provision_step(step, force, provision, *args):
+    """
+    Ejecuta un paso como mucho una vez por TTL si tuvo éxito; si falló, no antes de
+    su backoff (SAVED_OBJECTS_RETRY_SECONDS * 2^(fallos-1)). Devuelve el valor cacheado
+    mientras tanto (None tras un fallo).
+    """
+    marker = _saved_objects_marker[step]
+    if not force and time.monotonic() < marker["expires_at"]:
+        return marker["value"]
+    value = provision(*args)
+    # Desde el final del intento: un fallo puede haber tardado ~60 s
+    now = time.monotonic()
+    if value:
+        marker.update(value=value, expires_at=now + SAVED_OBJECTS_TTL_SECONDS, failures=0)
+    else:
+        marker["failures"] += 1
+        delay = min(SAVED_OBJECTS_TTL_SECONDS, SAVED_OBJECTS_RETRY_SECONDS * 2 ** (marker["failures"] - 1))
+        logger.warning("Saved objects step %s failed; retrying in %ds", step, delay)
+        marker.update(value=None, expires_at=now + delay)
+    return value
+
+def saved_object_ids():
+    return {step: _saved_objects_marker[step]["value"] for step in SAVED_OBJECT_STEPS}
+
+def ensure_saved_objects(session, auth=None, force=False):
+    """
+    Crea (si no existen) la plantilla de índice, el alias de rollover, el index-pattern,
+    las visualizaciones, el saved search y el dashboard. Cada paso guarda su propio
+    marcador: lo que ya funcionó no se repite hasta el TTL, y lo que falló se reintenta
+    con backoff sin rehacer los demás. force (bootstrap explícito) ignora los marcadores.
+    Sin auth cada petición toma las credenciales de la caché de secretos; un 401 la
+    refresca (_send_with_auth_refresh) y las peticiones siguientes ya usan las nuevas.
+    """
+    _provision_step("index_template", force, provision_index_template, session, auth)
+    idx_id = _provision_step("index_pattern_id", force, provision_index_pattern, session, auth)
+    if idx_id:
+        _provision_step("dashboard_id", force, provision_dashboard, session, auth, idx_id)
+    return saved_object_ids()
+
+# ---------------- documents ----------------
+def extract_s3_refs(payload):
+    """
+    Devuelve [(bucket, key), ...] desde cualquiera de los formatos de entrada:
+    {"bucket", "key"} (Step Functions), evento EventBridge "Object Created"
+    o notificación S3 clásica (Records[].s3).
+    """
+    if not isinstance(payload, dict):
+        return []
+    bucket = payload.get("bucket") or payload.get("detail", {}).get("bucket", {}).get("name")
+    key = payload.get("key") or payload.get("detail", {}).get("object", {}).get("key")
+    if bucket and key:
+        return [(bucket, key)]
+    refs = []
+    for rec in payload.get("Records", []):
+        s3_info = rec.get("s3") if isinstance(rec, dict) else None
+        if s3_info:
+            refs.append((s3_info["bucket"]["name"], urllib.parse.unquote_plus(s3_info["object"]["key"])))
+    return refs
+
+def build_document(body_text):
+    """Convierte el contenido del objeto S3 en documento: deriva sender y asegura @timestamp."""
+    try:
+        doc = json.loads(body_text)
+    except Exception:
+        doc = {"message": body_text}
+    if not isinstance(doc, dict):
+        doc = {"message": doc}
+    # fill sender from common keys if missing
+    if "sender" not in doc:
+        for k in ("sender", "from", "senderId", "source", "user"):
+            if k in doc:
+                doc["sender"] = doc[k]
+                break
+    # ensure @timestamp
+    if "@timestamp" not in doc:
+        doc["@timestamp"] = datetime.datetime.now(datetime.timezone.utc).isoformat().replace("+00:00", "Z")
+    return doc
+
+def handle_sqs_batch(records):
+    """
+    Modo buffer: la cola SQS agrupa las notificaciones de S3 y aquí se indexan todas
+    con unas pocas llamadas _bulk. Devuelve batchItemFailures para los mensajes que fallen.
+    """
+    m = metrics.current()
+    m.records_in(len(records))
+    if opensearch_breaker.state == circuit_breaker.OPEN:
+        # Ni GET a S3 ni reservas de idempotencia: todo el lote se reintenta más tarde
+        logger.warning("Circuit %s is open; returning %d messages to the queue", opensearch_breaker.name, len(records))
+        return {"batchItemFailures": [{"itemIdentifier": r.get("messageId")} for r in records]}
+    actions = []
+    failed_ids = set()
+    reserved = {}
+    for record in records:
+        message_id = record.get("messageId")
         try:
+            refs = extract_s3_refs(json.loads(record.get("body") or "{}"))
+        except Exception:
+            logger.exception("Invalid SQS body for message %s", message_id)
+            failed_ids.add(message_id)
+            continue
+        if index_guard.enabled and refs:
+            try:
+                idem_key, previous = index_guard.begin(refs)
+            except idempotency.IdempotencyInProgressError:
+                # Otra invocación lo está indexando: que SQS lo vuelva a entregar
+                failed_ids.add(message_id)
+                continue
+            if previous is not None:
+                logger.debug("Message %s already indexed; skipping", message_id)
+                continue
+            reserved[message_id] = idem_key
+        for bucket, key in refs:
             try:
-                doc = json.loads(body_text)
+                resp = s3.get_object(Bucket=bucket, Key=key)
+                body_text = resp["Body"].read().decode("utf-8", errors="ignore")
             except Exception:
-                doc = {"message": body_text}
-            # fill sender from common keys if missing
-            if "sender" not in doc:
-                for k in ("sender", "from", "senderId", "source", "user"):
-                    if k in doc:
-                        doc["sender"] = doc[k]
-                        break
-            # ensure @timestamp
-            if "@timestamp" not in doc:
-                doc["@timestamp"] = datetime.datetime.utcnow().isoformat() + "Z"
+                logger.exception("Error reading S3 object s3://%s/%s", bucket, key)
+                failed_ids.add(message_id)
+                continue
+            doc = build_document(body_text)
+            actions.append({
+                "index": resolve_write_index(doc),
+                "id": urllib.parse.quote_plus(key),
+                "doc": doc,
+                "ref": message_id
+            })
+
+    if actions:
+        try:
+            if SAVED_OBJECTS_BOOTSTRAP == "container":
+                ensure_saved_objects(http)
+            with m.timer("BulkLatency"):
+                _, failed = bulk_index_documents(actions)
+            m.records_out(len(actions) - len(failed))
+            for action, error in failed:
+                logger.error("Bulk item failed id=%s error=%s", action["id"], error)
+                failed_ids.add(action["ref"])
+        except circuit_breaker.CircuitOpenError as e:
+            logger.warning("%s; returning the batch to the queue", e)
+            failed_ids.update(a["ref"] for a in actions)
+        except Exception:
+            logger.exception("Bulk indexing request failed")
+            failed_ids.update(a["ref"] for a in actions)
+
+    for message_id, idem_key in reserved.items():
+        if message_id in failed_ids:
+            index_guard.release(idem_key)
+        else:
+            index_guard.complete(idem_key, message_id)
+
+    logger.info("SQS batch processed: records=%d documents=%d failed_messages=%d", len(records), len(actions), len(failed_ids))
+    return {"batchItemFailures": [{"itemIdentifier": mid} for mid in failed_ids]}
+
+# ---------------- handler ----------------
+@metrics.handler("index_to_opensearch")
+@logs.handler(logger)
+def lambda_handler(event, context):
+    logger.debug("Event received: %s", logs.payload(event))
+
+    records = event.get("Records") or []
+    if records and records[0].get("eventSource") == "aws:sqs":
+        return handle_sqs_batch(records)
+
+    # Provisionamiento explícito: {"action": "bootstrap"} (p.ej. tras un deploy)
+    if event.get("action") == "bootstrap":
+        try:
+            get_master_credentials()
+        except Exception as e:
+            logger.exception("Cannot fetch master credentials")
+            return {"status": "error_secret", "error": str(e)}
+        ids = ensure_saved_objects(http, force=True)
+        return {"status": "ok", **ids}
+
+    # parse bucket/key
+    bucket = event.get("bucket") or event.get("detail", {}).get("bucket", {}).get("name")
+    key = event.get("key") or event.get("detail", {}).get("object", {}).get("key")
+    logger.debug("Parsed bucket=%s key=%s", bucket, key)
+
+    body_text = None
+    if bucket and key:
+        try:
+            resp = s3.get_object(Bucket=bucket, Key=key)
+            body_text = resp["Body"].read().decode("utf-8", errors="ignore")
+            logger.debug("Read S3 object s3://%s/%s len=%d", bucket, key, len(body_text))
+        except Exception as e:
+            logger.exception("Error reading S3 object")
+            return {"status": "error_read_s3", "error": str(e)}
+
+    # get master creds
+    try:
+        username, password = get_master_credentials()
+    except Exception as e:
+        logger.exception("Cannot fetch master credentials")
+        return {"status": "error_secret", "error": str(e)}
+
+    # saved objects: una vez por contenedor (cacheado con TTL), no por documento
+    ids = saved_object_ids()
+    if SAVED_OBJECTS_BOOTSTRAP == "container":
+        ids = ensure_saved_objects(http)
+
+    # index document: try to derive sender if missing, ensure @timestamp
+    if body_text:
+        try:
+            doc = build_document(body_text)
             # idempotent id: s3 key
             doc_id = urllib.parse.quote_plus(key)
-            resp = index_document_basic(OPENSEARCH_INDEX, doc, doc_id=doc_id, username=username, password=password)
-            logger.info("Indexed document response: %s", resp)
+            resp = index_document_basic(resolve_write_index(doc), doc, doc_id=doc_id, username=username, password=password)
+            logger.debug("Indexed document response: %s", logs.payload(resp))
         except Exception:
             logger.exception("Error indexing document")
             return {"status":"error_indexing", "error": "see logs"}
 
-    return {"status":"ok", "index_pattern_id": idx_id, "dashboard_id": dash_id if 'dash_id' in locals() else None}
+    return {"status":"ok", "index_pattern_id": ids.get("index_pattern_id"), "dashboard_id": ids.get("dashboard_id")}
@@ -2,6 +2,110 @@ import { CloudWatchClient, GetMetricDataCommand } from "@aws-sdk/client-cloudwat
 
 const client = new CloudWatchClient({ region: "us-east-1" });
 
+const WINDOW_MS = 12 * 60 * 60 * 1000;
+const PERIOD_SECONDS = 300;
+// CloudWatch no tiene puntos nuevos antes del siguiente periodo de 60 s
+const REFRESH_INTERVAL_MS = 60 * 1000;
+
+/* --------------------- INCREMENTAL SERIES BUFFER ------------------- */
+// Por contenedor: Id de métrica -> { timestamps: number[] (ms, ordenados), values: number[],
+// fetchedThroughMs: hasta dónde se consultó (avanza aunque la serie no tenga puntos) }
+const seriesBuffers = new Map();
+let lastRefreshMs = 0;
+let lastQueryKey = "";
+
+// Sustituye el rango [startMs, ∞) por los puntos recién consultados
+const mergeSeries = (id, timestamps, values, startMs, windowStartMs, fetchedThroughMs) => {
+  const buf = seriesBuffers.get(id) ?? { timestamps: [], values: [] };
+  const incoming = timestamps
+    .map((ts, i) => [new Date(ts).getTime(), values[i]])
+    .sort((a, b) => a[0] - b[0]);
+
+  let keep = buf.timestamps.findIndex((ts) => ts >= startMs);
+  if (keep === -1) keep = buf.timestamps.length;
+  let drop = buf.timestamps.findIndex((ts) => ts >= windowStartMs);
+  if (drop === -1) drop = keep;
+  drop = Math.min(drop, keep);
+
+  const merged = {
+    timestamps: buf.timestamps.slice(drop, keep),
+    values: buf.values.slice(drop, keep),
+    fetchedThroughMs
+  };
+  for (const [ts, val] of incoming) {
+    if (ts < windowStartMs) continue;
+    if (merged.timestamps.length && merged.timestamps[merged.timestamps.length - 1] === ts) {
+      merged.values[merged.values.length - 1] = val;
+      continue;
+    }
+    merged.timestamps.push(ts);
+    merged.values.push(val);
+  }
+  seriesBuffers.set(id, merged);
+};
+
+// Solo pide a CloudWatch lo posterior a la última consulta (menos un periodo)
+const refreshSeries = async (queries, now) => {
+  const nowMs = now.getTime();
+  const windowStartMs = nowMs - WINDOW_MS;
+  const queryKey = JSON.stringify(queries);
+
+  if (queryKey === lastQueryKey && nowMs - lastRefreshMs < REFRESH_INTERVAL_MS) {
+    return;
+  }
+  if (queryKey !== lastQueryKey) {
+    seriesBuffers.clear();
+  }
+
+  let startMs = nowMs;
+  for (const q of queries) {
+    const through = seriesBuffers.get(q.Id)?.fetchedThroughMs;
+    const from = through == null ? windowStartMs : through - q.MetricStat.Period * 1000;
+    startMs = Math.min(startMs, Math.max(windowStartMs, from));
+  }
+
+  const results = {};
+  let nextToken;
+  do {
+    const response = await client.send(
+      new GetMetricDataCommand({
+        StartTime: new Date(startMs),
+        EndTime: now,
+        MetricDataQueries: queries,
+        ScanBy: "TimestampAscending",
+        NextToken: nextToken
+      })
+    );
+    for (const r of response.MetricDataResults ?? []) {
+      results[r.Id] ??= { Timestamps: [], Values: [] };
+      results[r.Id].Timestamps.push(...(r.Timestamps ?? []));
+      results[r.Id].Values.push(...(r.Values ?? []));
+    }
+    nextToken = response.NextToken;
+  } while (nextToken);
+
+  for (const q of queries) {
+    const r = results[q.Id] ?? { Timestamps: [], Values: [] };
+    mergeSeries(q.Id, r.Timestamps, r.Values, startMs, windowStartMs, nowMs);
+  }
+  lastRefreshMs = nowMs;
+  lastQueryKey = queryKey;
+  console.log("Series refreshed from:", new Date(startMs).toISOString());
+};
+
+// MetricDataResults equivalentes a partir del buffer (ascendentes, opcionalmente > since)
+const bufferedResults = (queries, since) =>
+  queries.map((q) => {
+    const buf = seriesBuffers.get(q.Id) ?? { timestamps: [], values: [] };
+    const from = since == null ? 0 : buf.timestamps.findIndex((ts) => ts > since);
+    const start = from === -1 ? buf.timestamps.length : from;
+    return {
+      Id: q.Id,
+      Timestamps: buf.timestamps.slice(start).map((ts) => new Date(ts)),
+      Values: buf.values.slice(start)
+    };
+  });
+
 /* ----------------------------- HELPERS ----------------------------- */
 const corsHeaders = {
   "Access-Control-Allow-Origin": "*",
@@ -9,7 +113,7 @@ const corsHeaders = {
   "Access-Control-Allow-Methods": "GET,OPTIONS"
 };
 
-const metric = ({ id, namespace, name, stat = "Sum", period = 300, dimensions = [] }) => ({
+const metric = ({ id, namespace, name, stat = "Sum", period = PERIOD_SECONDS, dimensions = [] }) => ({
   Id: id,
   MetricStat: {
     Metric: {
@@ -48,8 +152,10 @@ const formatForFrontend = (results) => {
 
 const formatSNS = (metric) => {
   console.log("SNS metric:", metric);
+  // Series ascendentes: el valor más reciente es el último
+  const values = metric?.Values ?? [];
   return {
-    value: metric?.Values?.[0] ?? 0
+    value: values.length ? values[values.length - 1] : 0
   };
 };
 
@@ -97,12 +203,17 @@ export const handler = async (event) => {
   }
 
   const endTime = new Date();
-  const startTime = new Date(endTime.getTime() - 12 * 60 * 60 * 1000);
-  
-  console.log("Time range:", {
-    startTime: startTime.toISOString(),
-    endTime: endTime.toISOString()
-  });
+
+  // Delta: ?since=<ms> devuelve solo los puntos posteriores
+  const sinceParam = event.queryStringParameters?.since;
+  const since = sinceParam == null || sinceParam === "" ? null : Number(sinceParam);
+  if (since !== null && !Number.isFinite(since)) {
+    return {
+      statusCode: 400,
+      headers: corsHeaders,
+      body: JSON.stringify({ message: "'since' debe ser un timestamp en milisegundos" })
+    };
+  }
 
   const SNS_TOPIC_NAME = process.env.SNS_TOPIC_NAME || "MyTargetTopic";
   const SQS_QUEUE_NAME = process.env.SQS_QUEUE_NAME || "MyMessageQueue";
@@ -160,17 +271,17 @@ export const handler = async (event) => {
 
   console.log("Metric queries:", JSON.stringify(queries, null, 2));
 
-  const response = await client.send(
-    new GetMetricDataCommand({
-      StartTime: startTime,
-      EndTime: endTime,
-      MetricDataQueries: queries
-    })
-  );
-
-  console.log("CloudWatch response:", JSON.stringify(response, null, 2));
+  await refreshSeries(queries, endTime);
 
-  const payload = formatForFrontend(response.MetricDataResults);
+  const results = bufferedResults(queries, since);
+  const payload = formatForFrontend(results);
+  // El indicador SNS usa siempre el último valor conocido, aunque no haya delta
+  payload.sns = formatSNS(bufferedResults(queries, null).find((r) => r.Id === "snsPublished"));
+  payload.since = since;
+  payload.latestTimestamp = results.reduce(
+    (max, r) => r.Timestamps.reduce((m, ts) => Math.max(m, ts.getTime()), max),
+    since ?? 0
+  ) || null;
 
   return {
     statusCode: 200,
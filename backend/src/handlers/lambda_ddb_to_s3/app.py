@@ -1,21 +1,23 @@
 import os
 import json
-import boto3
-import logging
 from datetime import datetime
 from uuid import uuid4
 from decimal import Decimal
 from boto3.dynamodb.types import TypeDeserializer
 
-from aws_xray_sdk.core import xray_recorder, patch_all
-patch_all() 
+from router_common import clients, xray
+xray.patch(("botocore",))
 
-LOGGER = logging.getLogger()
-LOGGER.setLevel(logging.INFO)
+from router_common import idempotency, logs, metrics
+from router_common.hops import HopRecorder
 
-s3 = boto3.client('s3')
+LOGGER = logs.get_logger("lambda_ddb_to_s3")
+
+s3 = clients.client('s3')
 deserializer = TypeDeserializer()
 BUCKET = os.environ.get('S3_BUCKET')
+# Un objeto S3 por registro del stream, aunque Lambda reentregue el lote
+written = idempotency.Idempotency("lambda_ddb_to_s3")
 
 
 def _convert_decimals(obj):
@@ -48,11 +50,29 @@ def _make_id_from_keys(keys_map):
     return "_".join(parts)
 
 
+def _record_identity(record):
+    """eventID es único por registro del stream; sin él, clave + número de secuencia."""
+    ddb = record.get('dynamodb', {})
+    return record.get('eventID') or [record.get('eventName'), ddb.get('Keys'), ddb.get('SequenceNumber')]
+
+
+@metrics.handler("lambda_ddb_to_s3")
+@logs.handler(LOGGER)
 def lambda_handler(event, context):
-    LOGGER.info("Received event with %d records", len(event.get('Records', [])))
+    LOGGER.info("Received event", extra={"records": len(event.get('Records', []))})
+    hop = HopRecorder("lambda_ddb_to_s3")
+    m = metrics.current()
+    m.records_in(len(event.get('Records', [])))
     for record in event.get('Records', []):
+        idem_key = None
         try:
-            LOGGER.info("Record: %s", json.dumps(record, default=str))
+            LOGGER.debug("Record: %s", logs.payload(record))
+            if written.enabled:
+                idem_key, previous = written.begin(_record_identity(record))
+                if previous is not None:
+                    LOGGER.info("Duplicate stream record; already saved as %s", previous.get('result'))
+                    continue
+
             ev_type = record.get('eventName')
             ddb = record.get('dynamodb', {})
 
@@ -81,6 +101,12 @@ def lambda_handler(event, context):
             if not item_id:
                 item_id = str(uuid4())
 
+            # Hop latency since lambda_dynamo wrote the item (INSERT/MODIFY only)
+            if isinstance(item, dict) and isinstance(item.get('Trace'), dict):
+                trace = hop.observe(item['Trace'])
+                if trace:
+                    item['Trace'] = trace
+
             # Builds a content to save: if it is REMOVE, mark eliminated
             obj = {
                 'eventType': ev_type,
@@ -96,11 +122,19 @@ def lambda_handler(event, context):
                 Body=json.dumps(obj, default=str).encode('utf-8'),
                 ContentType='application/json'
             )
-            LOGGER.info("Saved to s3://%s/%s", BUCKET, key)
+            if idem_key:
+                written.complete(idem_key, key)
+            m.records_out()
+            LOGGER.debug("Saved to s3://%s/%s", BUCKET, key)
 
         except Exception as e:
             LOGGER.exception("Error processing record")
+            if idem_key:
+                written.release(idem_key)
+            hop.flush()
             raise
+
+    hop.flush()
     
     # Retorno con CORS para API Gateway (aunque normalmente no se usa)
     return {
@@ -1,46 +1,69 @@
 import os
 import json
-import boto3
 
-from aws_xray_sdk.core import xray_recorder, patch_all
-patch_all() 
+from router_common import clients, xray
+xray.patch(("botocore",))
+
+from router_common import codec, envelope, logs, metrics
+from router_common.hops import HopRecorder, new_trace
 
 # Cliente de EventBridge
-eventbridge = boto3.client('events')
+eventbridge = clients.client('events')
+logger = logs.get_logger("lambda_dispatcher")
 
+@metrics.handler("lambda_dispatcher")
+@logs.handler(logger)
 def lambda_handler(event, context):
-    print("=== LambdaDispatcher recibido ===")
-    print(json.dumps(event, indent=2))
+    # Solo se serializa en invocaciones con DEBUG (LOG_LEVEL_LAMBDA_DISPATCHER o muestreo)
+    logger.debug("Evento recibido: %s", logs.payload(event))
 
     entries = []
+    hop = HopRecorder("lambda_dispatcher")
+    m = metrics.current()
+    m.records_in(len(event.get('Records', [])))
 
     for record in event.get('Records', []):
         raw_body = record["body"]
-        print("Raw body de SQS:", raw_body)
+        logger.debug("Raw body de SQS: %s", logs.payload(raw_body))
 
-        # Convertir a JSON si es posible, si no enviar como texto plano
+        # Un solo decode: codificación del cuerpo (ContentEncoding) y después
+        # envelope, o el formato anterior / texto plano
         try:
-            data = json.loads(raw_body) #Convertido a dict
-        except json.JSONDecodeError:
-            print("No es JSON, enviando como texto plano")
-            data = {"message": raw_body}
+            env = envelope.decode(codec.decode_sqs(record), message_id=record.get("messageId"))
+        except ValueError as e:
+            # EnvelopeError/CodecError: reintentarlo no lo arregla y MessageQueue no tiene
+            # DLQ; se descarta este mensaje sin hacer fallar al resto del lote
+            logger.error("Mensaje %s descartado: %s; body: %s", record.get("messageId"), e, logs.payload(raw_body))
+            m.count("MalformedRecords")
+            continue
+
+        # Latencia desde la API; mensajes sin trace (p.ej. encolados a mano)
+        # empiezan a medirse desde que SQS los recibió
+        if env.trace is None:
+            env.trace = new_trace(record.get("attributes", {}).get("SentTimestamp"))
+        env.trace = hop.observe(env.trace)
 
         # Crear el evento para EventBridge
         entries.append({
             'Source': 'my.app.messages',           # debe coincidir con EventPattern.source
             'DetailType': 'MessageReceived',       # debe coincidir con EventPattern.detail-type
-            'Detail': json.dumps(data, ensure_ascii=False),  # string con JSON
+            'Detail': envelope.encode(env),        # el envelope es el detail (un solo nivel de JSON)
             'EventBusName': os.environ.get('EVENT_BUS_NAME', 'default')
         })
 
 
     if entries:
         response = eventbridge.put_events(Entries=entries)
-        print("EventBridge put_events response:", json.dumps(response, indent=2))
+        logger.debug("EventBridge put_events response: %s", logs.payload(response))
 
+        m.records_out(len(entries) - response.get('FailedEntryCount', 0))
         # Revisar si hubo errores
         if response.get('FailedEntryCount', 0) > 0:
-            print("Algunos eventos fallaron al publicarse:", response.get('Entries', []))
+            logger.warning("Algunos eventos fallaron al publicarse: %s", logs.payload(response.get('Entries', [])),
+                           extra={"failed": response['FailedEntryCount']})
+
+    hop.flush()
+    logger.info("Eventos publicados en EventBridge", extra={"records": len(entries)})
 
     # Retorno con CORS
     return {
@@ -1,167 +1,93 @@
 import json
 import os
-import uuid
-import boto3
-import logging
 
-from aws_xray_sdk.core import xray_recorder, patch_all
-patch_all()
+from router_common import clients, xray
+xray.patch(("botocore",))
+
+from router_common import envelope, idempotency, logs, metrics
+from router_common.hops import HopRecorder
 
 # --- Configuración DynamoDB ---
-dynamodb = boto3.resource("dynamodb")
+dynamodb = clients.resource("dynamodb")
 table_name = os.environ["TABLE_NAME"]
 table = dynamodb.Table(table_name)
 
-# --- Logging ---
-logger = logging.getLogger()
-logger.setLevel(logging.INFO)
+# --- Logging (JSON; nivel con LOG_LEVEL_LAMBDA_DYNAMO / LOG_LEVEL) ---
+logger = logs.get_logger("lambda_dynamo")
 
 
-def safe_json_loads(s):
-    """Intentar json.loads y si falla devolver el valor original."""
-    if not isinstance(s, str):
-        return s
+def envelopes_from_sns(sns_message):
+    """
+    Envelopes de un mensaje SNS. La regla 2 publica el evento de Step Functions,
+    cuyo detail.output (string JSON, formato de AWS) es el envelope más $.status.
+    Los formatos anteriores (detail.output con "messages", listas, texto) se
+    convierten con envelope.from_legacy().
+    """
     try:
-        return json.loads(s)
-    except Exception:
-        return s
+        data = json.loads(sns_message)
+    except (TypeError, ValueError):
+        return [envelope.decode(sns_message)]
+
+    detail = data.get("detail") if isinstance(data, dict) else None
+    if isinstance(detail, dict) and detail.get("output") is not None:
+        data = detail["output"]
+        if isinstance(data, str):
+            try:
+                data = json.loads(data)
+            except ValueError:
+                return [envelope.decode(data)]
 
+    if isinstance(data, dict) and isinstance(data.get("messages"), list):
+        return [envelope.decode(m) for m in data["messages"]]
+    if isinstance(data, list):
+        return [envelope.decode(m) for m in data]
+    return [envelope.decode(data)]
 
-def extract_messages_from_event_dict(data):
-    """
-    Recibe un dict ya parseado del mensaje SNS y devuelve una lista de mensajes
-    en formato canonizado: [{'messageId':..., 'body': ...}, ...]
-    """
-    msgs = []
-
-    # Caso típico: evento de StepFunctions (EventBridge) con detail.output (string JSON)
-    detail = data.get("detail")
-    if isinstance(detail, dict):
-        out = detail.get("output")
-        if out is not None:
-            out_parsed = safe_json_loads(out)
-            if isinstance(out_parsed, dict):
-                if "messages" in out_parsed and isinstance(out_parsed["messages"], list):
-                    for m in out_parsed["messages"]:
-                        msgs.append(m)
-                    return msgs
-                if "message" in out_parsed:
-                    msgs.append({"messageId": out_parsed.get("messageId"), "body": out_parsed.get("message")})
-                    return msgs
-                # si no tiene keys esperadas, guardar el objeto completo
-                msgs.append(out_parsed)
-                return msgs
-
-    # Caso: el propio body tiene "messages" en la raíz
-    if "messages" in data and isinstance(data["messages"], list):
-        return data["messages"]
-
-    # Caso: single message with "message" property
-    if "message" in data:
-        return [{"messageId": data.get("messageId"), "body": data.get("message")}]
-
-    # Si es un objeto genérico, intentar meterlo tal cual
-    return [data]
-
-
-def canonize_message_obj(m):
-    """
-    Canoniza un mensaje en la forma {'messageId': <id>, 'body': <json-serializable>}
-    """
-    if not isinstance(m, dict):
-        return {"messageId": str(uuid.uuid4()), "body": m}
-    mid = m.get("messageId") or m.get("id") or str(uuid.uuid4())
-    if "body" in m:
-        body = m["body"]
-    elif "message" in m:
-        body = m["message"]
-    else:
-        body = m
-    body = safe_json_loads(body)
-    return {"messageId": mid, "body": body}
-
-
-def extract_text_from_body(body):
+
+@idempotency.idempotent("lambda_dynamo", key=lambda item: item["MessageId"])
+def save_item(item):
     """
-    Intentar extraer un texto legible del 'body' con heurísticas:
-    - si body es string -> devolverlo
-    - si body es dict y tiene 'message' y es primitivo -> devolver body['message']
-    - si body es dict y tiene 'body' interno -> recursivamente intentar extraer
-    - si body es lista con 1 elemento primitivo -> devolver ese elemento
-    - devuelve None si no puede extraer texto simple
+    Una escritura por MessageId: una reentrega de SNS no vuelve a escribir el
+    item (lo que generaría un MODIFY en el stream y otro objeto en S3 y otra
+    llamada a Bedrock aguas abajo).
     """
-    # strings y primitivos
-    if isinstance(body, str):
-        return body
-    if isinstance(body, (int, float, bool)):
-        return str(body)
-
-    # dicts
-    if isinstance(body, dict):
-        # caso directo: {"message": "Hola"}
-        if "message" in body and isinstance(body["message"], (str, int, float, bool)):
-            return str(body["message"])
-        # nested: {"body": {"message": "Hola"}}
-        if "body" in body:
-            return extract_text_from_body(body["body"])
-        # otras claves: buscar heurísticamente por keys comunes
-        for key in ("text", "msg", "payload"):
-            if key in body and isinstance(body[key], (str, int, float, bool)):
-                return str(body[key])
-        # no encontramos un texto simple
-        return None
-
-    # listas
-    if isinstance(body, list) and len(body) == 1:
-        return extract_text_from_body(body[0])
-
-    return None
+    table.put_item(Item=item)
+    return item["MessageId"]
 
 
+@metrics.handler("lambda_dynamo")
+@logs.handler(logger)
 def lambda_handler(event, context):
-    logger.info("Evento recibido desde SNS: %s", json.dumps(event))
+    logger.debug("Evento recibido desde SNS: %s", logs.payload(event))
+    hop = HopRecorder("lambda_dynamo")
+    m = metrics.current()
+    m.records_in(len(event.get("Records", [])))
 
     for record in event.get("Records", []):
         sns_message = record.get("Sns", {}).get("Message", "")
 
-        parsed = safe_json_loads(sns_message)
-        logger.info("SNS Message parsed (type=%s): %s", type(parsed).__name__, str(parsed)[:1000])
-
-        extracted = []
-        if isinstance(parsed, dict):
-            extracted = extract_messages_from_event_dict(parsed)
-        elif isinstance(parsed, list):
-            extracted = parsed
-        else:
-            # string plano u otro tipo -> guardar como single message
-            extracted = [{"message": parsed}]
-
-        # Canonizar cada message y guardarlo (uno por item en Dynamo)
-        for raw in extracted:
-            msg = canonize_message_obj(raw)
-
-            # Intentar extraer el texto real (p.ej. body={"message":"Hola"} -> "Hola")
-            text = extract_text_from_body(msg["body"])
-
-            if text is not None:
-                body_to_store = text
-            else:
-                # Fallback: almacenar estructura JSON legible
-                try:
-                    body_to_store = msg["body"] if isinstance(msg["body"], str) else json.dumps(msg["body"], ensure_ascii=False)
-                except Exception:
-                    body_to_store = str(msg["body"])
-
+        # Un envelope por mensaje (uno por item en Dynamo)
+        for env in envelopes_from_sns(sns_message):
             item = {
-                "MessageId": msg["messageId"],
-                "Message": body_to_store,
+                "MessageId": env.id,
+                "Message": env.text(),
             }
-            logger.info("Guardando item en DynamoDB: %s", json.dumps(item, ensure_ascii=False))
+            # El trace viaja con el item para que ddb_to_s3 y Bedrock midan su salto
+            trace = hop.observe(env.trace)
+            if trace:
+                item["Trace"] = trace
+            logger.debug("Guardando item en DynamoDB: %s", logs.payload(item))
             try:
-                table.put_item(Item=item)
+                save_item(item)
+                m.records_out()
+            except idempotency.IdempotencyInProgressError:
+                # Lo está guardando otra invocación; si falla, su propia reentrega lo repite
+                logger.info("MessageId %s ya en proceso en otra invocación", env.id)
             except Exception as e:
                 logger.exception("Error guardando item en DynamoDB: %s", e)
 
+    hop.flush()
+
     return {
         "statusCode": 200,
         "headers": {
@@ -1,106 +1,458 @@
-import boto3
+import os
 import json
-from datetime import datetime, timedelta
+import hashlib
+from datetime import datetime, timezone
 
-from aws_xray_sdk.core import xray_recorder, patch_all
-patch_all() 
+from router_common import clients, hops, logs, metrics, xray
+xray.patch(("botocore",))
 
-cloudwatch = boto3.client("cloudwatch")
+from router_common.cache import TTLCache, get_valkey
+from router_common.timeseries import SeriesBuffer
 
-# Lista de lambdas que quieres monitorear
-FUNCTIONS = ["ReactApp-LambdaDispatcher-NeDu0cjfQ9T", "ReactApp-ApiFunction-e9uj0xbcfDWH", "ReactApp-DynamoLambda-kYB5fzKGqrZB", "ReactApp-DdbToS3Handler"]
+logger = logs.get_logger("lambda_metrics")
 
-def lambda_handler(event, context):
-    now = datetime.utcnow()
-    start_time = now - timedelta(minutes=15)
+# --- Descubrimiento de funciones monitoreadas ---
+# STACK_NAME: lista las AWS::Lambda::Function del stack (ListStackResources).
+# MONITOR_TAG ("clave=valor"): alternativa por tags (Resource Groups Tagging API).
+# MONITORED_FUNCTIONS: lista fija separada por comas, solo como último recurso.
+STACK_NAME = os.environ.get("STACK_NAME")
+MONITOR_TAG = os.environ.get("MONITOR_TAG")
+MONITORED_FUNCTIONS = [f.strip() for f in os.environ.get("MONITORED_FUNCTIONS", "").split(",") if f.strip()]
+DISCOVERY_TTL_SECONDS = int(os.environ.get("DISCOVERY_TTL_SECONDS", "300"))
+# Tag opcional que fuerza la etapa de una función
+STAGE_TAG = os.environ.get("PIPELINE_STAGE_TAG", "pipeline-stage")
 
-    durations = []
-    invocations = []
+cloudwatch = clients.client("cloudwatch")
+cloudformation = clients.client("cloudformation") if STACK_NAME else None
+tagging = clients.client("resourcegroupstaggingapi") if MONITOR_TAG and not STACK_NAME else None
 
-    # --- Loop para todas las funciones ---
-    for fn in FUNCTIONS:
-        # Métrica: Duration promedio
-        duration_metrics = cloudwatch.get_metric_data(
-            MetricDataQueries=[
-                {
-                    "Id": f"duration_{fn.lower()}",
-                    "MetricStat": {
-                        "Metric": {
-                            "Namespace": "AWS/Lambda",
-                            "MetricName": "Duration",
-                            "Dimensions": [
-                                {"Name": "FunctionName", "Value": fn}
-                            ]
-                        },
-                        "Period": 300,
-                        "Stat": "Average",
-                    },
-                    "ReturnData": True,
-                }
-            ],
-            StartTime=start_time,
-            EndTime=now,
-        )
-
-        print(duration_metrics["MetricDataResults"])
-
-        for ts, val in zip(duration_metrics["MetricDataResults"][0].get("Timestamps", []),
-                           duration_metrics["MetricDataResults"][0].get("Values", [])):
-            durations.append({
-                "timestamp": int(ts.timestamp() * 1000),
-                "functionName": fn,
-                "avgMs": val
+# Etapa del pipeline por LogicalResourceId del template
+PIPELINE_STAGES = {
+    "ApiFunction": "ingress",
+    "LambdaDispatcher": "routing",
+    "EBToSQS2Function": "routing",
+    "SQS2ToStepFn": "routing",
+    "DynamoLambda": "persistence",
+    "DdbToS3Function": "persistence",
+    "S3ToBedrockFunction": "enrichment",
+    "S3ToBedrockImageFunction": "enrichment",
+    "IndexToOpenSearchFunction": "enrichment",
+    "WebSocketConnectLambda": "delivery",
+    "WebSocketDisconnectLambda": "delivery",
+    "WebSocketDefaultLambda": "delivery",
+    "SMSValidationSendFunction": "delivery",
+    "MetricsFunction": "monitoring",
+    "DashboardLambda": "monitoring",
+}
+STAGE_ORDER = ["ingress", "routing", "persistence", "enrichment", "delivery", "monitoring", "other"]
+
+# Etapa de cada salto instrumentado (router_common.hops)
+HOP_STAGES = {
+    "lambda_dispatcher": "routing",
+    "eb_to_sqs2": "routing",
+    "sqs2_to_stepfn": "routing",
+    "lambda_dynamo": "persistence",
+    "lambda_ddb_to_s3": "persistence",
+    "lambda_s3_to_bedrock": "enrichment",
+}
+
+WINDOW_MINUTES = 15
+DURATION_PERIOD = 300
+INVOCATIONS_PERIOD = 60
+HOP_LATENCY_PERIOD = 60
+HOP_PERCENTILES = ("p50", "p95", "p99")
+# Salto que atraviesa la regla 1 de EventBridge (dispatcher -> eb_to_sqs2)
+EVENTBRIDGE_HOP = "eb_to_sqs2"
+EVENTBRIDGE_RULE_NAME = os.environ.get("EVENTBRIDGE_RULE_NAME", "rule-1")
+# Límite de queries por llamada a GetMetricData
+MAX_QUERIES_PER_REQUEST = 500
+
+# Las series se refrescan como mucho una vez por CACHE_PERIOD_SECONDS (alineado
+# al límite del periodo más corto): antes de eso CloudWatch no tiene puntos nuevos.
+CACHE_PERIOD_SECONDS = int(os.environ.get("METRICS_CACHE_PERIOD_SECONDS", str(INVOCATIONS_PERIOD)))
+SERIES_KEY_PREFIX = os.environ.get("METRICS_SERIES_KEY_PREFIX", "lambda_metrics:series:v2:")
+
+# Buffers por serie (en memoria por contenedor; Valkey los comparte si existe)
+_series_cache = TTLCache(maxsize=2048, ttl=WINDOW_MINUTES * 60)
+_fresh_markers = TTLCache(maxsize=16)
+_discovery_cache = TTLCache(maxsize=1, ttl=DISCOVERY_TTL_SECONDS)
+_last_discovered = []
+
+CORS_HEADERS = {
+    "Access-Control-Allow-Origin": "*",
+    "Access-Control-Allow-Headers": "Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token,If-None-Match",
+    "Access-Control-Allow-Methods": "OPTIONS,GET",
+    "Access-Control-Expose-Headers": "ETag"
+}
+
+
+def _stage_for(logical_id, tags=None):
+    if tags and tags.get(STAGE_TAG):
+        return tags[STAGE_TAG]
+    return PIPELINE_STAGES.get(logical_id, "other")
+
+
+def _discover_from_stack():
+    functions = []
+    paginator = cloudformation.get_paginator("list_stack_resources")
+    for page in paginator.paginate(StackName=STACK_NAME):
+        for res in page.get("StackResourceSummaries", []):
+            if res.get("ResourceType") != "AWS::Lambda::Function":
+                continue
+            if not res.get("PhysicalResourceId") or res.get("ResourceStatus", "").startswith("DELETE"):
+                continue
+            functions.append({
+                "name": res["PhysicalResourceId"],
+                "logicalId": res["LogicalResourceId"],
+                "stage": _stage_for(res["LogicalResourceId"]),
+            })
+    return functions
+
+
+def _discover_from_tags():
+    key, _, value = MONITOR_TAG.partition("=")
+    tag_filter = {"Key": key}
+    if value:
+        tag_filter["Values"] = [value]
+    functions = []
+    paginator = tagging.get_paginator("get_resources")
+    for page in paginator.paginate(TagFilters=[tag_filter], ResourceTypeFilters=["lambda:function"]):
+        for res in page.get("ResourceTagMappingList", []):
+            tags = {t["Key"]: t["Value"] for t in res.get("Tags", [])}
+            logical_id = tags.get("aws:cloudformation:logical-id", "")
+            functions.append({
+                # arn:aws:lambda:<region>:<account>:function:<name>
+                "name": res["ResourceARN"].split(":")[6],
+                "logicalId": logical_id,
+                "stage": _stage_for(logical_id, tags),
             })
+    return functions
 
-        # Métrica: Invocations
-        invocations_metrics = cloudwatch.get_metric_data(
-            MetricDataQueries=[
-                {
-                    "Id": f"invocations_{fn.lower()}",
-                    "MetricStat": {
-                        "Metric": {
-                            "Namespace": "AWS/Lambda",
-                            "MetricName": "Invocations",
-                            "Dimensions": [
-                                {"Name": "FunctionName", "Value": fn}
-                            ]
-                        },
-                        "Period": 60,
-                        "Stat": "Sum",
+
+def discover_functions(force_refresh=False):
+    """
+    Funciones a monitorear, cacheadas por contenedor DISCOVERY_TTL_SECONDS.
+    Si el descubrimiento falla se sigue usando el último resultado conocido.
+    """
+    global _last_discovered
+    if not force_refresh:
+        cached = _discovery_cache.get("functions")
+        metrics.current().cache(hit=cached is not None)
+        if cached is not None:
+            return cached
+
+    try:
+        if STACK_NAME:
+            functions = _discover_from_stack()
+        elif MONITOR_TAG:
+            functions = _discover_from_tags()
+        else:
+            functions = [{"name": f, "logicalId": "", "stage": "other"} for f in MONITORED_FUNCTIONS]
+    except Exception:
+        logger.warning("Function discovery failed, using last known list", exc_info=True)
+        return _last_discovered
+
+    functions.sort(key=lambda f: (STAGE_ORDER.index(f["stage"]) if f["stage"] in STAGE_ORDER else len(STAGE_ORDER), f["name"]))
+    _discovery_cache.set("functions", functions)
+    _last_discovered = functions
+    logger.info("Discovered %d functions to monitor", len(functions))
+    return functions
+
+
+def build_queries(functions, hop_names=()):
+    """
+    Todas las queries en una sola lista. Los Id de GetMetricData deben cumplir
+    ^[a-z][a-zA-Z0-9_]*$, así que se usan índices y un mapa Id -> (métrica, nombre).
+    """
+    queries = []
+    index = {}
+    # Percentiles reales por salto (EMF emitido por router_common.hops)
+    for i, hop in enumerate(hop_names):
+        for stat in HOP_PERCENTILES:
+            query_id = f"hop_{i}_{stat}"
+            index[query_id] = (stat, hop)
+            queries.append({
+                "Id": query_id,
+                "MetricStat": {
+                    "Metric": {
+                        "Namespace": hops.METRICS_NAMESPACE,
+                        "MetricName": hops.HOP_LATENCY_METRIC,
+                        "Dimensions": [
+                            {"Name": hops.HOP_DIMENSION, "Value": hop}
+                        ]
+                    },
+                    "Period": HOP_LATENCY_PERIOD,
+                    "Stat": stat,
+                },
+                "ReturnData": True,
+            })
+    for i, fn in enumerate(functions):
+        for metric_name, kind, period, stat in (
+            ("Duration", "duration", DURATION_PERIOD, "Average"),
+            ("Invocations", "invocations", INVOCATIONS_PERIOD, "Sum"),
+        ):
+            query_id = f"{kind}_{i}"
+            index[query_id] = (kind, fn)
+            queries.append({
+                "Id": query_id,
+                "MetricStat": {
+                    "Metric": {
+                        "Namespace": "AWS/Lambda",
+                        "MetricName": metric_name,
+                        "Dimensions": [
+                            {"Name": "FunctionName", "Value": fn}
+                        ]
                     },
-                    "ReturnData": True,
-                }
-            ],
-            StartTime=start_time,
-            EndTime=now,
-        )
-
-        for ts, val in zip(invocations_metrics["MetricDataResults"][0].get("Timestamps", []),
-                           invocations_metrics["MetricDataResults"][0].get("Values", [])):
-            invocations.append({
-                "timestamp": int(ts.timestamp() * 1000),
-                "functionName": fn,
-                "count": val
+                    "Period": period,
+                    "Stat": stat,
+                },
+                "ReturnData": True,
             })
+    return queries, index
+
+
+def fetch_metric_data(queries, start_time, end_time):
+    """
+    Una llamada GetMetricData por cada 500 queries, siguiendo NextToken.
+    Los resultados paginados de un mismo Id se concatenan.
+    """
+    merged = {}
+    for i in range(0, len(queries), MAX_QUERIES_PER_REQUEST):
+        params = {
+            "MetricDataQueries": queries[i:i + MAX_QUERIES_PER_REQUEST],
+            "StartTime": start_time,
+            "EndTime": end_time,
+            "ScanBy": "TimestampAscending",
+        }
+        while True:
+            resp = cloudwatch.get_metric_data(**params)
+            for result in resp.get("MetricDataResults", []):
+                acc = merged.setdefault(result["Id"], {"Timestamps": [], "Values": []})
+                acc["Timestamps"].extend(result.get("Timestamps", []))
+                acc["Values"].extend(result.get("Values", []))
+            token = resp.get("NextToken")
+            if not token:
+                break
+            params["NextToken"] = token
+    return merged
+
+
+def series_key(query):
+    """Clave estable de una serie (los Id de las queries cambian con el descubrimiento)."""
+    stat = query["MetricStat"]
+    metric = stat["Metric"]
+    dims = ",".join(f"{d['Name']}={d['Value']}" for d in metric["Dimensions"])
+    raw = f"{metric['Namespace']}|{metric['MetricName']}|{dims}|{stat['Stat']}|{stat['Period']}"
+    return SERIES_KEY_PREFIX + hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def load_series(keys):
+    series = {}
+    valkey = get_valkey()
+    if valkey:
+        try:
+            for key, raw in zip(keys, valkey.mget(keys)):
+                if raw:
+                    series[key] = SeriesBuffer.loads(raw)
+        except Exception:
+            logger.warning("Shared metrics cache read failed", exc_info=True)
+    for key in keys:
+        if key not in series:
+            # Una serie vacía es falsy (len 0) pero conserva fetched_through
+            cached = _series_cache.get(key)
+            series[key] = cached if cached is not None else SeriesBuffer()
+    return series
+
+
+def save_series(series, marker, marker_ttl):
+    for key, buf in series.items():
+        _series_cache.set(key, buf)
+    _fresh_markers.set(marker, True, ttl=marker_ttl)
+    valkey = get_valkey()
+    if valkey:
+        try:
+            pipe = valkey.pipeline(transaction=False)
+            for key, buf in series.items():
+                pipe.set(key, buf.dumps(), ex=WINDOW_MINUTES * 60)
+            pipe.set(marker, "1", ex=marker_ttl)
+            pipe.execute()
+        except Exception:
+            logger.warning("Shared metrics cache write failed", exc_info=True)
+
+
+def _is_fresh(marker):
+    if _fresh_markers.get(marker):
+        return True
+    valkey = get_valkey()
+    if valkey:
+        try:
+            return bool(valkey.exists(marker))
+        except Exception:
+            logger.warning("Shared metrics cache read failed", exc_info=True)
+    return False
+
+
+def refresh_series(queries, now):
+    """
+    Devuelve {query Id: SeriesBuffer} con la ventana de WINDOW_MINUTES.
+    Solo consulta a CloudWatch lo posterior a la última consulta de cada serie
+    (fetched_through, menos un periodo que CloudWatch aún puede corregir), y como
+    mucho una vez por periodo entre todos los contenedores. fetched_through avanza
+    aunque la serie no tenga puntos: una serie vacía no obliga a releer la ventana.
+    """
+    keys = [series_key(q) for q in queries]
+    marker = SERIES_KEY_PREFIX + "fresh:" + hashlib.sha1("".join(keys).encode("utf-8")).hexdigest()[:16]
+    series = load_series(keys)
+    window_start = int(now.timestamp() * 1000) - WINDOW_MINUTES * 60 * 1000
+
+    # Hit: otro contenedor (o este) ya consultó CloudWatch en este periodo
+    fresh = _is_fresh(marker) if queries else True
+    metrics.current().cache(hit=fresh)
+    if not fresh:
+        starts = []
+        for query, key in zip(queries, keys):
+            through = series[key].fetched_through
+            if through is None:
+                starts = [window_start]
+                break
+            starts.append(max(window_start, through - query["MetricStat"]["Period"] * 1000))
+        start_ms = min(starts)
+        now_ms = int(now.timestamp() * 1000)
+
+        results = fetch_metric_data(queries, datetime.fromtimestamp(start_ms / 1000, timezone.utc), now)
+        for query, key in zip(queries, keys):
+            result = results.get(query["Id"], {})
+            series[key].merge(
+                [int(ts.timestamp() * 1000) for ts in result.get("Timestamps", [])],
+                result.get("Values", []),
+                start=start_ms,
+            )
+            series[key].fetched_through = now_ms
+            series[key].trim(window_start)
+        save_series(series, marker, _cache_ttl(now))
+        logger.info("Metrics refreshed from %s with %d queries", start_ms, len(queries))
+    else:
+        for key in keys:
+            series[key].trim(window_start)
+
+    return {query["Id"]: series[key] for query, key in zip(queries, keys)}
+
+
+def group_by_stage(functions, hop_names):
+    """[{"stage", "functions", "hops"}] en el orden del pipeline."""
+    stages = {}
+    for fn in functions:
+        stages.setdefault(fn["stage"], {"stage": fn["stage"], "functions": [], "hops": []})["functions"].append(fn["name"])
+    for hop in hop_names:
+        stage = HOP_STAGES.get(hop, "other")
+        stages.setdefault(stage, {"stage": stage, "functions": [], "hops": []})["hops"].append(hop)
+    order = {name: i for i, name in enumerate(STAGE_ORDER)}
+    return sorted(stages.values(), key=lambda s: order.get(s["stage"], len(order)))
+
+
+def shape_payload(series, index, functions=(), hop_names=(), since=None):
+    """Payload del dashboard; con since solo incluye los puntos posteriores."""
+    stage_of = {fn["name"]: fn["stage"] for fn in functions}
+    durations = []
+    invocations = []
+    latest = since
+    # (hop, timestamp) -> {"p50Ms":..., "p95Ms":..., "p99Ms":...}
+    hop_points = {}
+    for query_id, (kind, name) in index.items():
+        buf = series.get(query_id)
+        if buf is None:
+            continue
+        for timestamp, val in buf.points(since):
+            if latest is None or timestamp > latest:
+                latest = timestamp
+            if kind in HOP_PERCENTILES:
+                point = hop_points.setdefault((name, timestamp), {
+                    "timestamp": timestamp, "hop": name, "stage": HOP_STAGES.get(name, "other")
+                })
+                point[f"{kind}Ms"] = val
+                continue
+            point = {"timestamp": timestamp, "functionName": name, "stage": stage_of.get(name, "other")}
+            if kind == "duration":
+                point["avgMs"] = val
+                durations.append(point)
+            else:
+                point["count"] = val
+                invocations.append(point)
+
+    durations.sort(key=lambda p: p["timestamp"])
+    invocations.sort(key=lambda p: p["timestamp"])
+    hop_latencies = sorted(hop_points.values(), key=lambda p: (p["timestamp"], p["hop"]))
+
+    # Se mantiene la forma anterior (ruleName, p50Ms, p95Ms) con datos reales
+    # del salto que cruza la regla de EventBridge
+    eventbridge = [
+        dict(p, ruleName=EVENTBRIDGE_RULE_NAME)
+        for p in hop_latencies if p["hop"] == EVENTBRIDGE_HOP
+    ]
+
+    return {
+        "lambdaDurations": durations,
+        "eventBridgeLatencies": eventbridge,
+        "hopLatencies": hop_latencies,
+        "invocations": invocations,
+        "stages": group_by_stage(functions, hop_names),
+        # Delta: el cliente pide la siguiente vez con since=latestTimestamp
+        "since": since,
+        "latestTimestamp": latest,
+    }
+
+
+def _cache_ttl(now):
+    """Segundos hasta el siguiente límite de CACHE_PERIOD_SECONDS."""
+    epoch = int(now.timestamp())
+    return max(1, CACHE_PERIOD_SECONDS - epoch % CACHE_PERIOD_SECONDS)
+
+
+def _header(event, wanted):
+    for name, value in (event.get("headers") or {}).items():
+        if name.lower() == wanted:
+            return value
+    return None
+
+
+def _since(event):
+    raw = (event.get("queryStringParameters") or {}).get("since")
+    if raw in (None, ""):
+        return None
+    return int(raw)
+
+
+@metrics.handler("lambda_metrics")
+@logs.handler(logger)
+def lambda_handler(event, context):
+    event = event or {}
+    now = datetime.now(timezone.utc)
+
+    headers = dict(CORS_HEADERS)
+    try:
+        since = _since(event)
+    except ValueError:
+        return {
+            "statusCode": 400,
+            "headers": headers,
+            "body": json.dumps({"message": "'since' debe ser un timestamp en milisegundos"})
+        }
+
+    functions = discover_functions()
+    queries, index = build_queries([fn["name"] for fn in functions], hops.HOPS)
+    series = refresh_series(queries, now)
+
+    body = json.dumps(shape_payload(series, index, functions, hops.HOPS, since))
+    etag = '"' + hashlib.sha1(body.encode("utf-8")).hexdigest() + '"'
+    headers["ETag"] = etag
+    headers["Cache-Control"] = f"max-age={_cache_ttl(now)}"
 
-    # EventBridge latencias (simulación fija, ya que no existe métrica directa en CW)
-    latencies = [{
-        "timestamp": int(now.timestamp() * 1000),
-        "ruleName": "SendToSNSRule",
-        "p50Ms": 10,
-        "p95Ms": 20
-    }]
+    # Petición condicional: el cliente ya tiene esta versión
+    if _header(event, "if-none-match") == etag:
+        return {"statusCode": 304, "headers": headers, "body": ""}
 
     return {
         "statusCode": 200,
-        "headers": {
-            "Access-Control-Allow-Origin": "*",
-            "Access-Control-Allow-Headers": "Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token",
-            "Access-Control-Allow-Methods": "OPTIONS,GET"
-        },
-        "body": json.dumps({
-            "lambdaDurations": durations,
-            "eventBridgeLatencies": latencies,
-            "invocations": invocations
-        })
+        "headers": headers,
+        "body": body
     }
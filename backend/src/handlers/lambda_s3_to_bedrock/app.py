@@ -1,100 +1,100 @@
-import boto3
 import json
-import redis
 import os
-from datetime import datetime
+from datetime import datetime, timezone
 from botocore.exceptions import ClientError
 
-# Clientes AWS
-s3_client = boto3.client("s3")
-bedrock_client = boto3.client("bedrock-runtime")
-dynamodb = boto3.resource('dynamodb')
+from router_common import circuit_breaker, clients, connections, idempotency, logs, metrics
+from router_common.cache import get_valkey
+from router_common.hops import HopRecorder
 
-# Variables de entorno Valkey
-VALKEY_HOST = os.environ.get("VALKEY_HOST")
-VALKEY_PORT = int(os.environ.get("VALKEY_PORT", 6379))
+# Clientes AWS
+s3_client = clients.client("s3")
+bedrock_client = clients.client("bedrock-runtime")
 
 # WebSocket config
 WEBSOCKET_ENDPOINT = os.environ.get("WEBSOCKET_ENDPOINT")
 CONNECTIONS_TABLE = os.environ.get("CONNECTIONS_TABLE")
 
-# Debug: Log environment variables at module load
-print(f"🔧 Environment check:")
-print(f"   WEBSOCKET_ENDPOINT: {WEBSOCKET_ENDPOINT}")
-print(f"   CONNECTIONS_TABLE: {CONNECTIONS_TABLE}")
-
-# Only initialize table if CONNECTIONS_TABLE is set
-table = dynamodb.Table(CONNECTIONS_TABLE)
-
-# Conexión global Valkey (reutilizable)
-valkey_client = redis.StrictRedis(
-    host=VALKEY_HOST,
-    port=VALKEY_PORT,
-    decode_responses=True
-)
+logger = logs.get_logger("lambda_s3_to_bedrock")
+logger.info("Environment check", extra={"websocketEndpoint": WEBSOCKET_ENDPOINT, "connectionsTable": CONNECTIONS_TABLE})
 
 # Modelo Nova (puedes cambiar a nova-lite si quieres)
 MODEL_ID = "amazon.nova-micro-v1:0"
 # MODEL_ID = "amazon.nova-lite-v1:0"
 
+# Con Bedrock degradado se deja de llamar (estado compartido en Valkey) y el
+# mensaje se aplaza a CIRCUIT_RETRY_QUEUE_URL; las respuestas cacheadas se siguen sirviendo
+bedrock_breaker = circuit_breaker.CircuitBreaker("bedrock-converse")
+
 
-def _broadcast_websocket(prompt, response, source):
-    """Envía el resultado a todas las conexiones activas del WebSocket."""
-    print("Debug entra a _broadcast_websocket")
+def _broadcast_websocket(prompt, response, source, message_id=None):
+    """
+    Envía el resultado a las conexiones suscritas al canal del mensaje
+    (message:<id>); solo los resultados sin messageId van a los canales por
+    defecto (DEFAULT_CHANNELS, p.ej. "all").
+    """
     
     if not WEBSOCKET_ENDPOINT:
-        print("⚠️ WEBSOCKET_ENDPOINT no configurado, saltando broadcast")
+        logger.debug("WEBSOCKET_ENDPOINT no configurado, saltando broadcast")
         return
     
-    if not CONNECTIONS_TABLE or not table:
-        print("⚠️ CONNECTIONS_TABLE no configurado, saltando broadcast")
+    if not CONNECTIONS_TABLE:
+        logger.debug("CONNECTIONS_TABLE no configurado, saltando broadcast")
         return
     
-    ws_client = boto3.client("apigatewaymanagementapi", endpoint_url=WEBSOCKET_ENDPOINT)
+    # Cacheado por endpoint: no se crea un cliente nuevo en cada broadcast
+    ws_client = clients.client("apigatewaymanagementapi", endpoint_url=WEBSOCKET_ENDPOINT)
 
     payload = json.dumps({
         "prompt": prompt,
         "response": response,
         "source": source,
-        "timestamp": datetime.utcnow().isoformat()
+        "messageId": message_id,
+        "timestamp": datetime.now(timezone.utc).isoformat()
     })
 
-    # Leer todas las conexiones de la tabla DynamoDB
+    channels = [f"message:{message_id}"] if message_id else list(connections.DEFAULT_CHANNELS)
+
+    # Solo los suscriptores de esos canales (GSI por canal), no toda la tabla
     try:
-        connections = table.scan().get('Items', [])
+        subscribers = connections.get_subscribers(channels)
     except Exception as e:
-        print(f"Error al leer ConnectionsTable: {e}")
+        logger.warning("Error al leer ConnectionsTable: %s", e)
         return
 
-    print(f"🔌 Enviando mensaje a {len(connections)} conexiones")
+    logger.debug("Enviando mensaje a %d conexiones (canales=%s)", len(subscribers), channels)
 
-    for conn in connections:
-        connection_id = conn.get('connectionId')
+    for connection_id in subscribers:
         try:
             ws_client.post_to_connection(
                 ConnectionId=connection_id,
                 Data=payload.encode('utf-8')
             )
         except ws_client.exceptions.GoneException:
-            print(f"Conexión caducada: {connection_id}")
+            logger.info("Conexión caducada: %s", connection_id)
             _remove_stale_connection(connection_id)
         except Exception as e:
-            print(f"Error enviando a {connection_id}: {e}")
+            logger.warning("Error enviando a %s: %s", connection_id, e)
 
 
 def _remove_stale_connection(connection_id):
-    """Elimina conexiones caducadas de DynamoDB."""
-    if not table:
-        return
+    """Elimina conexiones caducadas (y sus suscripciones) de DynamoDB."""
     try:
-        table.delete_item(Key={"connectionId": connection_id})
-        print(f"Eliminada conexión caducada: {connection_id}")
+        connections.remove_connection(connection_id)
+        logger.debug("Eliminada conexión caducada: %s", connection_id)
     except Exception as e:
-        print(f"Error al eliminar conexión {connection_id}: {e}")
+        logger.warning("Error al eliminar conexión %s: %s", connection_id, e)
 
+@metrics.handler("lambda_s3_to_bedrock")
+@logs.handler(logger)
 def lambda_handler(event, context):
-    # --- Extraer el mensaje de SNS ---
-    sns_message = event["Records"][0]["Sns"]["Message"]
+    # --- Extraer el mensaje de SNS (o de la cola de reintentos del circuito) ---
+    source_record = event["Records"][0]
+    deferred = bedrock_breaker.deferred(source_record)
+    if deferred:
+        sns_message, attempt = deferred
+    else:
+        sns_message, attempt = source_record["Sns"]["Message"], 0
     s3_event = json.loads(sns_message)
 
     # --- Obtener bucket y key del evento S3 ---
@@ -102,22 +102,53 @@ def lambda_handler(event, context):
     bucket_name = record["bucket"]["name"]
     object_key = record["object"]["key"]
 
+    try:
+        return process_object(bucket_name, object_key)
+    except idempotency.IdempotencyInProgressError:
+        # SNS reintenta la entrega: para entonces la otra invocación habrá terminado
+        logger.info("s3://%s/%s is already being processed", bucket_name, object_key)
+        raise
+    except circuit_breaker.CircuitOpenError as e:
+        # Fallo rápido: sin esperar a Bedrock ni devolver el mensaje a SNS
+        if not bedrock_breaker.defer(sns_message, attempt):
+            raise
+        logger.warning("%s; s3://%s/%s deferred", e, bucket_name, object_key)
+        return {"statusCode": 202, "body": json.dumps({"deferred": True, "attempt": attempt + 1})}
+
+
+# SNS entrega al menos una vez: un duplicado devuelve la respuesta guardada
+# sin leer S3, llamar a Bedrock ni repetir el broadcast
+@idempotency.idempotent("lambda_s3_to_bedrock", key=lambda bucket, key: [bucket, key])
+def process_object(bucket_name, object_key):
     # --- Leer contenido del objeto S3 ---
     response = s3_client.get_object(Bucket=bucket_name, Key=object_key)
     content = response["Body"].read().decode("utf-8")
     obj = json.loads(content)
     message_text = obj.get("item", {}).get("Message", "")
+    message_id = obj.get("item", {}).get("MessageId")
+    trace = obj.get("item", {}).get("Trace")
+    # Último salto: latencia hasta que la respuesta sale por WebSocket
+    hop = HopRecorder("lambda_s3_to_bedrock")
+    m = metrics.current()
+    m.records_in(1)
 
     # --- Construir prompt ---
     prompt = f"What's the meaning of '{message_text}'?"
 
     # --- Cache lookup ---
-    cached_response = valkey_client.get(prompt)
+    # Conexión Valkey compartida; redis se importa en el primer uso, no en el init
+    valkey_client = get_valkey()
+    cached_response = valkey_client.get(prompt) if valkey_client else None
+    if valkey_client:
+        m.cache(hit=bool(cached_response))
     if cached_response:
-        print("🟢 Cache hit")
+        logger.debug("Cache hit")
         # --- Presentar en Frontend con WebSocket ---
-        _broadcast_websocket(prompt, cached_response, "cache")
-        
+        _broadcast_websocket(prompt, cached_response, "cache", message_id)
+        hop.observe(trace)
+        hop.flush()
+        m.records_out()
+
         return {
             "statusCode": 200,
             "body": json.dumps({
@@ -139,7 +170,8 @@ def lambda_handler(event, context):
 
     try:
         # --- Llamada a Amazon Nova ---
-        bedrock_response = bedrock_client.converse(
+        bedrock_response = bedrock_breaker.call(
+            bedrock_client.converse,
             modelId=MODEL_ID,
             messages=conversation,
             inferenceConfig={
@@ -159,21 +191,25 @@ def lambda_handler(event, context):
             response_text = bedrock_response["output"]["message"]["content"][0]["text"]
 
     except ClientError as e:
-        print("❌ Bedrock error:", e)
+        logger.error("Bedrock error: %s", e)
         raise e
 
     # --- Guardar en cache ---
-    valkey_client.set(prompt, response_text)
-    valkey_client.set(
-        f"prompt:{datetime.utcnow().isoformat()}",
-        prompt
-    )
+    if valkey_client:
+        valkey_client.set(prompt, response_text)
+        valkey_client.set(
+            f"prompt:{datetime.now(timezone.utc).isoformat()}",
+            prompt
+        )
 
-    print("💾 Stored prompt:", prompt)
-    print("🤖 Nova response:", response_text)
+    logger.debug("Stored prompt: %s", logs.payload(prompt))
+    logger.debug("Nova response: %s", logs.payload(response_text))
 
     # --- Presentar en Frontend con WebSocket ---
-    _broadcast_websocket(prompt, response_text, "bedrock")
+    _broadcast_websocket(prompt, response_text, "bedrock", message_id)
+    hop.observe(trace)
+    hop.flush()
+    m.records_out()
 
     return {
         "statusCode": 200,
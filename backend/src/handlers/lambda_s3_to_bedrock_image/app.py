@@ -1,17 +1,20 @@
 import os
 import json
-import boto3
 import base64
-import logging
 
-logger = logging.getLogger()
-logger.setLevel(logging.INFO)
+from router_common import circuit_breaker, clients, idempotency, logs, metrics
 
-s3 = boto3.client("s3")
-bedrock = boto3.client("bedrock-runtime", region_name=os.environ.get("AWS_REGION", "us-east-1"))
+logger = logs.get_logger("lambda_s3_to_bedrock_image")
+
+s3 = clients.client("s3")
+bedrock = clients.client("bedrock-runtime", region_name=os.environ.get("AWS_REGION", "us-east-1"))
 MODEL_ID = os.environ.get("MODEL_ID", "amazon.nova-canvas-v1:0")
 OUTPUT_BUCKET = os.environ.get("OUTPUT_BUCKET")
 
+# Nova Canvas tarda segundos por imagen: con el modelo degradado se falla
+# rápido y el mensaje se aplaza a CIRCUIT_RETRY_QUEUE_URL
+bedrock_breaker = circuit_breaker.CircuitBreaker("bedrock-canvas")
+
 def _try_parse_json(s):
     try:
         return json.loads(s)
@@ -49,12 +52,19 @@ def _extract_candidate_from_dict(d):
 def build_prompt_from_text(extracted_text):
     return f"Generate a high-resolution, photorealistic image of: {extracted_text}"
 
+@metrics.handler("lambda_s3_to_bedrock_image")
+@logs.handler(logger)
 def lambda_handler(event, context):
-    logger.info("Event received: %s", json.dumps(event))
+    metrics.current().records_in(1)
+    logger.debug("Event received: %s", logs.payload(event))
 
     try:
         record = event["Records"][0]
-        sns_msg_raw = record["Sns"]["Message"]
+        deferred = bedrock_breaker.deferred(record)
+        if deferred:
+            sns_msg_raw, attempt = deferred
+        else:
+            sns_msg_raw, attempt = record["Sns"]["Message"], 0
     except Exception as e:
         logger.exception("Event format unexpected; aborting")
         raise
@@ -66,60 +76,83 @@ def lambda_handler(event, context):
     if isinstance(parsed_sns_msg, dict) and "Records" in parsed_sns_msg and parsed_sns_msg["Records"]:
         rec0 = parsed_sns_msg["Records"][0]
         if "s3" in rec0:
-            logger.info("S3 event detected inside SNS message")
+            logger.debug("S3 event detected inside SNS message")
             bucket = rec0["s3"]["bucket"]["name"]
             key = rec0["s3"]["object"]["key"]
 
+    try:
+        return generate_image(bucket, key, parsed_sns_msg)
+    except idempotency.IdempotencyInProgressError:
+        logger.info("Image for this message is already being generated; SNS will retry")
+        raise
+    except circuit_breaker.CircuitOpenError as e:
+        if not bedrock_breaker.defer(sns_msg_raw, attempt):
+            raise
+        logger.warning("%s; image generation deferred", e)
+        return {"statusCode": 202, "body": json.dumps({"deferred": True, "attempt": attempt + 1})}
+
+
+# Una imagen por objeto S3 (o por mensaje SNS sin S3): la entrega duplicada de
+# SNS no vuelve a llamar a Nova Canvas, que es la llamada cara
+@idempotency.idempotent(
+    "lambda_s3_to_bedrock_image",
+    key=lambda bucket, key, message: [bucket, key] if bucket and key else message,
+)
+def generate_image(bucket, key, parsed_sns_msg):
     if bucket and key:
-        logger.info("Incoming S3 event detected")
         logger.info("Detected S3 notification inside SNS. bucket=%s key=%s", bucket, key)
         obj = s3.get_object(Bucket=bucket, Key=key)
         prompt_text_raw = obj["Body"].read().decode("utf-8")
-        logger.info("Prompt text read from S3: %s", prompt_text_raw)
+        logger.debug("Prompt text read from S3: %s", logs.payload(prompt_text_raw))
     else:
         logger.info("No S3 event detected; using SNS message body directly")
         prompt_text_raw = parsed_sns_msg if isinstance(parsed_sns_msg, str) else json.dumps(parsed_sns_msg)
-        logger.info("Using SNS message body as prompt source: %s", prompt_text_raw)
+        logger.debug("Using SNS message body as prompt source: %s", logs.payload(prompt_text_raw))
 
 
     parsed = _try_parse_json(prompt_text_raw)
     extracted = None
-    if isinstance(parsed, dict):
-        logger.info("Parsed prompt text as JSON dict; attempting structured extraction")
+    # Objeto escrito por lambda_ddb_to_s3: {"eventType", "item": {"Message", ...}};
+    # el texto ya es el cuerpo del envelope, sin heurísticas
+    item = parsed.get("item") if isinstance(parsed, dict) else None
+    if isinstance(item, dict) and isinstance(item.get("Message"), str) and item["Message"].strip():
+        extracted = item["Message"]
+    elif isinstance(parsed, dict):
+        logger.debug("Parsed prompt text as JSON dict; attempting structured extraction")
         extracted = _extract_candidate_from_dict(parsed)
 
     if not extracted and isinstance(parsed, dict):
-        logger.info("No candidate found at top level; searching nested dicts")
+        logger.debug("No candidate found at top level; searching nested dicts")
         for v in parsed.values():
             if isinstance(v, str):
                 maybe = _try_parse_json(v)
                 if isinstance(maybe, dict):
                     extracted = _extract_candidate_from_dict(maybe)
                     if extracted:
-                        logger.info("Found candidate in nested dict")
+                        logger.debug("Found candidate in nested dict")
                         break
 
     if not extracted:
         logger.info("No structured prompt text found; falling back to raw text extraction")
         if isinstance(prompt_text_raw, str) and len(prompt_text_raw.strip()) > 0:
             try:
-                logger.info("Falling back to regex extraction from raw prompt text")
+                logger.debug("Falling back to regex extraction from raw prompt text")
                 import re
                 m = re.search(r'"Message"\s*:\s*"([^"]+)"', prompt_text_raw)
                 if m:
                     extracted = m.group(1)
                 else:
-                    logger.info("No regex match for 'Message' field; using full text fallback")
+                    logger.debug("No regex match for 'Message' field; using full text fallback")
                     extracted = prompt_text_raw.strip()
             except Exception:
                 extracted = prompt_text_raw.strip()
         else:
             raise RuntimeError("No usable prompt text found in SNS/S3 payload")
 
-    logger.info("Extracted text for prompt: %s", extracted)
+    logger.debug("Extracted text for prompt: %s", logs.payload(extracted))
 
     final_prompt = build_prompt_from_text(extracted)
-    logger.info("Final prompt to Bedrock: %s", final_prompt)
+    logger.debug("Final prompt to Bedrock: %s", logs.payload(final_prompt))
 
     native_request = {
         "taskType": "TEXT_IMAGE",
@@ -135,22 +168,25 @@ def lambda_handler(event, context):
     body_bytes = json.dumps(native_request).encode("utf-8")
 
     try:
-        resp = bedrock.invoke_model(
+        resp = bedrock_breaker.call(
+            bedrock.invoke_model,
             modelId=MODEL_ID,
             contentType="application/json",
             body=body_bytes
         )
+    except circuit_breaker.CircuitOpenError:
+        raise
     except Exception:
         logger.exception("InvokeModel failed")
         raise
 
     resp_body = resp["body"].read()
-    logger.info("Raw response bytes length: %d", len(resp_body) if resp_body is not None else 0)
+    logger.debug("Raw response bytes length: %d", len(resp_body) if resp_body is not None else 0)
 
     img_bytes = None
     try:
         parsed_resp = json.loads(resp_body)
-        logger.info("Parsed response JSON keys: %s", list(parsed_resp.keys()))
+        logger.debug("Parsed response JSON keys: %s", list(parsed_resp.keys()))
         if parsed_resp.get("images"):
             img_b64 = parsed_resp["images"][0]
         else:
@@ -167,7 +203,7 @@ def lambda_handler(event, context):
             img_bytes = resp_body if isinstance(resp_body, (bytes, bytearray)) else None
 
     if not img_bytes:
-        logger.error("No image found in model response: %s", resp_body[:1000])
+        logger.error("No image found in model response: %s", logs.payload(resp_body))
         raise RuntimeError("No image found in model response")
 
     safe_base = "unknown"
@@ -183,5 +219,7 @@ def lambda_handler(event, context):
     out_key = f"generated-images/{safe_base}-nova-canvas.png"
     s3.put_object(Bucket=OUTPUT_BUCKET, Key=out_key, Body=img_bytes, ContentType="image/png")
     logger.info("Saved generated image to s3://%s/%s", OUTPUT_BUCKET, out_key)
+    metrics.current().observe("ImageBytes", len(img_bytes), unit=metrics.BYTES)
+    metrics.current().records_out()
 
     return {"statusCode": 200, "body": json.dumps({"out_key": out_key})}
@@ -1,14 +1,17 @@
 import json
 import os
-import boto3
 
-from aws_xray_sdk.core import xray_recorder, patch_all
-patch_all() 
+from router_common import clients, xray
+xray.patch(("botocore",))
+
+from router_common import codec, envelope, metrics
+from router_common.hops import new_trace
 
 # Cliente SQS
-sqs = boto3.client("sqs")
+sqs = clients.client("sqs")
 QUEUE_URL = os.environ.get("QUEUE_URL")
 
+@metrics.handler("message_router_queue")
 def lambda_handler(event, context):
     # Headers CORS comunes
     cors_headers = {
@@ -37,16 +40,20 @@ def lambda_handler(event, context):
             # Caso 1: un solo mensaje
             if "message" in body:
                 message = body["message"]
-                sqs.send_message(
-                    QueueUrl=QUEUE_URL,
-                    MessageBody=json.dumps({"message": message})
-                )
+                # Envelope con el trace de entrada para medir la latencia de cada salto
+                env = envelope.new(message, trace=new_trace())
+                # JSON, o binario comprimido si es grande (ver router_common.codec)
+                metrics.current().records_in(1)
+                sqs.send_message(QueueUrl=QUEUE_URL, **codec.encode_sqs(env.to_dict()))
+                metrics.current().records_out(1)
                 return {
                     "statusCode": 200,
                     "headers": cors_headers,
                     "body": json.dumps({
                         "message": "Mensaje recibido y enviado a la cola",
-                        "sentMessages": [message]
+                        "sentMessages": [message],
+                        "messageIds": [env.id],
+                        "traceIds": [env.trace["traceId"]]
                     })
                 }
 
@@ -60,14 +67,17 @@ def lambda_handler(event, context):
                         "body": json.dumps({"message": "La lista 'messages' no puede estar vacía"})
                     }
 
+                metrics.current().records_in(len(messages))
                 # SQS solo soporta hasta 10 en send_message_batch
                 batch = []
                 responses = []
+                message_ids = []
+                trace_ids = []
                 for i, msg in enumerate(messages):
-                    entry = {
-                        "Id": str(i),
-                        "MessageBody": json.dumps({"message": msg})
-                    }
+                    env = envelope.new(msg, trace=new_trace())
+                    message_ids.append(env.id)
+                    trace_ids.append(env.trace["traceId"])
+                    entry = {"Id": str(i), **codec.encode_sqs(env.to_dict())}
                     batch.append(entry)
 
                     if len(batch) == 10:  # Enviar en lotes de 10
@@ -79,13 +89,16 @@ def lambda_handler(event, context):
                 if batch:
                     res = sqs.send_message_batch(QueueUrl=QUEUE_URL, Entries=batch)
                     responses.append(res)
+                metrics.current().records_out(sum(len(r.get("Successful", [])) for r in responses))
 
                 return {
                     "statusCode": 200,
                     "headers": cors_headers,
                     "body": json.dumps({
                         "message": f"{len(messages)} mensajes recibidos y enviados a la cola",
-                        "sentMessages": messages
+                        "sentMessages": messages,
+                        "messageIds": message_ids,
+                        "traceIds": trace_ids
                     })
                 }
 
@@ -1,25 +1,78 @@
 import json
-import boto3
 import re
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from boto3.dynamodb.conditions import Attr
+from boto3.dynamodb.conditions import Attr, Key
 import os
 
-dynamodb = boto3.resource('dynamodb')
-sns = boto3.client('sns')
+from router_common import clients, logs
+from router_common.ratelimit import TokenBucket
+
+logger = logs.get_logger("sms_validation_send")
 
 # Get from environment variables
 TABLE_NAME = os.environ.get('CONTACTS_TABLE_NAME', 'ContactsTable')
 SNS_TOPIC_ARN = os.environ.get('EMAIL_SNS_TOPIC_ARN')
 
+# GSIs de ContactsTable (fullNumber/fullEmail son sparse: solo existen en su tipo de contacto)
+PHONE_INDEX_NAME = os.environ.get('CONTACTS_PHONE_INDEX', 'fullNumber-index')
+EMAIL_INDEX_NAME = os.environ.get('CONTACTS_EMAIL_INDEX', 'fullEmail-index')
+MESSAGE_INDEX_NAME = os.environ.get('CONTACTS_MESSAGE_INDEX', 'lastMessageId-index')
+
+# Envío concurrente: tamaño del pool y límite de publicaciones SNS por segundo (por contenedor)
+SEND_MAX_WORKERS = int(os.environ.get('SEND_MAX_WORKERS', '10'))
+SNS_PUBLISH_RATE = float(os.environ.get('SNS_PUBLISH_RATE', '25'))
+
+sns_rate_limiter = TokenBucket(SNS_PUBLISH_RATE)
+
+# Pool HTTP al menos tan grande como el número de hilos que publican/escriben a la vez
+CLIENT_POOL_SIZE = max(clients.MAX_POOL_CONNECTIONS, SEND_MAX_WORKERS)
+dynamodb = clients.resource('dynamodb', max_pool_connections=CLIENT_POOL_SIZE)
+sns = clients.client('sns', max_pool_connections=CLIENT_POOL_SIZE)
+sqs = clients.client('sqs')
+
+# Modo de envío:
+#   "per_contact": un publish por contacto (atributo contactId String)
+#   "fanout":      un publish por canal (email/sms) con contactId String.Array;
+#                  SNS hace el fan-out con las FilterPolicy de cada suscripción
+SEND_MODE = os.environ.get('SEND_MODE', 'per_contact').lower()
+FANOUT_MAX_RECIPIENTS = int(os.environ.get('FANOUT_MAX_RECIPIENTS', '100'))
+
+# Envíos asíncronos: el job se guarda en SEND_JOBS_TABLE_NAME y los destinatarios se
+# reparten en shards de SEND_JOB_SHARD_SIZE contactos encolados en SEND_JOBS_QUEUE_URL
+JOBS_TABLE_NAME = os.environ.get('SEND_JOBS_TABLE_NAME')
+JOBS_QUEUE_URL = os.environ.get('SEND_JOBS_QUEUE_URL')
+SEND_JOB_SHARD_SIZE = int(os.environ.get('SEND_JOB_SHARD_SIZE', '50'))
+SEND_JOB_TTL_DAYS = int(os.environ.get('SEND_JOB_TTL_DAYS', '7'))
+# Un shard se reclama antes de enviarlo; la reserva caduca a los SEND_JOB_SHARD_LEASE_SECONDS
+# (>= VisibilityTimeout de SendJobsQueue). Los shards que llegan a la DLQ se cuentan como fallidos.
+SEND_JOB_SHARD_LEASE_SECONDS = int(os.environ.get('SEND_JOB_SHARD_LEASE_SECONDS', '180'))
+SEND_JOBS_DLQ_ARN = os.environ.get('SEND_JOBS_DLQ_ARN')
+
 if not SNS_TOPIC_ARN:
     raise ValueError("EMAIL_SNS_TOPIC_ARN environment variable is required")
 
 table = dynamodb.Table(TABLE_NAME)
+jobs_table = dynamodb.Table(JOBS_TABLE_NAME) if JOBS_TABLE_NAME else None
 
+@logs.handler(logger)
 def lambda_handler(event, context):
     try:
-        print(f"Event recibido: {json.dumps(event, default=str)}")
+        logger.debug("Event recibido: %s", logs.payload(event))
+        
+        # Shards de envíos asíncronos (SQS -> esta misma Lambda)
+        records = event.get('Records') or []
+        if records and records[0].get('eventSource') == 'aws:sqs':
+            if SEND_JOBS_DLQ_ARN and records[0].get('eventSourceARN') == SEND_JOBS_DLQ_ARN:
+                return fail_dead_shards(records)
+            return process_send_job_shards(records)
+        
+        # GET /sms/jobs/{jobId}: progreso de un envío asíncrono
+        if event.get("httpMethod") == "GET":
+            job_id = (event.get('pathParameters') or {}).get('jobId')
+            return get_send_job_status(job_id)
         
         # Handle OPTIONS preflight request
         if event.get("httpMethod") == "OPTIONS":
@@ -43,11 +96,14 @@ def lambda_handler(event, context):
         else:
             body = event
         
-        print(f"Body parseado: {json.dumps(body, default=str)}")
+        logger.debug("Body parseado: %s", logs.payload(body))
         
         method = body.get('method', '').lower()
         message_id = body.get('id')
         
+        if method == 'status':
+            return get_send_job_status(body.get('jobId'))
+        
         if not message_id:
             return response(400, {'error': 'ID es requerido'})
         
@@ -56,12 +112,10 @@ def lambda_handler(event, context):
         elif method == 'send':
             return handle_send(body, message_id)
         else:
-            return response(400, {'error': 'Método inválido. Use "valid" o "send"'})
+            return response(400, {'error': 'Método inválido. Use "valid", "send" o "status"'})
         
     except Exception as e:
-        print(f"Error completo: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error procesando la petición: %s", e)
         return response(500, {'error': str(e)})
 
 
@@ -82,7 +136,10 @@ def handle_send(body, message_id):
     if not message_text:
         return response(400, {'error': 'Mensaje es requerido'})
     
-    return send_contact_message(message_text, message_id)
+    if body.get('async'):
+        return start_send_job(message_text, message_id, mode=body.get('mode'))
+    
+    return send_contact_message(message_text, message_id, mode=body.get('mode'))
 
 
 def add_contact_phone(data, message_id):
@@ -189,13 +246,15 @@ def add_contact_email(data, message_id):
     })
 
 
-def send_contact_message(message_text, message_id):
-    contacts = get_contacts_by_message_id(message_id)
+def send_contact_message(message_text, message_id, mode=None):
+    # Una sola query: los contactos en memoria se reutilizan para enviar y para borrar
+    all_contacts = get_contacts_by_message_id(message_id, include_pending=True)
+    contacts = [c for c in all_contacts if is_subscribed(c)]
     
     if not contacts:
         return response(404, {'error': 'No se encontraron contactos con ese ID'})
     
-    results = send_messages(contacts, message_text, message_id)
+    results = send_messages(contacts, message_text, message_id, all_contacts=all_contacts, mode=mode)
     
     return response(200, {
         'message': 'Mensajes enviados',
@@ -203,6 +262,232 @@ def send_contact_message(message_text, message_id):
     })
 
 
+def start_send_job(message_text, message_id, mode=None):
+    """
+    Crea un job de envío, encola los destinatarios en shards para workers paralelos
+    y responde 202 con el jobId sin esperar al fan-out.
+    """
+    if not jobs_table or not JOBS_QUEUE_URL:
+        return response(500, {'error': 'Envío asíncrono no configurado'})
+    
+    all_contacts = get_contacts_by_message_id(message_id, include_pending=True)
+    contacts = [c for c in all_contacts if is_subscribed(c)]
+    
+    if not contacts:
+        return response(404, {'error': 'No se encontraron contactos con ese ID'})
+    
+    job_id = str(uuid.uuid4())
+    shards = [contacts[i:i + SEND_JOB_SHARD_SIZE] for i in range(0, len(contacts), SEND_JOB_SHARD_SIZE)]
+    
+    jobs_table.put_item(Item={
+        'jobId': job_id,
+        'messageId': message_id,
+        'status': 'running',
+        'mode': (mode or SEND_MODE).lower(),
+        'total': len(contacts),
+        'sent': 0,
+        'failed': 0,
+        'pending': len(contacts),
+        'shards': len(shards),
+        # shardId -> {"state": "sending", "leaseUntil"} | {"state": "sent", "sent", "failed"}
+        'shardState': {},
+        'createdAt': datetime.now().isoformat(),
+        'expiresAt': int(time.time()) + SEND_JOB_TTL_DAYS * 86400
+    })
+    
+    entries = []
+    for index, shard in enumerate(shards):
+        entries.append({
+            'Id': str(index),
+            'MessageBody': json.dumps({
+                'jobId': job_id,
+                'shardId': str(index),
+                'messageId': message_id,
+                'message': message_text,
+                'mode': mode,
+                'contacts': shard
+            }, default=str)
+        })
+    for i in range(0, len(entries), 10):
+        try:
+            res = sqs.send_message_batch(QueueUrl=JOBS_QUEUE_URL, Entries=entries[i:i + 10])
+            if res.get('Failed'):
+                raise RuntimeError(f"No se pudieron encolar shards del job {job_id}: {res['Failed']}")
+        except Exception as e:
+            # El job ya está guardado: se marca fallido para que no quede "running" para
+            # siempre, y los shards ya encolados se descartan al reclamarlos
+            mark_job_failed(job_id, str(e))
+            raise
+    
+    # Los contactos sin suscripción confirmada no se envían: se eliminan ya
+    unsubscribed = [c for c in all_contacts if not is_subscribed(c)]
+    if unsubscribed:
+        delete_contacts(unsubscribed)
+    
+    return response(202, {
+        'message': 'Envío en curso',
+        'jobId': job_id,
+        'total': len(contacts),
+        'shards': len(shards)
+    })
+
+
+def process_send_job_shards(records):
+    """Worker: envía cada shard y actualiza los contadores del job."""
+    failures = []
+    for record in records:
+        try:
+            process_send_job_shard(json.loads(record['body']))
+        except Exception as e:
+            logger.exception("Error procesando shard %s: %s", record.get('messageId'), e)
+            failures.append({'itemIdentifier': record.get('messageId')})
+    return {'batchItemFailures': failures}
+
+
+def process_send_job_shard(shard):
+    """
+    Reclama el shard antes de enviar: una reentrega de SQS (p.ej. tras fallar la
+    actualización de contadores) nunca vuelve a mandar el SMS a sus contactos.
+    """
+    job_id, shard_id = shard['jobId'], shard['shardId']
+    claimed, job = claim_shard(job_id, shard_id)
+    if claimed:
+        results = send_messages(shard['contacts'], shard['message'], shard['messageId'], mode=shard.get('mode'))
+        sent, failed = results['sent'], results['failed']
+        finish_shard(job_id, shard_id, sent, failed)
+    else:
+        if not job or job.get('status') != 'running':
+            logger.warning("Shard %s descartado: job %s %s", shard_id, job_id, job.get('status') if job else 'inexistente')
+            return
+        state = (job.get('shardState') or {}).get(shard_id) or {}
+        if state.get('state') == 'sent':
+            # Enviado pero sin contabilizar: solo falta el contador
+            sent, failed = int(state.get('sent', 0)), int(state.get('failed', 0))
+        elif int(state.get('leaseUntil', 0)) > time.time():
+            raise RuntimeError(f"Shard {shard_id} del job {job_id} en curso en otra invocación")
+        else:
+            # La invocación que lo reclamó murió a mitad: no se reenvía (podría duplicar
+            # SMS); sus contactos cuentan como fallidos
+            sent, failed = 0, len(shard['contacts'])
+            finish_shard(job_id, shard_id, sent, failed)
+    record_job_progress(job_id, shard_id, sent, failed)
+
+
+def claim_shard(job_id, shard_id):
+    """(True, None) si el shard queda reclamado; si no, (False, job leído con ConsistentRead)."""
+    try:
+        jobs_table.update_item(
+            Key={'jobId': job_id},
+            UpdateExpression='SET shardState.#shard = :claim',
+            ConditionExpression='#status = :running AND attribute_not_exists(shardState.#shard)',
+            ExpressionAttributeNames={'#shard': shard_id, '#status': 'status'},
+            ExpressionAttributeValues={
+                ':claim': {'state': 'sending', 'leaseUntil': int(time.time()) + SEND_JOB_SHARD_LEASE_SECONDS},
+                ':running': 'running'
+            }
+        )
+        return True, None
+    except dynamodb.meta.client.exceptions.ConditionalCheckFailedException:
+        return False, jobs_table.get_item(Key={'jobId': job_id}, ConsistentRead=True).get('Item')
+
+
+def finish_shard(job_id, shard_id, sent, failed):
+    """Guarda el resultado del shard antes de sumarlo a los contadores del job."""
+    jobs_table.update_item(
+        Key={'jobId': job_id},
+        UpdateExpression='SET shardState.#shard = :result',
+        ExpressionAttributeNames={'#shard': shard_id},
+        ExpressionAttributeValues={':result': {'state': 'sent', 'sent': sent, 'failed': failed}}
+    )
+
+
+def fail_dead_shards(records):
+    """
+    Consumidor de SendJobsDLQ: un shard que agotó sus reintentos se contabiliza
+    (como fallido, salvo que llegara a enviarse) para que pending llegue a 0.
+    """
+    for record in records:
+        shard = json.loads(record['body'])
+        job_id, shard_id = shard['jobId'], shard['shardId']
+        job = jobs_table.get_item(Key={'jobId': job_id}, ConsistentRead=True).get('Item')
+        if not job or job.get('status') != 'running':
+            continue
+        state = (job.get('shardState') or {}).get(shard_id) or {}
+        if state.get('state') == 'sent':
+            sent, failed = int(state.get('sent', 0)), int(state.get('failed', 0))
+        else:
+            sent, failed = 0, len(shard['contacts'])
+            finish_shard(job_id, shard_id, sent, failed)
+        logger.warning("Shard %s del job %s en la DLQ", shard_id, job_id, extra={"sent": sent, "failed": failed})
+        record_job_progress(job_id, shard_id, sent, failed)
+    return {'batchItemFailures': []}
+
+
+def mark_job_failed(job_id, error):
+    jobs_table.update_item(
+        Key={'jobId': job_id},
+        UpdateExpression='SET #status = :failed, #error = :error, completedAt = :now',
+        ExpressionAttributeNames={'#status': 'status', '#error': 'error'},
+        ExpressionAttributeValues={':failed': 'failed', ':error': error, ':now': datetime.now().isoformat()}
+    )
+
+
+def record_job_progress(job_id, shard_id, sent, failed):
+    """
+    Contadores atómicos (ADD) del job. doneShards hace la actualización idempotente
+    ante reentregas de SQS; el shard que deja pending a 0 marca el job como completado.
+    """
+    try:
+        updated = jobs_table.update_item(
+            Key={'jobId': job_id},
+            UpdateExpression='ADD sent :sent, failed :failed, pending :done, doneShards :shard',
+            ConditionExpression='attribute_exists(jobId) AND NOT contains(doneShards, :shardId)',
+            ExpressionAttributeValues={
+                ':sent': sent,
+                ':failed': failed,
+                ':done': -(sent + failed),
+                ':shard': {shard_id},
+                ':shardId': shard_id
+            },
+            ReturnValues='UPDATED_NEW'
+        )['Attributes']
+    except dynamodb.meta.client.exceptions.ConditionalCheckFailedException:
+        logger.info("Shard %s del job %s ya contabilizado", shard_id, job_id)
+        return
+    
+    if updated.get('pending', 1) <= 0:
+        jobs_table.update_item(
+            Key={'jobId': job_id},
+            UpdateExpression='SET #status = :completed, completedAt = :now',
+            ExpressionAttributeNames={'#status': 'status'},
+            ExpressionAttributeValues={':completed': 'completed', ':now': datetime.now().isoformat()}
+        )
+
+
+def get_send_job_status(job_id):
+    if not jobs_table:
+        return response(500, {'error': 'Envío asíncrono no configurado'})
+    if not job_id:
+        return response(400, {'error': 'jobId es requerido'})
+    
+    job = jobs_table.get_item(Key={'jobId': job_id}).get('Item')
+    if not job:
+        return response(404, {'error': 'Job no encontrado'})
+    
+    return response(200, {
+        'jobId': job_id,
+        'messageId': job.get('messageId'),
+        'status': job.get('status'),
+        'total': int(job.get('total', 0)),
+        'sent': int(job.get('sent', 0)),
+        'failed': int(job.get('failed', 0)),
+        'pending': int(job.get('pending', 0)),
+        'createdAt': job.get('createdAt'),
+        'completedAt': job.get('completedAt'),
+        'error': job.get('error')
+    })
+
+
 def validate_phone(data):
     lada = data.get('lada', '')
     number = data.get('number', '')
@@ -241,18 +526,38 @@ def validate_email(data):
     return {'valid': True, 'message': 'Email válido'}
 
 
+def query_all(index_name, key_condition, filter_expression=None, max_items=None):
+    """
+    Query sobre un GSI siguiendo LastEvaluatedKey, para no perder resultados
+    cuando una página supera 1 MB.
+    """
+    params = {
+        'IndexName': index_name,
+        'KeyConditionExpression': key_condition
+    }
+    if filter_expression is not None:
+        params['FilterExpression'] = filter_expression
+    
+    items = []
+    while True:
+        page = table.query(**params)
+        items.extend(page.get('Items', []))
+        
+        if max_items and len(items) >= max_items:
+            return items[:max_items]
+        
+        last_key = page.get('LastEvaluatedKey')
+        if not last_key:
+            return items
+        params['ExclusiveStartKey'] = last_key
+
+
 def check_existing_contact(contact_type, full_contact):
     try:
         if contact_type == 'phone':
-            response = table.scan(
-                FilterExpression=Attr('fullNumber').eq(full_contact)
-            )
+            items = query_all(PHONE_INDEX_NAME, Key('fullNumber').eq(full_contact), max_items=1)
         else:
-            response = table.scan(
-                FilterExpression=Attr('fullEmail').eq(full_contact)
-            )
-        
-        items = response.get('Items', [])
+            items = query_all(EMAIL_INDEX_NAME, Key('fullEmail').eq(full_contact), max_items=1)
         
         if items:
             return items[0]
@@ -260,7 +565,7 @@ def check_existing_contact(contact_type, full_contact):
         return None
         
     except Exception as e:
-        print(f"Error verificando contacto existente: {str(e)}")
+        logger.warning("Error verificando contacto existente: %s", e)
         return None
 
 
@@ -280,9 +585,9 @@ def save_contact_phone(contact_id, lada, number, full_number, message_id, subscr
     if subscription_arn:
         item['subscriptionArn'] = subscription_arn
     
-    print(f"Guardando item en DynamoDB: {json.dumps(item, default=str)}")
+    logger.debug("Guardando item en DynamoDB: %s", logs.payload(item))
     table.put_item(Item=item)
-    print(f"Item guardado con ID: {contact_id}")
+    logger.info("Contacto guardado: %s", contact_id)
 
 
 def save_contact_email(contact_id, email, domains, full_email, message_id, subscription_arn):
@@ -301,14 +606,14 @@ def save_contact_email(contact_id, email, domains, full_email, message_id, subsc
     if subscription_arn:
         item['subscriptionArn'] = subscription_arn
     
-    print(f"Guardando item en DynamoDB: {json.dumps(item, default=str)}")
+    logger.debug("Guardando item en DynamoDB: %s", logs.payload(item))
     table.put_item(Item=item)
-    print(f"Item guardado con ID: {contact_id}")
+    logger.info("Contacto guardado: %s", contact_id)
 
 
 def subscribe_phone_to_sns(full_number, contact_id):
     try:
-        print(f"Suscribiendo SMS: {full_number} al topic {SNS_TOPIC_ARN}")
+        logger.info("Suscribiendo SMS: %s al topic %s", full_number, SNS_TOPIC_ARN)
         
         subscribe_response = sns.subscribe(
             TopicArn=SNS_TOPIC_ARN,
@@ -324,7 +629,7 @@ def subscribe_phone_to_sns(full_number, contact_id):
         )
         
         subscription_arn = subscribe_response['SubscriptionArn']
-        print(f"Suscripción creada: {subscription_arn}")
+        logger.info("Suscripción creada: %s", subscription_arn)
         
         awaiting = subscription_arn == 'pending confirmation'
         
@@ -337,15 +642,13 @@ def subscribe_phone_to_sns(full_number, contact_id):
         }
         
     except Exception as e:
-        print(f"Error suscribiendo a SNS: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error suscribiendo a SNS: %s", e)
         return {'success': False, 'error': str(e)}
 
 
 def subscribe_email_to_sns(full_email, contact_id):
     try:
-        print(f"Suscribiendo email: {full_email} al topic {SNS_TOPIC_ARN}")
+        logger.info("Suscribiendo email: %s al topic %s", full_email, SNS_TOPIC_ARN)
         
         subscribe_response = sns.subscribe(
             TopicArn=SNS_TOPIC_ARN,
@@ -361,7 +664,7 @@ def subscribe_email_to_sns(full_email, contact_id):
         )
         
         subscription_arn = subscribe_response['SubscriptionArn']
-        print(f"Suscripción creada: {subscription_arn}")
+        logger.info("Suscripción creada: %s", subscription_arn)
         
         awaiting = subscription_arn == 'pending confirmation'
         
@@ -374,61 +677,79 @@ def subscribe_email_to_sns(full_email, contact_id):
         }
         
     except Exception as e:
-        print(f"Error suscribiendo a SNS: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error suscribiendo a SNS: %s", e)
         return {'success': False, 'error': str(e)}
 
 
-def get_contacts_by_message_id(message_id):
+def is_subscribed(contact):
+    subscription_arn = contact.get('subscriptionArn', '')
+    return bool(subscription_arn) and subscription_arn != 'pending confirmation'
+
+
+def get_contacts_by_message_id(message_id, include_pending=False):
     try:
-        response = table.scan(
-            FilterExpression=Attr('lastMessageId').eq(message_id) & 
-                           Attr('subscriptionArn').exists() & 
-                           Attr('subscriptionArn').ne('pending confirmation')
+        if include_pending:
+            return query_all(MESSAGE_INDEX_NAME, Key('lastMessageId').eq(message_id))
+        return query_all(
+            MESSAGE_INDEX_NAME,
+            Key('lastMessageId').eq(message_id),
+            filter_expression=Attr('subscriptionArn').exists() & 
+                              Attr('subscriptionArn').ne('pending confirmation')
         )
-        return response.get('Items', [])
     except Exception as e:
-        print(f"Error obteniendo contactos: {str(e)}")
+        logger.exception("Error obteniendo contactos: %s", e)
         return []
 
 
 def delete_contacts_by_message_id(message_id):
     try:
-        response = table.scan(
-            FilterExpression=Attr('lastMessageId').eq(message_id)
-        )
-        
-        items = response.get('Items', [])
-        
-        deleted_count = 0
-        for item in items:
-            contact_id = item.get('contactId')
-            subscription_arn = item.get('subscriptionArn', '')
-            
-            try:
-                if subscription_arn and subscription_arn != 'pending confirmation':
-                    try:
-                        sns.unsubscribe(SubscriptionArn=subscription_arn)
-                        print(f"Suscripción SNS eliminada: {subscription_arn}")
-                    except Exception as e:
-                        print(f"Error eliminando suscripción SNS {subscription_arn}: {str(e)}")
-                
-                table.delete_item(Key={'contactId': contact_id})
+        items = query_all(MESSAGE_INDEX_NAME, Key('lastMessageId').eq(message_id))
+        return delete_contacts(items)
+    except Exception as e:
+        logger.exception("Error en delete_contacts_by_message_id: %s", e)
+        return 0
+
+
+def delete_contacts(contacts):
+    """
+    Elimina las suscripciones SNS (en paralelo) y los contactos de DynamoDB
+    con BatchWriteItem, a partir de los items ya leídos.
+    """
+    subscribed = [c for c in contacts if is_subscribed(c)]
+    
+    def unsubscribe(contact):
+        subscription_arn = contact['subscriptionArn']
+        try:
+            sns.unsubscribe(SubscriptionArn=subscription_arn)
+            logger.debug("Suscripción SNS eliminada: %s", subscription_arn)
+        except Exception as e:
+            logger.warning("Error eliminando suscripción SNS %s: %s", subscription_arn, e)
+    
+    if subscribed:
+        with ThreadPoolExecutor(max_workers=min(SEND_MAX_WORKERS, len(subscribed))) as pool:
+            list(pool.map(unsubscribe, subscribed))
+    
+    deleted_count = 0
+    try:
+        with table.batch_writer(overwrite_by_pkeys=['contactId']) as batch:
+            for contact in contacts:
+                batch.delete_item(Key={'contactId': contact['contactId']})
                 deleted_count += 1
-                print(f"Contacto eliminado: {contact_id}")
-            except Exception as e:
-                print(f"Error eliminando contacto {contact_id}: {str(e)}")
-        
-        print(f"Total de contactos eliminados: {deleted_count}")
-        return deleted_count
-        
     except Exception as e:
-        print(f"Error en delete_contacts_by_message_id: {str(e)}")
+        logger.exception("Error eliminando contactos: %s", e)
         return 0
+    
+    logger.info("Contactos eliminados", extra={"deleted": deleted_count})
+    return deleted_count
 
 
-def send_messages(contacts, message_text, message_id):
+def send_messages(contacts, message_text, message_id, all_contacts=None, mode=None):
+    """
+    Publica en paralelo (pool acotado + rate limit de SNS) y después elimina con
+    BatchWriteItem los contactos ya cargados (all_contacts).
+    mode: "per_contact" o "fanout" (por defecto SEND_MODE).
+    """
+    mode = (mode or SEND_MODE).lower()
     results = {
         'total': len(contacts),
         'sent': 0,
@@ -436,70 +757,106 @@ def send_messages(contacts, message_text, message_id):
         'details': []
     }
     
-    for contact in contacts:
-        try:
-            subscription_arn = contact.get('subscriptionArn', '')
-            
-            if subscription_arn == 'pending confirmation':
-                results['failed'] += 1
-                results['details'].append({
-                    'contactId': contact['contactId'],
-                    'type': contact['type'],
-                    'success': False,
-                    'error': 'Suscripción pendiente de confirmación'
-                })
-                continue
-            
-            result = publish_to_topic(contact, message_text, message_id)
-            
-            if result['success']:
-                results['sent'] += 1
-                update_contact_status(contact['contactId'], 'sent', message_id)
-            else:
-                results['failed'] += 1
-                update_contact_status(contact['contactId'], 'failed', message_id, result.get('error'))
-            
-            results['details'].append({
-                'contactId': contact['contactId'],
-                'type': contact['type'],
-                'success': result['success'],
-                'error': result.get('error')
-            })
-            
-        except Exception as e:
+    pending = [c for c in contacts if c.get('subscriptionArn', '') == 'pending confirmation']
+    to_send = [c for c in contacts if c.get('subscriptionArn', '') != 'pending confirmation']
+    
+    for contact in pending:
+        results['failed'] += 1
+        results['details'].append({
+            'contactId': contact['contactId'],
+            'type': contact['type'],
+            'success': False,
+            'error': 'Suscripción pendiente de confirmación'
+        })
+    
+    if mode == 'fanout':
+        deliveries = publish_fanout(to_send, message_text)
+    else:
+        deliveries = publish_per_contact(to_send, message_text, message_id)
+    
+    for contact, result in deliveries:
+        if result['success']:
+            results['sent'] += 1
+        else:
             results['failed'] += 1
-            results['details'].append({
-                'contactId': contact['contactId'],
-                'success': False,
-                'error': str(e)
-            })
+        
+        results['details'].append({
+            'contactId': contact['contactId'],
+            'type': contact['type'],
+            'success': result['success'],
+            'snsMessageId': result.get('messageId'),
+            'error': result.get('error')
+        })
     
-
-    x = delete_contacts_by_message_id(message_id)
+    # Sin guardar el estado de cada contacto: se borran justo después y sería
+    # una escritura más por contacto antes del DeleteItem
+    delete_contacts(all_contacts if all_contacts is not None else contacts)
     return results
 
 
-def publish_to_topic(contact, message, message_id):
+def publish_per_contact(contacts, message_text, message_id):
+    """Un publish por contacto, en paralelo. Devuelve [(contact, result), ...]."""
+    def publish(contact):
+        sns_rate_limiter.acquire()
+        return publish_to_topic(contact, message_text, message_id)
+    
+    if not contacts:
+        return []
+    with ThreadPoolExecutor(max_workers=min(SEND_MAX_WORKERS, len(contacts))) as pool:
+        return list(zip(contacts, pool.map(publish, contacts)))
+
+
+def publish_fanout(contacts, message_text):
+    """
+    Un publish por canal (y por bloque de FANOUT_MAX_RECIPIENTS destinatarios).
+    El resultado de cada publish se asigna a todos los contactos del bloque.
+    Devuelve [(contact, result), ...].
+    """
+    by_channel = {}
+    for contact in contacts:
+        by_channel.setdefault(contact['type'], []).append(contact)
+    
+    chunks = []
+    for channel, group in by_channel.items():
+        for i in range(0, len(group), FANOUT_MAX_RECIPIENTS):
+            chunks.append((channel, group[i:i + FANOUT_MAX_RECIPIENTS]))
+    
+    def publish(chunk):
+        channel, recipients = chunk
+        sns_rate_limiter.acquire()
+        return publish_to_recipients(recipients, message_text, channel)
+    
+    if not chunks:
+        return []
+    deliveries = []
+    with ThreadPoolExecutor(max_workers=min(SEND_MAX_WORKERS, len(chunks))) as pool:
+        for (channel, recipients), result in zip(chunks, pool.map(publish, chunks)):
+            deliveries.extend((contact, result) for contact in recipients)
+    return deliveries
+
+
+def publish_to_recipients(recipients, message, channel):
+    """Publica un único mensaje con contactId como String.Array de todos los destinatarios."""
     try:
         publish_params = {
             'TopicArn': SNS_TOPIC_ARN,
             'Message': message,
             'MessageAttributes': {
                 'contactId': {
-                    'DataType': 'String',
-                    'StringValue': contact['contactId']
+                    'DataType': 'String.Array',
+                    'StringValue': json.dumps([c['contactId'] for c in recipients])
                 }
             }
         }
         
-        if contact['type'] == 'email':
+        if channel == 'email':
             publish_params['Subject'] = 'Notificación'
         
-        print(f"Publicando mensaje a {contact['type']}: {contact.get('fullNumber') or contact.get('fullEmail')}")
+        logger.debug("Publicando mensaje fan-out a %d contactos (%s)", len(recipients), channel)
         
         response = sns.publish(**publish_params)
         
-        print(f"Mensaje publicado exitosamente. MessageId: {response['MessageId']}")
+        logger.debug("Mensaje publicado. MessageId: %s", response['MessageId'])
         
         return {
             'success': True,
@@ -507,36 +864,46 @@ def publish_to_topic(contact, message, message_id):
         }
         
     except Exception as e:
-        print(f"Error publicando mensaje: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.warning("Error publicando mensaje fan-out: %s", e)
         return {
             'success': False,
             'error': str(e)
         }
 
 
-def update_contact_status(contact_id, status, message_id, error=None):
+def publish_to_topic(contact, message, message_id):
     try:
-        update_expr = 'SET #status = :status, lastMessageId = :msgId, updatedAt = :updated'
-        expr_values = {
-            ':status': status,
-            ':msgId': message_id,
-            ':updated': datetime.now().isoformat()
+        publish_params = {
+            'TopicArn': SNS_TOPIC_ARN,
+            'Message': message,
+            'MessageAttributes': {
+                'contactId': {
+                    'DataType': 'String',
+                    'StringValue': contact['contactId']
+                }
+            }
         }
         
-        if error:
-            update_expr += ', lastError = :error'
-            expr_values[':error'] = error
+        if contact['type'] == 'email':
+            publish_params['Subject'] = 'Notificación'
+        
+        logger.debug("Publicando mensaje a %s: %s", contact['type'], contact.get('fullNumber') or contact.get('fullEmail'))
+        
+        response = sns.publish(**publish_params)
+        
+        logger.debug("Mensaje publicado. MessageId: %s", response['MessageId'])
+        
+        return {
+            'success': True,
+            'messageId': response['MessageId']
+        }
         
-        table.update_item(
-            Key={'contactId': contact_id},
-            UpdateExpression=update_expr,
-            ExpressionAttributeNames={'#status': 'status'},
-            ExpressionAttributeValues=expr_values
-        )
     except Exception as e:
-        print(f"Error actualizando contacto {contact_id}: {str(e)}")
+        logger.warning("Error publicando mensaje: %s", e, exc_info=True)
+        return {
+            'success': False,
+            'error': str(e)
+        }
 
 
 def response(status_code, body):
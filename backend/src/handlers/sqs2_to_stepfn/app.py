@@ -1,36 +1,25 @@
 import os
-import json
-import boto3
 import uuid
 import time
-import logging
 
-from aws_xray_sdk.core import xray_recorder, patch_all
-patch_all()
+from router_common import clients, xray
+xray.patch(("botocore",))
 
-log = logging.getLogger()
-log.setLevel(logging.INFO)
+from router_common import codec, envelope, logs, metrics
+from router_common.hops import HopRecorder
 
-sfn = boto3.client("stepfunctions")
+log = logs.get_logger("sqs2_to_stepfn")
+
+sfn = clients.client("stepfunctions")
 STATE_MACHINE_ARN = os.environ.get("STATE_MACHINE_ARN", "").strip()
 # Número de reintentos para start_execution (en caso de fallo transitorio)
 SFN_START_RETRIES = int(os.environ.get("SFN_START_RETRIES", "2"))
 SFN_START_BACKOFF = float(os.environ.get("SFN_START_BACKOFF", "0.2"))  # segundos
 
-def safe_json_load(s):
-    if not isinstance(s, str):
-        return s
-    s = s.strip()
-    if (s.startswith("{") and s.endswith("}")) or (s.startswith("[") and s.endswith("]")):
-        try:
-            return json.loads(s)
-        except Exception:
-            return s
-    return s
-
-def start_sfn_for_message(message_payload):
+def start_sfn_for_message(env):
     """Intenta arrancar una ejecución SFN con retries. Lanza excepción si falla."""
-    serialized = json.dumps(message_payload, ensure_ascii=False)
+    # El input es el propio envelope: el Pass state le añade $.status
+    serialized = envelope.encode(env)
     attempt = 0
     while True:
         try:
@@ -49,57 +38,63 @@ def start_sfn_for_message(message_payload):
             log.warning("start_execution fallo (attempt %d/%d): %s", attempt, SFN_START_RETRIES, str(e))
             if attempt > SFN_START_RETRIES:
                 raise
+            metrics.current().count("Retries")
             time.sleep(SFN_START_BACKOFF * attempt)
 
+@metrics.handler("sqs2_to_stepfn")
+@logs.handler(log)
 def lambda_handler(event, context):
     records = event.get("Records", [])
     if not records:
         log.info("No Records; nothing to do")
         return {"ok": True, "count": 0}
 
+    hop = HopRecorder("sqs2_to_stepfn")
+    m = metrics.current()
+    m.records_in(len(records))
     parsed = []
+    malformed = []
     for r in records:
-        raw_body = r.get("body", "")
-        body = safe_json_load(raw_body)
-        # si body es dict, normalizar campos que a su vez sean strings JSON
-        if isinstance(body, dict):
-            normalized = {}
-            for k, v in body.items():
-                if isinstance(v, str):
-                    normalized[k] = safe_json_load(v)
-                else:
-                    normalized[k] = v
-            body = normalized
+        # Un solo decode por mensaje (sin re-parsear campos que sean JSON en texto)
+        try:
+            env = envelope.decode(codec.decode_sqs(r), message_id=r.get("messageId"))
+        except ValueError as e:
+            # EnvelopeError/CodecError: solo este mensaje vuelve a la cola (y acaba en
+            # QueueTwoDLQ, de donde se puede reenviar con dlq_redrive); el resto sigue
+            log.error("Mensaje %s no decodificable: %s", r.get("messageId"), e)
+            m.count("MalformedRecords")
+            malformed.append(r.get("messageId"))
+            continue
+        env.trace = hop.observe(env.trace) or env.trace
         parsed.append({
             "messageId": r.get("messageId"),
             "receiptHandle": r.get("receiptHandle"),
-            "body": body
+            "envelope": env
         })
 
-    log.info("Procesando %d mensajes (parsed sample): %s", len(parsed), parsed[:5])
+    log.info("Procesando mensajes", extra={"records": len(parsed)})
+    log.debug("Parsed sample: %s", logs.payload([p["envelope"].to_dict() for p in parsed[:5]]))
+    hop.flush()
 
     if not STATE_MACHINE_ARN or STATE_MACHINE_ARN == "*" or STATE_MACHINE_ARN.lower().startswith("invalid"):
         log.error("STATE_MACHINE_ARN inválido (%s). No puedo start_execution.", STATE_MACHINE_ARN)
         # indicar reintento para todos
-        return {"batchItemFailures": [{"itemIdentifier": p["messageId"]} for p in parsed]}
+        return {"batchItemFailures": [{"itemIdentifier": mid} for mid in malformed + [p["messageId"] for p in parsed]]}
 
-    batch_failures = []
+    batch_failures = list(malformed)
     executions = []
 
     # START ONE EXECUTION PER MESSAGE (no chunking)
     for item in parsed:
-        payload = {
-            "messageId": item["messageId"],
-            "body": item["body"]
-        }
         try:
-            resp = start_sfn_for_message(payload)
+            resp = start_sfn_for_message(item["envelope"])
             executions.append(resp)
-            log.info("SFN started for message %s -> %s", item["messageId"], resp.get("executionArn"))
+            log.debug("SFN started for message %s -> %s", item["messageId"], resp.get("executionArn"))
         except Exception as e:
             log.exception("No se pudo start_execution para messageId %s: %s", item["messageId"], e)
             batch_failures.append(item["messageId"])
 
+    m.records_out(len(executions))
     if batch_failures:
         # informar a SQS cuáles messages deben reintentarse
         log.warning("Mensajes que fallaron y serán reintentados: %s", batch_failures)
@@ -1,11 +1,17 @@
-import boto3
-import os
+from router_common import connections, logs
 
-ddb = boto3.resource("dynamodb")
-table = ddb.Table(os.environ["CONNECTIONS_TABLE"])
+logger = logs.get_logger("websocket_connect")
 
+@logs.handler(logger)
 def lambda_handler(event, context):
     connection_id = event["requestContext"]["connectionId"]
-    table.put_item(Item={"connectionId": connection_id})
-    print(f"Added connection: {connection_id}")
-    return {"statusCode": 200}
\ No newline at end of file
+    # wss://...?channels=message:123,all (obligatorio)
+    params = event.get("queryStringParameters") or {}
+    requested = (params.get("channels") or "").split(",")
+    if not connections.valid_channels(requested):
+        # Sin canales no recibiría nada: los resultados con messageId solo van a message:<id>
+        logger.warning("Rejected connection without channels: %s", connection_id)
+        return {"statusCode": 400, "body": "channels is required, e.g. ?channels=message:<id> or ?channels=all"}
+    channels = connections.register_connection(connection_id, requested)
+    logger.info("Added connection: %s", connection_id, extra={"channels": channels})
+    return {"statusCode": 200}
@@ -1,8 +1,40 @@
 import json
 
+from router_common import connections, logs
+
+logger = logs.get_logger("websocket_default")
+
+MAX_CHANNELS_PER_REQUEST = 20
+
+@logs.handler(logger)
 def lambda_handler(event, context):
-    print("Message Received by WebSocket:", json.dumps(event))
+    logger.debug("Message Received by WebSocket: %s", logs.payload(event))
+    connection_id = event["requestContext"]["connectionId"]
+
+    try:
+        body = json.loads(event.get("body") or "{}")
+    except json.JSONDecodeError:
+        body = {}
+
+    # {"action": "subscribe" | "unsubscribe", "channel": "message:123"} o "channels": [...]
+    action = body.get("action") if isinstance(body, dict) else None
+    if action in ("subscribe", "unsubscribe"):
+        channels = body.get("channels") or [body.get("channel")]
+        if not isinstance(channels, list) or len(channels) > MAX_CHANNELS_PER_REQUEST:
+            return {
+                "statusCode": 400,
+                "body": json.dumps({"message": f"Máximo {MAX_CHANNELS_PER_REQUEST} canales por petición"})
+            }
+        if action == "subscribe":
+            done = connections.subscribe(connection_id, channels)
+        else:
+            done = connections.unsubscribe(connection_id, channels)
+        return {
+            "statusCode": 200,
+            "body": json.dumps({"message": f"{action} OK", "channels": done})
+        }
+
     return {
         "statusCode": 200,
         "body": json.dumps({"message": "Mensaje recibido"})
-    }
\ No newline at end of file
+    }
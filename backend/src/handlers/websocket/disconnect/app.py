@@ -1,11 +1,10 @@
-import boto3
-import os
+from router_common import connections, logs
 
-ddb = boto3.resource("dynamodb")
-table = ddb.Table(os.environ["CONNECTIONS_TABLE"])
+logger = logs.get_logger("websocket_disconnect")
 
+@logs.handler(logger)
 def lambda_handler(event, context):
     connection_id = event["requestContext"]["connectionId"]
-    table.delete_item(Key={"connectionId": connection_id})
-    print(f"Removed connection: {connection_id}")
-    return {"statusCode": 200}
\ No newline at end of file
+    removed = connections.remove_connection(connection_id)
+    logger.info("Removed connection: %s", connection_id, extra={"items": removed})
+    return {"statusCode": 200}
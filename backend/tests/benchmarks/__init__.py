@@ -0,0 +1,9 @@
+"""
+Benchmarks por handler con clientes AWS falsos (ver runner.py y cases.py).
+
+Desde backend/:
+    python -m tests.benchmarks --save benchmarks-baseline.json
+    python -m tests.benchmarks --compare benchmarks-baseline.json --threshold 0.15
+"""
+# tests.simulator pone el layer (dependencies/python) en el sys.path, como conftest.py
+from tests import simulator  # noqa: F401
@@ -0,0 +1,99 @@
+"""
+CLI de los benchmarks. Desde backend/:
+
+    python -m tests.benchmarks                                  # todos los casos
+    python -m tests.benchmarks lambda_dispatcher eb_to_sqs2 --batch-sizes 1,10,100
+    python -m tests.benchmarks --latency sqs=2 --latency events=5
+    python -m tests.benchmarks --save benchmarks-baseline.json
+    python -m tests.benchmarks --compare benchmarks-baseline.json --threshold 0.15
+    python -m tests.benchmarks --codecs                         # solo las codificaciones de payload
+
+--compare termina con código 1 si alguna métrica empeora más que el umbral.
+"""
+import argparse
+import json
+import sys
+
+from . import cases, codecs, runner
+
+
+def _row(key, result):
+    return (f"{key:<34}{result['opsPerSec']:>12,.0f}{result['p50UsPerRecord']:>12.1f}"
+            f"{result['p99UsPerRecord']:>12.1f}{result['allocBytesPerRecord']:>12,}")
+
+
+def _codec_row(key, result):
+    return (f"{key:<40}{result['encoding']:>14}{result['bytesPerMessage']:>10,}"
+            f"{result['chunks64k']:>8}{result['encodeUs']:>12.1f}{result['decodeUs']:>12.1f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("cases", nargs="*", help="casos a ejecutar (por defecto, todos)")
+    parser.add_argument("--batch-sizes", help="lista separada por comas (por defecto, la de cada caso)")
+    parser.add_argument("--latency", action="append", default=[], metavar="SERVICIO=MS",
+                        help="latencia por llamada de un cliente falso (repetible)")
+    parser.add_argument("--min-time", type=float, default=0.5, help="segundos de medición por caso y lote")
+    parser.add_argument("--save", metavar="FICHERO", help="guarda los resultados como baseline")
+    parser.add_argument("--compare", metavar="FICHERO", help="compara con un baseline")
+    parser.add_argument("--threshold", type=float, default=0.15, help="empeoramiento relativo permitido")
+    parser.add_argument("--alloc-threshold", type=float, help="umbral para allocBytesPerRecord (por defecto, --threshold)")
+    parser.add_argument("--json", action="store_true", help="resultados en JSON por stdout")
+    parser.add_argument("--codecs", action="store_true",
+                        help="mide bytes y encode/decode por codificación de payload en lugar de los handlers")
+    args = parser.parse_args(argv)
+
+    if args.codecs:
+        if not args.json:
+            print(f"{'payload/codificación':<40}{'resultado':>14}{'bytes':>10}{'64KB':>8}"
+                  f"{'encode µs':>12}{'decode µs':>12}")
+        progress = None if args.json else lambda key, result: print(_codec_row(key, result), flush=True)
+        results = codecs.run(min_time=min(args.min_time, 0.2), progress=progress)
+        if args.json:
+            print(json.dumps(results, indent=2))
+        return 0
+
+    try:
+        selected = cases.get_cases(args.cases)
+    except KeyError as e:
+        parser.error(e.args[0])
+    batch_sizes = [int(n) for n in args.batch_sizes.split(",")] if args.batch_sizes else None
+    latency = {}
+    for item in args.latency:
+        service, _, ms = item.partition("=")
+        latency[service] = float(ms)
+
+    if not args.json:
+        print(f"{'caso/lote':<34}{'ops/s':>12}{'p50 µs/reg':>12}{'p99 µs/reg':>12}{'bytes/reg':>12}")
+    progress = None if args.json else lambda key, result: print(_row(key, result), flush=True)
+    current = runner.run(selected, batch_sizes=batch_sizes, latency_ms=latency,
+                         min_time=args.min_time, progress=progress)
+
+    if args.json:
+        print(json.dumps(current, indent=2))
+    for name, reason in current["skipped"].items():
+        print(f"omitido {name}: {reason}", file=sys.stderr)
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as fh:
+            json.dump(current, fh, indent=2, sort_keys=True)
+            fh.write("\n")
+        print(f"Baseline guardado en {args.save}", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as fh:
+            baseline = json.load(fh)
+        warning = runner.python_mismatch(baseline)
+        if warning:
+            print(f"AVISO: {warning}", file=sys.stderr)
+        regressions = runner.compare(baseline, current, args.threshold, args.alloc_threshold)
+        for key, metric, old, new, change in regressions:
+            print(f"REGRESIÓN {key} {metric}: {old} -> {new} ({change:+.0%})", file=sys.stderr)
+        if regressions:
+            return 1
+        print(f"Sin regresiones por encima del {args.threshold:.0%} frente a {args.compare}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,231 @@
+"""
+Un caso por handler: el evento de su camino caliente para un tamaño de lote,
+el entorno con el que se importa y los clientes falsos que necesita.
+
+"Registros" es la unidad que escala con el lote: mensajes SQS/SNS/stream,
+contactos de un shard de envío o funciones monitorizadas en lambda_metrics.
+Los handlers de Bedrock solo leen el primer registro, así que su lote es 1.
+"""
+import json
+from dataclasses import dataclass, field
+from typing import Callable
+
+from router_common import envelope, hops, secrets_cache
+
+from tests.simulator.services import serialize
+
+from . import fakes
+
+STATE_MACHINE_ARN = "arn:aws:states:us-east-1:000000000000:stateMachine:Bench"
+QUEUE_URL = "https://sqs.us-east-1.amazonaws.com/000000000000/bench"
+DEFAULT_BATCH_SIZES = (1, 10, 100)
+
+MESSAGE = "Hola, este es un mensaje de prueba con algo de texto para el benchmark"
+
+
+@dataclass
+class Case:
+    name: str
+    handler: str
+    # event(batch_size) -> evento; se construye fuera de la medición
+    event: Callable
+    # clients(faults) -> {(kind, servicio): objeto} para router_common.clients.set_client
+    clients: Callable
+    env: dict = field(default_factory=dict)
+    batch_sizes: tuple = DEFAULT_BATCH_SIZES
+    # setup(module, faults) tras el import; before_each(module, batch_size) antes de cada invocación
+    setup: Callable = None
+    before_each: Callable = None
+
+
+def _payload(i):
+    return envelope.new(f"{MESSAGE} #{i}", trace=hops.new_trace()).to_dict()
+
+
+def _sqs_event(bodies):
+    return {"Records": [{
+        "messageId": f"m-{i}",
+        "receiptHandle": f"r-{i}",
+        "body": body,
+        "attributes": {"ApproximateReceiveCount": "1", "SentTimestamp": str(hops.now_ms())},
+        "messageAttributes": {},
+        "eventSource": "aws:sqs",
+        "eventSourceARN": "arn:aws:sqs:us-east-1:000000000000:bench",
+    } for i, body in enumerate(bodies)]}
+
+
+def _sns_event(messages):
+    return {"Records": [{
+        "EventSource": "aws:sns",
+        "Sns": {"MessageId": f"sns-{i}", "TopicArn": "arn:aws:sns:us-east-1:000000000000:bench", "Message": message},
+    } for i, message in enumerate(messages)]}
+
+
+def _sfn_status_event(i):
+    output = dict(_payload(i), status={"status": "ok"})
+    return json.dumps({
+        "source": "aws.states",
+        "detail-type": "Step Functions Execution Status Change",
+        "detail": {"stateMachineArn": STATE_MACHINE_ARN, "status": "SUCCEEDED", "output": json.dumps(output)},
+    })
+
+
+def _stream_event(n):
+    records = []
+    for i in range(n):
+        item = {"MessageId": f"m-{i}", "Message": f"{MESSAGE} #{i}", "Trace": hops.new_trace()}
+        records.append({
+            "eventName": "INSERT",
+            "eventSource": "aws:dynamodb",
+            "dynamodb": {"Keys": {"MessageId": {"S": item["MessageId"]}}, "NewImage": serialize(item)["M"]},
+        })
+    return {"Records": records}
+
+
+def _s3_notification(key="m-0_2026-01-01T00_00_00.json"):
+    return _sns_event([json.dumps({"Records": [{
+        "eventSource": "aws:s3",
+        "eventName": "ObjectCreated:Put",
+        "s3": {"bucket": {"name": "bench-bucket"}, "object": {"key": key, "size": 128}},
+    }]})])
+
+
+_S3_ITEM = json.dumps({"eventType": "INSERT", "item": {
+    "MessageId": "m-0", "Message": MESSAGE, "Trace": {"traceId": "t", "ingressTs": 0, "lastHopTs": 0},
+}}).encode("utf-8")
+
+
+def _contacts(n):
+    contacts = []
+    for i in range(n):
+        contact = {"contactId": f"c-{i}", "lastMessageId": "msg-1",
+                   "subscriptionArn": f"arn:aws:sns:us-east-1:000000000000:bench:{i}"}
+        if i % 2:
+            contact.update(type="email", fullEmail=f"user{i}@example.com")
+        else:
+            contact.update(type="phone", fullNumber=f"+52155{i:08d}")
+        contacts.append(contact)
+    return contacts
+
+
+def _reset_metrics(module, batch_size):
+    # Camino sin caché: descubrimiento, GetMetricData y fusión de todas las series
+    module.MONITORED_FUNCTIONS[:] = [f"bench-function-{i}" for i in range(batch_size)]
+    module._discovery_cache.clear()
+    module._fresh_markers.clear()
+    module._series_cache.clear()
+
+
+def _setup_opensearch(module, faults):
+    module.http = fakes.FakeHTTPSession(faults)
+    secrets_cache._client = fakes.FakeSecretsManager()
+    secrets_cache.invalidate()
+
+
+CASES = [
+    Case(
+        name="message_router_queue",
+        handler="message_router_queue",
+        event=lambda n: {"httpMethod": "POST",
+                         "body": json.dumps({"messages": [f"{MESSAGE} #{i}" for i in range(n)]})},
+        clients=lambda f: {("client", "sqs"): fakes.FakeSQS(f)},
+        env={"QUEUE_URL": QUEUE_URL},
+    ),
+    Case(
+        name="lambda_dispatcher",
+        handler="lambda_dispatcher",
+        event=lambda n: _sqs_event([json.dumps(_payload(i)) for i in range(n)]),
+        clients=lambda f: {("client", "events"): fakes.FakeEventBridge(f)},
+    ),
+    Case(
+        name="eb_to_sqs2",
+        handler="eb_to_sqs2",
+        event=lambda n: {"source": "my.app.messages", "detail-type": "MessageReceived",
+                         "detail": {"messages": [_payload(i) for i in range(n)]}},
+        clients=lambda f: {("client", "sqs"): fakes.FakeSQS(f)},
+        env={"QUEUE_URL": QUEUE_URL},
+    ),
+    Case(
+        name="sqs2_to_stepfn",
+        handler="sqs2_to_stepfn",
+        event=lambda n: _sqs_event([json.dumps(_payload(i)) for i in range(n)]),
+        clients=lambda f: {("client", "stepfunctions"): fakes.FakeStepFunctions(f)},
+        env={"STATE_MACHINE_ARN": STATE_MACHINE_ARN},
+    ),
+    Case(
+        name="lambda_dynamo",
+        handler="lambda_dynamo",
+        event=lambda n: _sns_event([_sfn_status_event(i) for i in range(n)]),
+        clients=lambda f: {("resource", "dynamodb"): fakes.FakeDynamoDB(f)},
+        env={"TABLE_NAME": "MessagesTable"},
+    ),
+    Case(
+        name="lambda_ddb_to_s3",
+        handler="lambda_ddb_to_s3",
+        event=_stream_event,
+        clients=lambda f: {("client", "s3"): fakes.FakeS3(f)},
+        env={"S3_BUCKET": "bench-bucket"},
+    ),
+    Case(
+        name="lambda_s3_to_bedrock",
+        handler="lambda_s3_to_bedrock",
+        event=lambda n: _s3_notification(),
+        clients=lambda f: {("client", "s3"): fakes.FakeS3(f, _S3_ITEM),
+                           ("client", "bedrock-runtime"): fakes.FakeBedrockRuntime(f)},
+        env={"WEBSOCKET_ENDPOINT": None, "VALKEY_HOST": None},
+        batch_sizes=(1,),
+    ),
+    Case(
+        name="lambda_s3_to_bedrock_image",
+        handler="lambda_s3_to_bedrock_image",
+        event=lambda n: _s3_notification(),
+        clients=lambda f: {("client", "s3"): fakes.FakeS3(f, _S3_ITEM),
+                           ("client", "bedrock-runtime"): fakes.FakeBedrockRuntime(f)},
+        env={"OUTPUT_BUCKET": "bench-images"},
+        batch_sizes=(1,),
+    ),
+    Case(
+        name="index_to_opensearch",
+        handler="index_to_opensearch",
+        event=lambda n: _sqs_event([_s3_notification(f"m-{i}.json")["Records"][0]["Sns"]["Message"]
+                                    for i in range(n)]),
+        clients=lambda f: {("client", "s3"): fakes.FakeS3(f, _S3_ITEM)},
+        env={"OPENSEARCH_ENDPOINT": "bench.local", "OPENSEARCH_MASTER_SECRET_ARN": "arn:bench",
+             "SAVED_OBJECTS_BOOTSTRAP": "event"},
+        setup=_setup_opensearch,
+    ),
+    Case(
+        name="sms_validation_send",
+        handler="sms_validation_send",
+        # Worker de un shard de envío asíncrono con n contactos
+        event=lambda n: _sqs_event([json.dumps({"jobId": "job-1", "shardId": "0", "messageId": "msg-1",
+                                                "message": MESSAGE, "mode": "per_contact",
+                                                "contacts": _contacts(n)})]),
+        clients=lambda f: {("resource", "dynamodb"): fakes.FakeDynamoDB(
+                               f, SendJobsTable={"update_attributes": {"pending": 1}}),
+                           ("client", "sns"): fakes.FakeSNS(f),
+                           ("client", "sqs"): fakes.FakeSQS(f)},
+        env={"EMAIL_SNS_TOPIC_ARN": "arn:aws:sns:us-east-1:000000000000:bench",
+             "SEND_JOBS_TABLE_NAME": "SendJobsTable", "SEND_JOBS_QUEUE_URL": QUEUE_URL,
+             "SNS_PUBLISH_RATE": "1000000000"},
+    ),
+    Case(
+        name="lambda_metrics",
+        handler="lambda_metrics",
+        event=lambda n: {"httpMethod": "GET", "headers": {}},
+        clients=lambda f: {("client", "cloudwatch"): fakes.FakeCloudWatch(f)},
+        env={"STACK_NAME": None, "MONITOR_TAG": None, "VALKEY_HOST": None},
+        batch_sizes=(1, 10, 50),
+        before_each=_reset_metrics,
+    ),
+]
+
+
+def get_cases(names=None):
+    if not names:
+        return list(CASES)
+    by_name = {case.name: case for case in CASES}
+    unknown = [n for n in names if n not in by_name]
+    if unknown:
+        raise KeyError(f"Casos desconocidos: {', '.join(unknown)} (disponibles: {', '.join(by_name)})")
+    return [by_name[n] for n in names]
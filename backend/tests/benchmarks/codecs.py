@@ -0,0 +1,78 @@
+"""
+Coste de cada codificación de router_common.codec sobre payloads del pipeline:
+bytes por mensaje (lo que se factura: SQS/SNS/EventBridge cobran por bloques
+de 64 KB), bloques de 64 KB y µs de encode/decode por mensaje.
+
+Las codificaciones cuya dependencia no está instalada (msgpack, cbor2,
+zstandard) se omiten. La compresión se fuerza con umbral 0; si no compensa,
+encode() la descarta y el resultado lo refleja en "encoding".
+"""
+import time
+
+from router_common import codec, envelope, hops
+
+from .cases import MESSAGE, _contacts
+
+CHUNK_BYTES = 64 * 1024
+
+ENCODINGS = (
+    (codec.JSON, "none"),
+    (codec.JSON, codec.ZLIB),
+    (codec.JSON, codec.ZSTD),
+    (codec.MSGPACK, "none"),
+    (codec.MSGPACK, codec.ZLIB),
+    (codec.MSGPACK, codec.ZSTD),
+    (codec.CBOR, "none"),
+    (codec.CBOR, codec.ZLIB),
+)
+
+
+def _envelope(text):
+    return envelope.new(text, trace=hops.new_trace()).to_dict()
+
+
+# nombre -> payload: el envelope habitual, uno con texto largo y un shard de envío
+PAYLOADS = {
+    "envelope": _envelope(MESSAGE),
+    "envelope-8k": _envelope(" ".join([MESSAGE] * 115)),
+    "send-shard-100": {"jobId": "job-1", "shardId": "0", "messageId": "msg-1", "message": MESSAGE,
+                       "mode": "per_contact", "contacts": _contacts(100)},
+}
+
+
+def _time_per_call(fn, min_time):
+    iterations = 0
+    started = time.perf_counter()
+    deadline = started + min_time
+    while iterations < 5 or time.perf_counter() < deadline:
+        fn()
+        iterations += 1
+    return (time.perf_counter() - started) / iterations
+
+
+def measure(payload, name, compression, min_time=0.2):
+    body, encoding = codec.encode(payload, codec=name, compression=compression, threshold=0)
+    assert codec.decode(body, encoding) == payload
+    size = len(body.encode("utf-8"))
+    return {
+        "encoding": encoding,
+        "bytesPerMessage": size,
+        "chunks64k": -(-size // CHUNK_BYTES),
+        "encodeUs": round(_time_per_call(
+            lambda: codec.encode(payload, codec=name, compression=compression, threshold=0), min_time) * 1e6, 2),
+        "decodeUs": round(_time_per_call(lambda: codec.decode(body, encoding), min_time) * 1e6, 2),
+    }
+
+
+def run(min_time=0.2, progress=None):
+    """{"<payload>/<formato>+<compresión>": resultado} para las codificaciones disponibles."""
+    results = {}
+    for payload_name, payload in PAYLOADS.items():
+        for name, compression in ENCODINGS:
+            if not codec.available(name) or (compression != "none" and not codec.available(compression)):
+                continue
+            key = f"{payload_name}/{name}+{compression}"
+            results[key] = measure(payload, name, compression, min_time=min_time)
+            if progress:
+                progress(key, results[key])
+    return results
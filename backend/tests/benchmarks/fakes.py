@@ -0,0 +1,209 @@
+"""
+Clientes AWS falsos para los benchmarks: aceptan las llamadas de los handlers,
+descartan lo que reciben y devuelven respuestas mínimas válidas. La latencia
+por llamada se modela con simulator.services.Faults (ms por servicio, 0 por
+defecto, para medir solo el coste del código).
+"""
+import io
+import json
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from tests.simulator.services import Faults
+
+
+class FakeSQS:
+    def __init__(self, faults):
+        self.faults = faults
+
+    def send_message(self, QueueUrl, MessageBody, **_):
+        self.faults.call("sqs", "SendMessage")
+        return {"MessageId": str(uuid.uuid4())}
+
+    def send_message_batch(self, QueueUrl, Entries):
+        self.faults.call("sqs", "SendMessageBatch")
+        return {"Successful": [{"Id": e["Id"], "MessageId": str(uuid.uuid4())} for e in Entries]}
+
+
+class FakeEventBridge:
+    def __init__(self, faults):
+        self.faults = faults
+
+    def put_events(self, Entries):
+        self.faults.call("events", "PutEvents")
+        return {"FailedEntryCount": 0, "Entries": [{"EventId": str(uuid.uuid4())} for _ in Entries]}
+
+
+class FakeStepFunctions:
+    def __init__(self, faults):
+        self.faults = faults
+
+    def start_execution(self, stateMachineArn, input, name=None, **_):
+        self.faults.call("stepfunctions", "StartExecution")
+        return {"executionArn": f"{stateMachineArn}:{name}", "startDate": datetime.now(timezone.utc),
+                "ResponseMetadata": {"HTTPStatusCode": 200}}
+
+
+class FakeS3:
+    """get_object devuelve siempre `body` (bytes), sea cual sea la clave."""
+
+    def __init__(self, faults, body=b"{}"):
+        self.faults = faults
+        self.body = body
+
+    def put_object(self, Bucket, Key, Body, **_):
+        self.faults.call("s3", "PutObject")
+        return {"ETag": '"0"'}
+
+    def get_object(self, Bucket, Key, **_):
+        self.faults.call("s3", "GetObject")
+        return {"Body": io.BytesIO(self.body), "ContentLength": len(self.body)}
+
+
+class FakeBedrockRuntime:
+    def __init__(self, faults):
+        self.faults = faults
+        self._image = json.dumps({"images": ["iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNk"
+                                             "YPhfDwAChwGA60e6kgAAAABJRU5ErkJggg=="]}).encode("utf-8")
+
+    def converse(self, modelId, messages, **_):
+        self.faults.call("bedrock-runtime", "Converse")
+        return {"output": {"message": {"role": "assistant", "content": [{"text": "ok"}]}}}
+
+    def invoke_model(self, modelId, body, **_):
+        self.faults.call("bedrock-runtime", "InvokeModel")
+        return {"body": io.BytesIO(self._image)}
+
+
+class FakeSNS:
+    def __init__(self, faults):
+        self.faults = faults
+
+    def publish(self, **_):
+        self.faults.call("sns", "Publish")
+        return {"MessageId": str(uuid.uuid4())}
+
+    def unsubscribe(self, SubscriptionArn):
+        self.faults.call("sns", "Unsubscribe")
+        return {}
+
+
+class _BatchWriter:
+    def __init__(self, table):
+        self.table = table
+        self.pending = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._flush()
+        return False
+
+    def put_item(self, Item):
+        self._add()
+
+    def delete_item(self, Key):
+        self._add()
+
+    def _add(self):
+        # BatchWriteItem envía de 25 en 25
+        self.pending += 1
+        if self.pending == 25:
+            self._flush()
+
+    def _flush(self):
+        if self.pending:
+            self.table.faults.call("dynamodb", "BatchWriteItem")
+            self.pending = 0
+
+
+class FakeTable:
+    def __init__(self, faults, name, query_items=None, update_attributes=None):
+        self.faults = faults
+        self.name = name
+        self.query_items = query_items or []
+        self.update_attributes = update_attributes or {}
+
+    def put_item(self, Item, **_):
+        self.faults.call("dynamodb", "PutItem")
+        return {}
+
+    def get_item(self, Key, **_):
+        self.faults.call("dynamodb", "GetItem")
+        return {}
+
+    def update_item(self, **_):
+        self.faults.call("dynamodb", "UpdateItem")
+        return {"Attributes": dict(self.update_attributes)}
+
+    def query(self, **_):
+        self.faults.call("dynamodb", "Query")
+        return {"Items": list(self.query_items)}
+
+    def batch_writer(self, **_):
+        return _BatchWriter(self)
+
+
+class FakeDynamoDB:
+    """Resource: Table(name) crea la tabla falsa la primera vez que se pide."""
+
+    def __init__(self, faults, **table_options):
+        self.faults = faults
+        self.table_options = table_options
+        self.tables = {}
+
+    def Table(self, name):
+        if name not in self.tables:
+            self.tables[name] = FakeTable(self.faults, name, **self.table_options.get(name, {}))
+        return self.tables[name]
+
+
+class FakeCloudWatch:
+    """get_metric_data con `points` puntos por query (un minuto entre puntos)."""
+
+    def __init__(self, faults, points=15):
+        self.faults = faults
+        self.points = points
+
+    def get_metric_data(self, MetricDataQueries, StartTime, EndTime, **_):
+        self.faults.call("cloudwatch", "GetMetricData")
+        end = EndTime.replace(second=0, microsecond=0)
+        timestamps = [end - timedelta(minutes=i) for i in range(self.points - 1, -1, -1)]
+        return {"MetricDataResults": [
+            {"Id": q["Id"], "Timestamps": timestamps, "Values": [float(i) for i in range(self.points)],
+             "StatusCode": "Complete"}
+            for q in MetricDataQueries
+        ]}
+
+
+class FakeSecretsManager:
+    def get_secret_value(self, SecretId):
+        return {"SecretString": json.dumps({"username": "bench", "password": "bench"})}
+
+
+class FakeHTTPResponse:
+    def __init__(self, payload, status_code=200):
+        self.payload = payload
+        self.status_code = status_code
+
+    def raise_for_status(self):
+        return None
+
+    def json(self):
+        return self.payload
+
+
+class FakeHTTPSession:
+    """Sustituye a la requests.Session del handler de OpenSearch (_bulk sin errores)."""
+
+    def __init__(self, faults):
+        self.faults = faults
+
+    def request(self, method, url, **kwargs):
+        self.faults.call("opensearch", method)
+        if url.endswith("/_bulk"):
+            docs = kwargs.get("data", b"").count(b"\n") // 2
+            return FakeHTTPResponse({"errors": False, "items": [{"index": {"status": 201}}] * docs})
+        return FakeHTTPResponse({"result": "created"})
+
@@ -0,0 +1,188 @@
+"""
+Medición de los casos (cases.py) y comparación con un baseline.
+
+Por cada caso y tamaño de lote:
+  - opsPerSec: registros procesados por segundo
+  - p50UsPerRecord / p99UsPerRecord: duración de cada invocación / registros (µs)
+  - allocBytesPerRecord: mediana del pico de memoria asignada (tracemalloc)
+    por invocación / registros, en una pasada aparte para no distorsionar los tiempos
+
+Los prints y el logging de los handlers se escriben en un sumidero: su coste
+de formateo cuenta (en Lambda también se paga) pero no el de la terminal.
+Los logs usan el nivel configurado (LOG_LEVEL, INFO), sin muestreo de DEBUG.
+"""
+import contextlib
+import gc
+import logging
+import platform
+import statistics
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+from router_common import clients, logs
+
+from tests.simulator import load_handler
+
+from . import fakes
+
+# Métricas comparadas: (campo, True si más es mejor). El p99 se informa pero
+# no se compara: con pocas iteraciones es demasiado ruidoso para fallar por él
+COMPARED_METRICS = (
+    ("opsPerSec", True),
+    ("p50UsPerRecord", False),
+    ("allocBytesPerRecord", False),
+)
+BASE_ENV = {"AWS_REGION": "us-east-1", "AWS_DEFAULT_REGION": "us-east-1", "XRAY_ENABLED": "false"}
+
+
+class _Sink:
+    def write(self, data):
+        return len(data)
+
+    def flush(self):
+        pass
+
+
+def _percentile(ordered, p):
+    return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+
+@contextlib.contextmanager
+def _quiet():
+    """stdout y el logging raíz a un sumidero, con el nivel INFO de los handlers."""
+    sink = _Sink()
+    handler = logging.StreamHandler(sink)
+    # El mismo formato JSON que en Lambda (router_common.logs)
+    handler.setFormatter(logs.JsonFormatter())
+    root = logging.getLogger()
+    root.addHandler(handler)
+    try:
+        with contextlib.redirect_stdout(sink), contextlib.redirect_stderr(sink):
+            yield
+    finally:
+        root.removeHandler(handler)
+
+
+def load_case(case, faults):
+    """Inyecta los clientes falsos e importa el handler. Devuelve el módulo o lanza ImportError."""
+    clients.reset()
+    for (kind, service), obj in case.clients(faults).items():
+        clients.set_client(service, obj, kind=kind)
+    module = load_handler(case.handler, dict(BASE_ENV, **case.env))
+    if case.setup:
+        case.setup(module, faults)
+    return module
+
+
+def _invoke(module, case, batch_size):
+    if case.before_each:
+        case.before_each(module, batch_size)
+    event = case.event(batch_size)
+    started = time.perf_counter()
+    module.lambda_handler(event, None)
+    return time.perf_counter() - started
+
+
+def measure(module, case, batch_size, min_time=0.5, min_iterations=5, warmup=3, alloc_iterations=5):
+    records = batch_size
+    with _quiet():
+        for _ in range(warmup):
+            _invoke(module, case, batch_size)
+
+        durations = []
+        gc_was_enabled = gc.isenabled()
+        gc.collect()
+        gc.disable()
+        try:
+            deadline = time.perf_counter() + min_time
+            while len(durations) < min_iterations or time.perf_counter() < deadline:
+                durations.append(_invoke(module, case, batch_size))
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+
+        allocations = []
+        tracemalloc.start()
+        try:
+            for _ in range(alloc_iterations):
+                if case.before_each:
+                    case.before_each(module, batch_size)
+                event = case.event(batch_size)
+                tracemalloc.reset_peak()
+                baseline = tracemalloc.get_traced_memory()[0]
+                module.lambda_handler(event, None)
+                allocations.append(tracemalloc.get_traced_memory()[1] - baseline)
+        finally:
+            tracemalloc.stop()
+
+    per_record = sorted(d / records * 1e6 for d in durations)
+    return {
+        "iterations": len(durations),
+        "opsPerSec": round(records * len(durations) / sum(durations), 1),
+        "p50UsPerRecord": round(_percentile(per_record, 50), 2),
+        "p99UsPerRecord": round(_percentile(per_record, 99), 2),
+        "allocBytesPerRecord": round(statistics.median(allocations) / records),
+    }
+
+
+def run(cases, batch_sizes=None, latency_ms=None, min_time=0.5, progress=None):
+    """Ejecuta los casos y devuelve el documento de resultados (el formato de los baselines)."""
+    results = {}
+    skipped = {}
+    for case in cases:
+        faults = fakes.Faults(latency_ms=latency_ms)
+        try:
+            module = load_case(case, faults)
+        except ImportError as e:
+            # p.ej. boto3 o requests no instalados
+            skipped[case.name] = f"{type(e).__name__}: {e}"
+            continue
+        # Los casos de un solo registro no escalan con el lote
+        sizes = case.batch_sizes if case.batch_sizes == (1,) or not batch_sizes else batch_sizes
+        for batch_size in sizes:
+            key = f"{case.name}/{batch_size}"
+            results[key] = measure(module, case, batch_size, min_time=min_time)
+            if progress:
+                progress(key, results[key])
+    clients.reset()
+    return {
+        "meta": {
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "latencyMs": dict(latency_ms or {}),
+        },
+        "results": results,
+        "skipped": skipped,
+    }
+
+
+def compare(baseline, current, threshold=0.15, alloc_threshold=None):
+    """
+    Regresiones de current frente a baseline: [(clave, métrica, antes, ahora, cambio)].
+    cambio es relativo (0.2 = 20 % peor). Solo se comparan las claves presentes en ambos.
+    """
+    alloc_threshold = threshold if alloc_threshold is None else alloc_threshold
+    regressions = []
+    for key, now in current["results"].items():
+        before = baseline.get("results", {}).get(key)
+        if not before:
+            continue
+        for metric, higher_is_better in COMPARED_METRICS:
+            old, new = before.get(metric), now.get(metric)
+            if not old or new is None:
+                continue
+            change = (old - new) / old if higher_is_better else (new - old) / old
+            limit = alloc_threshold if metric == "allocBytesPerRecord" else threshold
+            if change > limit:
+                regressions.append((key, metric, old, new, change))
+    return regressions
+
+
+def python_mismatch(baseline):
+    """Aviso si el baseline se generó con otra versión de Python (los tiempos no son comparables)."""
+    version = baseline.get("meta", {}).get("python")
+    if version and version.rsplit(".", 1)[0] != platform.python_version().rsplit(".", 1)[0]:
+        return f"baseline generado con Python {version}, ahora {platform.python_version()}"
+    return None
@@ -0,0 +1,9 @@
+import os
+import sys
+
+# Los handlers se importan como handlers.<nombre>.app (backend/src) y el código compartido
+# vive en la capa CommonDependenciesLayer (dependencies/python), que en Lambda es /opt/python.
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+for path in (os.path.join(ROOT, "backend", "src"), os.path.join(ROOT, "dependencies", "python")):
+    if path not in sys.path:
+        sys.path.append(path)
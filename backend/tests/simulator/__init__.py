@@ -0,0 +1,4 @@
+"""Simulador en proceso del pipeline de mensajes (ver pipeline.py)."""
+from .pipeline import Pipeline, SimulationConfig, load_handler, simulate
+
+__all__ = ["Pipeline", "SimulationConfig", "load_handler", "simulate"]
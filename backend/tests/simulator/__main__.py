@@ -0,0 +1,84 @@
+"""
+CLI del simulador. Desde backend/:
+
+    python -m tests.simulator --messages 500
+    python -m tests.simulator --messages 200 --stepfn-batch-size 5 --latency sqs=5 --latency bedrock-runtime=300
+    python -m tests.simulator --messages 200 --throttle stepfunctions=0.1 --report-batch-item-failures --json
+"""
+import argparse
+import json
+import sys
+
+from .pipeline import SimulationConfig, simulate
+
+
+def _service_values(items, cast):
+    values = {}
+    for item in items:
+        service, _, value = item.partition("=")
+        values[service] = cast(value)
+    return values
+
+
+def _print_report(report):
+    print(f"Mensajes: {report['messages']}  completados: {report['completed']}  "
+          f"sin completar: {report['incomplete']}")
+    print(f"Tiempo: {report['wallSeconds']:.2f} s  throughput: {report['throughputPerSecond']} msg/s")
+    print()
+    print(f"{'función':<28}{'invoc.':>8}{'registros':>11}{'errores':>9}{'p50 ms':>10}{'p99 ms':>10}")
+    for name, stats in report["functions"].items():
+        print(f"{name:<28}{stats['invocations']:>8}{stats['records']:>11}{stats['errors']:>9}"
+              f"{stats['p50Ms'] or 0:>10.2f}{stats['p99Ms'] or 0:>10.2f}")
+    print()
+    print(f"{'salto':<28}{'n':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for hop, p in list(report["hopLatencyMs"].items()) + [("end-to-end", report["endToEndMs"])]:
+        if p["count"]:
+            print(f"{hop:<28}{p['count']:>8}{p['p50']:>10}{p['p95']:>10}{p['p99']:>10}")
+    print()
+    for key in ("throttled", "deadLetters", "droppedAsync", "ignoredBatchItemFailures", "pending"):
+        values = {k: v for k, v in report[key].items() if v}
+        if values:
+            print(f"{key}: {json.dumps(values)}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=100)
+    parser.add_argument("--per-request", type=int, default=10, help="mensajes por POST a la API")
+    parser.add_argument("--dispatcher-batch-size", type=int, default=1)
+    parser.add_argument("--stepfn-batch-size", type=int, default=10)
+    parser.add_argument("--stream-batch-size", type=int, default=1)
+    parser.add_argument("--queue-two-visibility", type=float, default=60, help="segundos (antes de --time-scale)")
+    parser.add_argument("--report-batch-item-failures", action="store_true",
+                        help="activa ReportBatchItemFailures en el mapping de SQS2")
+    parser.add_argument("--latency", action="append", default=[], metavar="SERVICIO=MS")
+    parser.add_argument("--throttle", action="append", default=[], metavar="SERVICIO=PROB")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--time-scale", type=float, default=0.01)
+    parser.add_argument("--no-image", action="store_true", help="sin el handler de imágenes")
+    parser.add_argument("--json", action="store_true", help="informe en JSON")
+    args = parser.parse_args(argv)
+
+    config = SimulationConfig(
+        dispatcher_batch_size=args.dispatcher_batch_size,
+        stepfn_batch_size=args.stepfn_batch_size,
+        stream_batch_size=args.stream_batch_size,
+        queue_two_visibility=args.queue_two_visibility,
+        report_batch_item_failures=args.report_batch_item_failures,
+        latency_ms=_service_values(args.latency, float),
+        throttle=_service_values(args.throttle, float),
+        seed=args.seed,
+        time_scale=args.time_scale,
+        image_generation=not args.no_image,
+        messages_per_request=args.per_request,
+    )
+    report = simulate(args.messages, config)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        _print_report(report)
+    return 0 if report["incomplete"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
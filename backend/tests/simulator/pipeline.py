@@ -0,0 +1,450 @@
+"""
+Simulador en proceso del pipeline completo:
+
+    message_router_queue -> SQS1 -> lambda_dispatcher -> EventBridge (regla 1)
+    -> eb_to_sqs2 -> SQS2 -> sqs2_to_stepfn -> Step Functions -> EventBridge
+    (regla 2) -> SNS -> lambda_dynamo -> DynamoDB stream -> lambda_ddb_to_s3
+    -> S3 -> SNS (S3EventsTopic) -> lambda_s3_to_bedrock / lambda_s3_to_bedrock_image
+
+Carga los app.py reales de backend/src/handlers con los sustitutos de
+services.py inyectados en router_common.clients, y hace de Lambda:
+  - event source mappings de SQS (batch size, visibility timeout,
+    batchItemFailures, maxReceiveCount -> DLQ) y del stream de DynamoDB
+  - invocaciones asíncronas (EventBridge y SNS) con 2 reintentos
+
+Todo corre en un solo hilo, en orden, sin concurrencia de Lambda: el
+throughput es el coste de CPU del código más la latencia inyectada. Las
+esperas del servicio (visibility timeout, reintentos asíncronos) se escalan
+con time_scale para que un visibility timeout de 60 s no tarde 60 s.
+
+La latencia por salto sale de las mismas líneas EMF (HopLatency /
+EndToEndLatency) que los handlers escriben en CloudWatch.
+"""
+import contextlib
+import importlib.util
+import io
+import json
+import logging
+import os
+import sys
+import time
+import types
+import uuid
+from collections import Counter, deque
+from dataclasses import dataclass, field
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", ".."))
+HANDLERS_DIR = os.path.join(ROOT, "backend", "src", "handlers")
+LAYER_DIR = os.path.join(ROOT, "dependencies", "python")
+if LAYER_DIR not in sys.path:
+    sys.path.append(LAYER_DIR)
+
+from router_common import clients, hops  # noqa: E402
+
+from . import services  # noqa: E402
+
+STATE_MACHINE_ARN = "arn:aws:states:us-east-1:000000000000:stateMachine:MessageProcessingStateMachine"
+TABLE_NAME = "MessagesTable"
+TARGET_BUCKET = "sim-target-bucket"
+IMAGES_BUCKET = "sim-generated-images"
+
+# Reintentos de Lambda en invocaciones asíncronas (por defecto, 2) y sus esperas
+ASYNC_RETRIES = 2
+ASYNC_RETRY_DELAYS = (60, 120)
+STREAM_RETRY_DELAY = 1
+
+
+@dataclass
+class SimulationConfig:
+    """Ajustes de la simulación; los valores por defecto son los del template.yaml."""
+
+    # Batch sizes de los event source mappings
+    dispatcher_batch_size: int = 1
+    stepfn_batch_size: int = 10
+    stream_batch_size: int = 1
+    # Colas
+    queue_one_visibility: float = 30
+    queue_two_visibility: float = 60
+    queue_two_max_receive: int = 5
+    # El template no declara FunctionResponseTypes: ReportBatchItemFailures en
+    # el mapping de SQS2, así que Lambda ignora los batchItemFailures que
+    # devuelve sqs2_to_stepfn y borra el lote entero
+    report_batch_item_failures: bool = False
+    # Reintentos del stream antes de descartar el lote (en AWS, -1 = hasta que caduque)
+    stream_max_retries: int = 10
+    # Fallos inyectados: {"servicio": ms} y {"servicio": probabilidad 0..1}
+    latency_ms: dict = field(default_factory=dict)
+    throttle: dict = field(default_factory=dict)
+    seed: int = 0
+    # Factor aplicado a las esperas propias de AWS (visibility timeout, reintentos)
+    time_scale: float = 0.01
+    image_generation: bool = True
+    # Mensajes por petición POST a la API
+    messages_per_request: int = 10
+    # Límite de seguridad para que un lote bloqueado no cuelgue la simulación
+    max_wall_seconds: float = 300
+
+
+def load_handler(name, env=None):
+    """
+    Importa backend/src/handlers/<name>/app.py como un módulo nuevo (cada
+    llamada es un "contenedor" distinto). env solo se aplica durante el import,
+    que es cuando los handlers leen su configuración; None quita la variable.
+    """
+    path = os.path.join(HANDLERS_DIR, name, "app.py")
+    spec = importlib.util.spec_from_file_location(f"_simulated_{name}_{uuid.uuid4().hex[:8]}", path)
+    module = importlib.util.module_from_spec(spec)
+    saved = dict(os.environ)
+    try:
+        for key, value in (env or {}).items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+        with contextlib.redirect_stdout(io.StringIO()):
+            spec.loader.exec_module(module)
+    finally:
+        os.environ.clear()
+        os.environ.update(saved)
+    return module
+
+
+def _percentiles(values):
+    if not values:
+        return {"count": 0, "p50": None, "p95": None, "p99": None, "max": None}
+    ordered = sorted(values)
+
+    def rank(p):
+        return ordered[min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered))) - 1))]
+
+    return {"count": len(ordered), "p50": rank(50), "p95": rank(95), "p99": rank(99), "max": ordered[-1]}
+
+
+class FunctionStats:
+    def __init__(self):
+        self.invocations = 0
+        self.records = 0
+        self.errors = 0
+        self.durations_ms = []
+
+    def as_dict(self):
+        durations = _percentiles(self.durations_ms)
+        return {
+            "invocations": self.invocations,
+            "records": self.records,
+            "errors": self.errors,
+            "totalMs": round(sum(self.durations_ms), 2),
+            "p50Ms": durations["p50"] and round(durations["p50"], 3),
+            "p99Ms": durations["p99"] and round(durations["p99"], 3),
+        }
+
+
+def _lambda_attributes(attributes):
+    # SendMessage usa DataType/StringValue; el evento SQS de Lambda, dataType/stringValue
+    return {name: {"dataType": value.get("DataType"), "stringValue": value.get("StringValue")}
+            for name, value in attributes.items()}
+
+
+class Pipeline:
+    """Instancia del pipeline: cárgala, envía mensajes con send() y ejecuta run()."""
+
+    def __init__(self, config=None):
+        self.config = config or SimulationConfig()
+        cfg = self.config
+        self.faults = services.Faults(cfg.latency_ms, cfg.throttle, seed=cfg.seed)
+
+        self.sqs = services.FakeSQS(self.faults)
+        self.queue_one = self.sqs.add_queue(services.Queue(
+            "MessageQueue", visibility_timeout=cfg.queue_one_visibility * cfg.time_scale))
+        self.queue_two_dlq = self.sqs.add_queue(services.Queue("QueueTwoDLQ"))
+        self.queue_two = self.sqs.add_queue(services.Queue(
+            "QueueTwo", visibility_timeout=cfg.queue_two_visibility * cfg.time_scale,
+            max_receive_count=cfg.queue_two_max_receive, dlq=self.queue_two_dlq))
+
+        self.events = services.FakeEventBridge(self.faults)
+        self.sfn = services.FakeStepFunctions(self.faults, STATE_MACHINE_ARN, self.events)
+        self.sns_topic = services.Topic("MySNSTopic")
+        self.s3_events_topic = services.Topic("S3EventsTopic")
+        self.dynamodb = services.FakeDynamoDB()
+        self.stream = deque()
+        self.table = self.dynamodb.add_table(
+            services.FakeTable(TABLE_NAME, "MessageId", self.faults, self.stream.append))
+        self.s3 = services.FakeS3(self.faults)
+        self.bedrock = services.FakeBedrockRuntime(self.faults)
+
+        # Invocaciones asíncronas pendientes: (no antes de, función, evento, intento)
+        self._async = deque()
+        self.stats = {}
+        self.hop_latencies = {}
+        self.end_to_end = []
+        self.completed = set()
+        self.sent_trace_ids = []
+        self.dropped = Counter()
+        self.lost = Counter()
+        self.api_failures = 0
+        self._handlers = {}
+        self._stream_attempts = 0
+        self._wire()
+
+    # ------------------------------------------------------------ montaje
+
+    def _wire(self):
+        self.events.add_rule(
+            "MessageReceivedRule",
+            {"source": ["my.app.messages"], "detail-type": ["MessageReceived"]},
+            lambda event: self._invoke_async("eb_to_sqs2", event),
+        )
+        self.events.add_rule(
+            "StepFnOutputsRule",
+            {"source": ["aws.states"], "detail-type": ["Step Functions Execution Status Change"],
+             "detail": {"stateMachineArn": [STATE_MACHINE_ARN], "status": ["SUCCEEDED", "FAILED"]}},
+            # El target de la regla es el topic: EventBridge publica el evento completo
+            lambda event: self.sns_topic.publish(json.dumps(event)),
+        )
+        self.sns_topic.subscribe(lambda event: self._invoke_async("lambda_dynamo", event))
+        self.s3.notify(TARGET_BUCKET, lambda event: self.s3_events_topic.publish(json.dumps(event)))
+        self.s3_events_topic.subscribe(lambda event: self._invoke_async("lambda_s3_to_bedrock", event))
+        if self.config.image_generation:
+            self.s3_events_topic.subscribe(lambda event: self._invoke_async("lambda_s3_to_bedrock_image", event))
+
+    def load(self):
+        """Importa los handlers reales con los sustitutos ya inyectados."""
+        env = {
+            "AWS_REGION": "us-east-1",
+            "AWS_DEFAULT_REGION": "us-east-1",
+            "XRAY_ENABLED": "false",
+            "EVENT_BUS_NAME": "default",
+            "TABLE_NAME": TABLE_NAME,
+            "STATE_MACHINE_ARN": STATE_MACHINE_ARN,
+            "S3_BUCKET": TARGET_BUCKET,
+            "OUTPUT_BUCKET": IMAGES_BUCKET,
+            # Sin WebSocket ni Valkey: el handler de Bedrock se los salta
+            "WEBSOCKET_ENDPOINT": "",
+            "VALKEY_HOST": "",
+            "SFN_START_BACKOFF": str(0.2 * self.config.time_scale),
+        }
+        clients.reset()
+        clients.set_client("sqs", self.sqs)
+        clients.set_client("events", self.events)
+        clients.set_client("stepfunctions", self.sfn)
+        clients.set_client("dynamodb", self.dynamodb, kind="resource")
+        clients.set_client("s3", self.s3)
+        clients.set_client("bedrock-runtime", self.bedrock)
+
+        handlers = {
+            "message_router_queue": self.queue_one.url,
+            "lambda_dispatcher": None,
+            "eb_to_sqs2": self.queue_two.url,
+            "sqs2_to_stepfn": self.queue_two.url,
+            "lambda_dynamo": None,
+            "lambda_ddb_to_s3": None,
+            "lambda_s3_to_bedrock": None,
+        }
+        if self.config.image_generation:
+            handlers["lambda_s3_to_bedrock_image"] = None
+
+        for name, queue_url in handlers.items():
+            self._handlers[name] = load_handler(name, dict(env, QUEUE_URL=queue_url))
+            self.stats[name] = FunctionStats()
+        # eb_to_sqs2 reintenta los fallos parciales de SQS con esperas de 0.2 s * intento
+        self._handlers["eb_to_sqs2"].RETRY_BACKOFF_BASE = 0.2 * self.config.time_scale
+        return self
+
+    # ------------------------------------------------------------ entrada
+
+    def send(self, messages):
+        """Envía mensajes por la API (POST a message_router_queue), en peticiones de messages_per_request."""
+        per_request = max(1, self.config.messages_per_request)
+        for i in range(0, len(messages), per_request):
+            chunk = messages[i:i + per_request]
+            body = {"message": chunk[0]} if len(chunk) == 1 else {"messages": chunk}
+            response = self._invoke("message_router_queue",
+                                    {"httpMethod": "POST", "body": json.dumps(body)}, records=len(chunk))
+            if response and response.get("statusCode") == 200:
+                self.sent_trace_ids.extend(json.loads(response["body"]).get("traceIds", []))
+            else:
+                self.api_failures += len(chunk)
+
+    # ------------------------------------------------------------ Lambda
+
+    def _context(self, name):
+        deadline = time.monotonic() + 900
+        return types.SimpleNamespace(
+            function_name=name,
+            aws_request_id=str(uuid.uuid4()),
+            get_remaining_time_in_millis=lambda: int((deadline - time.monotonic()) * 1000),
+        )
+
+    def _invoke(self, name, event, records=1):
+        """Invoca un handler; devuelve su respuesta o lanza su excepción (como Lambda)."""
+        stats = self.stats[name]
+        stats.invocations += 1
+        stats.records += records
+        out = io.StringIO()
+        started = time.perf_counter()
+        try:
+            with contextlib.redirect_stdout(out):
+                return self._handlers[name].lambda_handler(event, self._context(name))
+        except Exception:
+            stats.errors += 1
+            raise
+        finally:
+            stats.durations_ms.append((time.perf_counter() - started) * 1000)
+            self._collect_metrics(out.getvalue())
+
+    def _collect_metrics(self, output):
+        for line in output.splitlines():
+            if not line.startswith("{"):
+                continue
+            try:
+                doc = json.loads(line)
+            except ValueError:
+                continue
+            if "_aws" not in doc:
+                continue
+            hop = doc.get(hops.HOP_DIMENSION)
+            self.hop_latencies.setdefault(hop, []).extend(doc.get(hops.HOP_LATENCY_METRIC, []))
+            if hop == hops.HOPS[-1]:
+                self.end_to_end.extend(doc.get(hops.END_TO_END_METRIC, []))
+                self.completed.update(doc.get("traceIds", []))
+
+    def _invoke_async(self, name, event, attempt=0, not_before=0.0):
+        if name in self._handlers:
+            self._async.append((not_before, name, event, attempt))
+
+    def _run_async(self, now):
+        progressed = False
+        for _ in range(len(self._async)):
+            not_before, name, event, attempt = self._async.popleft()
+            if not_before > now:
+                self._async.append((not_before, name, event, attempt))
+                continue
+            progressed = True
+            try:
+                self._invoke(name, event)
+            except Exception:
+                if attempt < ASYNC_RETRIES:
+                    delay = ASYNC_RETRY_DELAYS[attempt] * self.config.time_scale
+                    self._async.append((time.monotonic() + delay, name, event, attempt + 1))
+                else:
+                    self.dropped[name] += 1
+        return progressed
+
+    def _poll_queue(self, queue, function, batch_size, report_failures, now):
+        batch = queue.receive(batch_size, now)
+        if not batch:
+            return False
+        event = {"Records": [{
+            "messageId": message["MessageId"],
+            "receiptHandle": receipt,
+            "body": message["Body"],
+            "attributes": {
+                "ApproximateReceiveCount": str(message["ReceiveCount"]),
+                "SentTimestamp": message["SentTimestamp"],
+            },
+            "messageAttributes": _lambda_attributes(message["MessageAttributes"]),
+            "eventSource": "aws:sqs",
+            "eventSourceARN": queue.arn,
+        } for receipt, message in batch]}
+        try:
+            response = self._invoke(function, event, records=len(batch))
+        except Exception:
+            # El lote entero vuelve a la cola al expirar el visibility timeout
+            return True
+        failed = set()
+        if report_failures and isinstance(response, dict):
+            failed = {f.get("itemIdentifier") for f in response.get("batchItemFailures") or []}
+        elif isinstance(response, dict) and response.get("batchItemFailures"):
+            # Sin ReportBatchItemFailures Lambda da el lote por procesado
+            self.lost[function] += len(response["batchItemFailures"])
+        for receipt, message in batch:
+            if message["MessageId"] not in failed:
+                queue.delete(receipt)
+        return True
+
+    def _poll_stream(self):
+        if not self.stream:
+            return False
+        batch = [self.stream[i] for i in range(min(len(self.stream), self.config.stream_batch_size))]
+        try:
+            self._invoke("lambda_ddb_to_s3", {"Records": batch}, records=len(batch))
+        except Exception:
+            # El shard se bloquea reintentando el mismo lote
+            self._stream_attempts += 1
+            if self._stream_attempts <= self.config.stream_max_retries:
+                time.sleep(STREAM_RETRY_DELAY * self.config.time_scale)
+                return True
+            self.dropped["lambda_ddb_to_s3"] += len(batch)
+        for _ in batch:
+            self.stream.popleft()
+        self._stream_attempts = 0
+        return True
+
+    # ------------------------------------------------------------ ejecución
+
+    def _next_wakeup(self):
+        times = [t for t in (self.queue_one.next_visible_at(), self.queue_two.next_visible_at()) if t is not None]
+        times.extend(not_before for not_before, *_ in self._async)
+        return min(times) if times else None
+
+    def run(self):
+        """Procesa hasta vaciar el pipeline (o agotar max_wall_seconds). Devuelve los segundos empleados."""
+        cfg = self.config
+        logger = logging.getLogger()
+        null_handler = logging.NullHandler()
+        previous_disable = logging.root.manager.disable
+        logger.addHandler(null_handler)
+        # Los handlers registran cada evento completo a INFO: no es parte de lo que se mide
+        logging.disable(logging.INFO)
+        started = time.monotonic()
+        try:
+            while time.monotonic() - started < cfg.max_wall_seconds:
+                now = time.monotonic()
+                progressed = self._run_async(now)
+                progressed |= self._poll_stream()
+                progressed |= self._poll_queue(self.queue_two, "sqs2_to_stepfn", cfg.stepfn_batch_size,
+                                               cfg.report_batch_item_failures, now)
+                progressed |= self._poll_queue(self.queue_one, "lambda_dispatcher", cfg.dispatcher_batch_size,
+                                               False, now)
+                if progressed:
+                    continue
+                wakeup = self._next_wakeup()
+                if wakeup is None:
+                    break
+                time.sleep(max(0.0, min(wakeup - time.monotonic(), 1.0)))
+        finally:
+            logger.removeHandler(null_handler)
+            logging.disable(previous_disable)
+        return time.monotonic() - started
+
+    def report(self, wall_seconds):
+        sent = len(self.sent_trace_ids)
+        completed = len(self.completed.intersection(self.sent_trace_ids))
+        return {
+            "messages": sent,
+            "rejectedByApi": self.api_failures,
+            "completed": completed,
+            "incomplete": sent - completed,
+            "wallSeconds": round(wall_seconds, 3),
+            "throughputPerSecond": round(completed / wall_seconds, 2) if wall_seconds else None,
+            "functions": {name: stats.as_dict() for name, stats in self.stats.items()},
+            "hopLatencyMs": {hop: _percentiles(self.hop_latencies.get(hop, [])) for hop in hops.HOPS},
+            "endToEndMs": _percentiles(self.end_to_end),
+            "serviceCalls": dict(self.faults.calls),
+            "throttled": dict(self.faults.throttled),
+            "deadLetters": {"QueueTwoDLQ": len(self.queue_two_dlq)},
+            "droppedAsync": dict(self.dropped),
+            "ignoredBatchItemFailures": dict(self.lost),
+            "pending": {"MessageQueue": len(self.queue_one), "QueueTwo": len(self.queue_two),
+                        "stream": len(self.stream), "async": len(self._async)},
+            "s3Objects": {TARGET_BUCKET: self.s3.count(TARGET_BUCKET), IMAGES_BUCKET: self.s3.count(IMAGES_BUCKET)},
+        }
+
+
+def simulate(message_count, config=None, message=lambda i: f"mensaje simulado {i}"):
+    """Carga el pipeline, envía message_count mensajes, lo vacía y devuelve el informe."""
+    pipeline = Pipeline(config).load()
+    started = time.monotonic()
+    pipeline.send([message(i) for i in range(message_count)])
+    elapsed = time.monotonic() - started + pipeline.run()
+    return pipeline.report(elapsed)
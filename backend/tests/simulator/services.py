@@ -0,0 +1,427 @@
+"""
+Sustitutos en memoria de los servicios AWS del pipeline.
+
+Implementan solo las operaciones que usan los handlers, con la semántica que
+importa para medir: lotes, visibility timeout, receive count y DLQ en SQS,
+fallos parciales en los batch, notificaciones (stream, S3 -> SNS, SFN ->
+EventBridge) y latencia/throttling inyectados por servicio (Faults).
+
+Las notificaciones no llaman a los handlers directamente: se entregan al
+Pipeline (pipeline.py), que hace de Lambda (event source mappings e
+invocaciones asíncronas).
+"""
+import io
+import json
+import random
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from datetime import datetime, timezone
+from decimal import Decimal
+
+from botocore.exceptions import ClientError
+
+# Código de error de throttling que devuelve cada servicio
+THROTTLE_CODES = {
+    "sqs": "ThrottlingException",
+    "events": "ThrottlingException",
+    "stepfunctions": "ThrottlingException",
+    "dynamodb": "ProvisionedThroughputExceededException",
+    "s3": "SlowDown",
+    "bedrock-runtime": "ThrottlingException",
+}
+
+
+def _client_error(code, operation, message=None):
+    return ClientError({"Error": {"Code": code, "Message": message or code}}, operation)
+
+
+class Faults:
+    """
+    Latencia (ms) y probabilidad de throttling por servicio. El Random tiene
+    semilla para que dos ejecuciones con la misma configuración sean comparables.
+    """
+
+    def __init__(self, latency_ms=None, throttle=None, seed=0):
+        self.latency_ms = dict(latency_ms or {})
+        self.throttle = dict(throttle or {})
+        self.random = random.Random(seed)
+        self.calls = Counter()
+        self.throttled = Counter()
+        self._lock = threading.Lock()
+
+    def call(self, service, operation):
+        """Aplica la latencia y devuelve True si esta llamada debe fallar por throttling."""
+        delay = self.latency_ms.get(service, 0)
+        if delay:
+            time.sleep(delay / 1000)
+        with self._lock:
+            self.calls[service] += 1
+            if self.random.random() < self.throttle.get(service, 0):
+                self.throttled[service] += 1
+                return True
+        return False
+
+    def check(self, service, operation):
+        """Como call(), pero lanzando el ClientError del servicio."""
+        if self.call(service, operation):
+            raise _client_error(THROTTLE_CODES.get(service, "ThrottlingException"), operation)
+
+
+# ---------------------------------------------------------------- SQS
+
+class Queue:
+    def __init__(self, name, visibility_timeout=30, max_receive_count=None, dlq=None):
+        self.name = name
+        self.url = f"https://sqs.us-east-1.amazonaws.com/000000000000/{name}"
+        self.arn = f"arn:aws:sqs:us-east-1:000000000000:{name}"
+        self.visibility_timeout = visibility_timeout
+        self.max_receive_count = max_receive_count
+        self.dlq = dlq
+        self._messages = deque()
+        self._in_flight = {}
+
+    def __len__(self):
+        return len(self._messages) + len(self._in_flight)
+
+    def enqueue(self, body, attributes=None):
+        message = {
+            "MessageId": str(uuid.uuid4()),
+            "Body": body,
+            "MessageAttributes": attributes or {},
+            "SentTimestamp": str(int(time.time() * 1000)),
+            "ReceiveCount": 0,
+            "VisibleAt": 0.0,
+        }
+        self._messages.append(message)
+        return message["MessageId"]
+
+    def receive(self, max_messages, now):
+        """Mensajes visibles (hasta max_messages); los pasa a in-flight durante el visibility timeout."""
+        self._requeue_expired(now)
+        batch = []
+        while self._messages and len(batch) < max_messages:
+            message = self._messages.popleft()
+            if self.max_receive_count and message["ReceiveCount"] >= self.max_receive_count and self.dlq:
+                # SQS mueve el mensaje a la DLQ al intentar recibirlo por vez n+1
+                self.dlq._messages.append(dict(message, ReceiveCount=0, VisibleAt=0.0))
+                continue
+            message["ReceiveCount"] += 1
+            message["VisibleAt"] = now + self.visibility_timeout
+            receipt = uuid.uuid4().hex
+            self._in_flight[receipt] = message
+            batch.append((receipt, message))
+        return batch
+
+    def delete(self, receipt_handle):
+        self._in_flight.pop(receipt_handle, None)
+
+    def next_visible_at(self):
+        if self._messages:
+            return 0.0
+        return min((m["VisibleAt"] for m in self._in_flight.values()), default=None)
+
+    def _requeue_expired(self, now):
+        expired = [r for r, m in self._in_flight.items() if m["VisibleAt"] <= now]
+        for receipt in expired:
+            self._messages.append(self._in_flight.pop(receipt))
+
+
+class FakeSQS:
+    def __init__(self, faults):
+        self.faults = faults
+        self.queues = {}
+
+    def add_queue(self, queue):
+        self.queues[queue.url] = queue
+        return queue
+
+    def send_message(self, QueueUrl, MessageBody, MessageAttributes=None, **_):
+        self.faults.check("sqs", "SendMessage")
+        return {"MessageId": self.queues[QueueUrl].enqueue(MessageBody, MessageAttributes)}
+
+    def send_message_batch(self, QueueUrl, Entries):
+        queue = self.queues[QueueUrl]
+        successful, failed = [], []
+        for entry in Entries:
+            # El throttling en batch llega como fallo parcial, no como excepción
+            if self.faults.call("sqs", "SendMessageBatch"):
+                failed.append({"Id": entry["Id"], "SenderFault": False,
+                               "Code": THROTTLE_CODES["sqs"], "Message": "Rate exceeded"})
+                continue
+            message_id = queue.enqueue(entry["MessageBody"], entry.get("MessageAttributes"))
+            successful.append({"Id": entry["Id"], "MessageId": message_id})
+        response = {"Successful": successful}
+        if failed:
+            response["Failed"] = failed
+        return response
+
+
+# ---------------------------------------------------------------- EventBridge
+
+def matches(pattern, event):
+    """Subconjunto de los event patterns: listas de valores exactos y objetos anidados."""
+    for key, expected in pattern.items():
+        value = event.get(key)
+        if isinstance(expected, dict):
+            if not isinstance(value, dict) or not matches(expected, value):
+                return False
+        elif value not in expected:
+            return False
+    return True
+
+
+class FakeEventBridge:
+    """put_events evalúa las reglas y entrega cada evento a los targets que coinciden."""
+
+    def __init__(self, faults):
+        self.faults = faults
+        self.rules = []
+        self.unmatched = 0
+
+    def add_rule(self, name, pattern, target):
+        self.rules.append((name, pattern, target))
+
+    def put_events(self, Entries):
+        results, failed = [], 0
+        for entry in Entries:
+            if self.faults.call("events", "PutEvents"):
+                failed += 1
+                results.append({"ErrorCode": THROTTLE_CODES["events"], "ErrorMessage": "Rate exceeded"})
+                continue
+            event = {
+                "version": "0",
+                "id": str(uuid.uuid4()),
+                "source": entry["Source"],
+                "detail-type": entry["DetailType"],
+                "time": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+                "region": "us-east-1",
+                "resources": entry.get("Resources", []),
+                "detail": json.loads(entry.get("Detail") or "{}"),
+            }
+            self.emit(event)
+            results.append({"EventId": event["id"]})
+        return {"FailedEntryCount": failed, "Entries": results}
+
+    def emit(self, event):
+        """Entrega un evento ya construido (también los que emiten otros servicios)."""
+        delivered = False
+        for _, pattern, target in self.rules:
+            if matches(pattern, event):
+                target(event)
+                delivered = True
+        if not delivered:
+            self.unmatched += 1
+
+
+# ---------------------------------------------------------------- Step Functions
+
+class FakeStepFunctions:
+    """
+    Ejecuta la máquina de estados del template (un único Pass con
+    Result {"status": "ok"} en $.status) y emite el evento
+    "Step Functions Execution Status Change" al terminar.
+    """
+
+    def __init__(self, faults, state_machine_arn, eventbridge):
+        self.faults = faults
+        self.state_machine_arn = state_machine_arn
+        self.eventbridge = eventbridge
+        self.executions = 0
+
+    def start_execution(self, stateMachineArn, input, name=None, **_):
+        self.faults.check("stepfunctions", "StartExecution")
+        if stateMachineArn != self.state_machine_arn:
+            raise _client_error("StateMachineDoesNotExist", "StartExecution")
+        name = name or str(uuid.uuid4())
+        execution_arn = f"{self.state_machine_arn.replace(':stateMachine:', ':execution:')}:{name}"
+        started = datetime.now(timezone.utc)
+        output = json.loads(input)
+        output["status"] = {"status": "ok"}
+        self.executions += 1
+        self.eventbridge.emit({
+            "version": "0",
+            "id": str(uuid.uuid4()),
+            "source": "aws.states",
+            "detail-type": "Step Functions Execution Status Change",
+            "time": started.strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "region": "us-east-1",
+            "resources": [execution_arn],
+            "detail": {
+                "executionArn": execution_arn,
+                "stateMachineArn": self.state_machine_arn,
+                "name": name,
+                "status": "SUCCEEDED",
+                "input": input,
+                "output": json.dumps(output),
+            },
+        })
+        return {"executionArn": execution_arn, "startDate": started,
+                "ResponseMetadata": {"HTTPStatusCode": 200}}
+
+
+# ---------------------------------------------------------------- SNS
+
+class Topic:
+    def __init__(self, name):
+        self.name = name
+        self.arn = f"arn:aws:sns:us-east-1:000000000000:{name}"
+        self.subscribers = []
+        self.published = 0
+
+    def subscribe(self, deliver):
+        self.subscribers.append(deliver)
+
+    def publish(self, message):
+        self.published += 1
+        event = {"Records": [{
+            "EventSource": "aws:sns",
+            "EventVersion": "1.0",
+            "Sns": {
+                "Type": "Notification",
+                "MessageId": str(uuid.uuid4()),
+                "TopicArn": self.arn,
+                "Message": message,
+                "Timestamp": datetime.now(timezone.utc).isoformat(),
+            },
+        }]}
+        for deliver in self.subscribers:
+            deliver(event)
+
+
+# ---------------------------------------------------------------- DynamoDB
+
+def serialize(value):
+    """Valor python -> AttributeValue tipado (formato de DynamoDB Streams)."""
+    if value is None:
+        return {"NULL": True}
+    if isinstance(value, bool):
+        return {"BOOL": value}
+    if isinstance(value, (int, float, Decimal)):
+        return {"N": str(value)}
+    if isinstance(value, str):
+        return {"S": value}
+    if isinstance(value, (bytes, bytearray)):
+        return {"B": bytes(value)}
+    if isinstance(value, dict):
+        return {"M": {k: serialize(v) for k, v in value.items()}}
+    if isinstance(value, (list, tuple)):
+        return {"L": [serialize(v) for v in value]}
+    raise TypeError(f"Tipo no soportado por DynamoDB: {type(value).__name__}")
+
+
+class FakeTable:
+    def __init__(self, name, hash_key, faults, on_change):
+        self.name = name
+        self.hash_key = hash_key
+        self.faults = faults
+        self.on_change = on_change
+        self.items = {}
+
+    def put_item(self, Item, **_):
+        self.faults.check("dynamodb", "PutItem")
+        for value in Item.values():
+            if isinstance(value, float):
+                # Igual que boto3: los float no se admiten, hay que usar Decimal
+                raise TypeError("Float types are not supported. Use Decimal types instead.")
+        key = Item[self.hash_key]
+        old = self.items.get(key)
+        self.items[key] = Item
+        record = {
+            "eventID": uuid.uuid4().hex,
+            "eventName": "MODIFY" if old is not None else "INSERT",
+            "eventSource": "aws:dynamodb",
+            "dynamodb": {
+                "Keys": {self.hash_key: serialize(key)},
+                "NewImage": serialize(Item)["M"],
+                "StreamViewType": "NEW_AND_OLD_IMAGES",
+            },
+        }
+        if old is not None:
+            record["dynamodb"]["OldImage"] = serialize(old)["M"]
+        self.on_change(record)
+        return {}
+
+    def get_item(self, Key, **_):
+        self.faults.check("dynamodb", "GetItem")
+        item = self.items.get(Key[self.hash_key])
+        return {"Item": item} if item is not None else {}
+
+
+class FakeDynamoDB:
+    """Resource de DynamoDB: Table(name) devuelve las tablas registradas."""
+
+    def __init__(self):
+        self.tables = {}
+
+    def add_table(self, table):
+        self.tables[table.name] = table
+        return table
+
+    def Table(self, name):
+        return self.tables[name]
+
+
+# ---------------------------------------------------------------- S3
+
+class FakeS3:
+    def __init__(self, faults):
+        self.faults = faults
+        self.objects = {}
+        self.notifications = {}
+
+    def notify(self, bucket, deliver):
+        """Notificación ObjectCreated de un bucket (en el template, al topic S3EventsTopic)."""
+        self.notifications[bucket] = deliver
+
+    def put_object(self, Bucket, Key, Body, **_):
+        self.faults.check("s3", "PutObject")
+        data = Body.encode("utf-8") if isinstance(Body, str) else bytes(Body)
+        self.objects[(Bucket, Key)] = data
+        deliver = self.notifications.get(Bucket)
+        if deliver:
+            deliver({"Records": [{
+                "eventVersion": "2.1",
+                "eventSource": "aws:s3",
+                "eventName": "ObjectCreated:Put",
+                "s3": {"bucket": {"name": Bucket}, "object": {"key": Key, "size": len(data)}},
+            }]})
+        return {"ETag": f'"{uuid.uuid4().hex}"'}
+
+    def get_object(self, Bucket, Key, **_):
+        self.faults.check("s3", "GetObject")
+        try:
+            data = self.objects[(Bucket, Key)]
+        except KeyError:
+            raise _client_error("NoSuchKey", "GetObject") from None
+        return {"Body": io.BytesIO(data), "ContentLength": len(data)}
+
+    def count(self, bucket):
+        return sum(1 for b, _ in self.objects if b == bucket)
+
+
+# ---------------------------------------------------------------- Bedrock
+
+# PNG 1x1: suficiente para que el handler de imágenes decodifique y guarde algo
+_PNG_B64 = ("iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNk"
+            "YPhfDwAChwGA60e6kgAAAABJRU5ErkJggg==")
+
+
+class FakeBedrockRuntime:
+    def __init__(self, faults):
+        self.faults = faults
+        self.calls = Counter()
+
+    def converse(self, modelId, messages, **_):
+        self.faults.check("bedrock-runtime", "Converse")
+        self.calls["converse"] += 1
+        prompt = messages[-1]["content"][0]["text"]
+        return {"output": {"message": {"role": "assistant", "content": [{"text": f"simulated: {prompt}"}]}},
+                "stopReason": "end_turn"}
+
+    def invoke_model(self, modelId, body, **_):
+        self.faults.check("bedrock-runtime", "InvokeModel")
+        self.calls["invoke_model"] += 1
+        return {"body": io.BytesIO(json.dumps({"images": [_PNG_B64]}).encode("utf-8")),
+                "contentType": "application/json"}
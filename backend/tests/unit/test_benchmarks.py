@@ -0,0 +1,29 @@
+from tests.benchmarks import cases, runner
+
+
+def test_run_measures_each_batch_size():
+    selected = cases.get_cases(["lambda_dispatcher", "eb_to_sqs2"])
+    report = runner.run(selected, batch_sizes=[1, 5], min_time=0.01)
+
+    assert set(report["results"]) == {"lambda_dispatcher/1", "lambda_dispatcher/5", "eb_to_sqs2/1", "eb_to_sqs2/5"}
+    for result in report["results"].values():
+        assert result["iterations"] >= 5
+        assert result["opsPerSec"] > 0
+        assert result["p50UsPerRecord"] <= result["p99UsPerRecord"]
+        assert result["allocBytesPerRecord"] > 0
+
+
+def test_compare_flags_only_regressions_beyond_threshold():
+    baseline = {"results": {
+        "a/10": {"opsPerSec": 1000, "p50UsPerRecord": 100, "allocBytesPerRecord": 2000},
+        "b/10": {"opsPerSec": 1000, "p50UsPerRecord": 100, "allocBytesPerRecord": 2000},
+    }}
+    current = {"results": {
+        "a/10": {"opsPerSec": 950, "p50UsPerRecord": 110, "allocBytesPerRecord": 2100},
+        "b/10": {"opsPerSec": 700, "p50UsPerRecord": 140, "allocBytesPerRecord": 2000},
+        "c/10": {"opsPerSec": 1, "p50UsPerRecord": 1, "allocBytesPerRecord": 1},
+    }}
+
+    regressions = runner.compare(baseline, current, threshold=0.15)
+
+    assert {(key, metric) for key, metric, *_ in regressions} == {("b/10", "opsPerSec"), ("b/10", "p50UsPerRecord")}
@@ -0,0 +1,122 @@
+import pytest
+
+from router_common import circuit_breaker
+
+
+class Throttled(Exception):
+    response = {"Error": {"Code": "ThrottlingException"}, "ResponseMetadata": {"HTTPStatusCode": 400}}
+
+
+class Invalid(Exception):
+    response = {"Error": {"Code": "ValidationException"}, "ResponseMetadata": {"HTTPStatusCode": 400}}
+
+
+class FakeValkey:
+    def __init__(self):
+        self.data = {}
+        self.ttls = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        self.ttls[key] = ex
+        return True
+
+    def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+    def incr(self, key):
+        self.data[key] = int(self.data.get(key, 0)) + 1
+        return self.data[key]
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, valkey):
+        self.valkey = valkey
+        self.calls = []
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.calls.append((name, args, kwargs))
+
+    def execute(self):
+        return [getattr(self.valkey, name)(*args, **kwargs) for name, args, kwargs in self.calls]
+
+
+def _raise(exc):
+    raise exc
+
+
+def test_opens_after_transient_failures_and_fails_fast():
+    breaker = circuit_breaker.CircuitBreaker("test", failure_threshold=2, open_seconds=60, valkey=None)
+
+    # Los errores del llamador no cuentan
+    for _ in range(3):
+        with pytest.raises(Invalid):
+            breaker.call(_raise, Invalid())
+    assert breaker.state == circuit_breaker.CLOSED
+
+    for _ in range(2):
+        with pytest.raises(Throttled):
+            breaker.call(_raise, Throttled())
+    assert breaker.state == circuit_breaker.OPEN
+
+    calls = []
+    with pytest.raises(circuit_breaker.CircuitOpenError) as info:
+        breaker.call(calls.append, 1)
+    assert calls == [] and info.value.retry_after > 0
+
+
+def test_half_open_probe_is_shared_across_containers():
+    valkey = FakeValkey()
+    a = circuit_breaker.CircuitBreaker("shared", failure_threshold=1, open_seconds=0, valkey=valkey)
+    b = circuit_breaker.CircuitBreaker("shared", failure_threshold=1, open_seconds=0, valkey=valkey)
+
+    with pytest.raises(Throttled):
+        a.call(_raise, Throttled())
+    assert b.state == circuit_breaker.HALF_OPEN
+
+    # Una sola llamada de prueba: si falla, el circuito se reabre para todos
+    with pytest.raises(Throttled):
+        b.call(_raise, Throttled())
+    assert a.state == circuit_breaker.HALF_OPEN
+    # La prueba que funciona cierra el circuito
+    assert a.call(lambda: "ok") == "ok"
+    assert b.state == circuit_breaker.CLOSED
+
+
+def test_failure_counter_always_has_a_ttl():
+    valkey = FakeValkey()
+    breaker = circuit_breaker.CircuitBreaker("ttl", failure_threshold=3, failure_window=45, valkey=valkey)
+
+    for _ in range(2):
+        with pytest.raises(Throttled):
+            breaker.call(_raise, Throttled())
+
+    assert valkey.data["circuit:ttl:failures"] == 2
+    assert valkey.ttls["circuit:ttl:failures"] == 45
+
+
+def test_defer_and_deferred_round_trip(monkeypatch):
+    sent = []
+
+    class FakeSQS:
+        def send_message(self, **kwargs):
+            sent.append(kwargs)
+
+    from router_common import clients
+    monkeypatch.setattr(clients, "client", lambda name, **_: FakeSQS())
+    breaker = circuit_breaker.CircuitBreaker("test", valkey=None, retry_queue_url="https://sqs/retry")
+
+    assert breaker.defer('{"Records": []}', attempt=1)
+    assert sent[0]["DelaySeconds"] == circuit_breaker.CIRCUIT_RETRY_DELAY_SECONDS * 2
+    record = {"eventSource": "aws:sqs", "body": sent[0]["MessageBody"]}
+    assert breaker.deferred(record) == ('{"Records": []}', 2)
+    assert not breaker.defer("x", attempt=circuit_breaker.CIRCUIT_RETRY_MAX_ATTEMPTS)
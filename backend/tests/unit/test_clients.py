@@ -0,0 +1,17 @@
+from router_common import clients
+
+
+def test_set_client_and_endpoint_overrides(monkeypatch):
+    clients.reset()
+    fake = object()
+    clients.set_client("sqs", fake)
+    assert clients.client("sqs") is fake
+    assert clients.client("sqs", max_pool_connections=50) is fake
+
+    monkeypatch.setenv("ROUTER_ENDPOINT_URL", "http://localhost:4566")
+    assert clients.endpoint_for("s3") == "http://localhost:4566"
+    clients.set_endpoint("s3", "http://127.0.0.1:9000")
+    assert clients.endpoint_for("s3") == "http://127.0.0.1:9000"
+
+    clients.reset()
+    assert clients.endpoint_for("s3") == "http://localhost:4566"
@@ -0,0 +1,51 @@
+import pytest
+
+from router_common import codec
+
+
+def test_small_json_travels_unchanged_without_attributes():
+    entry = codec.encode_sqs({"v": 1, "body": "hola"})
+
+    assert entry == {"MessageBody": '{"v":1,"body":"hola"}'}
+    assert codec.decode_sqs({"body": entry["MessageBody"]}) == {"v": 1, "body": "hola"}
+
+
+def test_large_payload_is_compressed_and_declared():
+    payload = {"contacts": [{"contactId": f"c-{i}", "type": "email"} for i in range(200)]}
+    entry = codec.encode_sqs(payload, compression=codec.ZLIB, threshold=1024)
+
+    assert entry["MessageBody"].startswith(codec.PREFIX + "json+zlib:")
+    assert entry["MessageAttributes"][codec.ATTRIBUTE]["StringValue"] == "json+zlib"
+    # Evento SQS de Lambda (atributos en minúsculas) y sin atributo (solo el prefijo)
+    record = {"body": entry["MessageBody"],
+              "messageAttributes": {codec.ATTRIBUTE: {"dataType": "String", "stringValue": "json+zlib"}}}
+    assert codec.decode_sqs(record) == payload
+    assert codec.decode(entry["MessageBody"]) == payload
+
+
+def test_plain_text_and_unknown_encodings():
+    assert codec.decode("texto plano") == "texto plano"
+    with pytest.raises(codec.CodecError):
+        codec.decode(codec.PREFIX + "xml:AAAA")
+
+
+@pytest.mark.parametrize("name", [codec.MSGPACK, codec.CBOR])
+def test_binary_formats_roundtrip(name):
+    if not codec.available(name):
+        pytest.skip(f"{name} no instalado")
+    payload = {"v": 1, "body": "hola ñ", "trace": {"ingressTs": 1}}
+    body, encoding = codec.encode(payload, codec=name, compression="none")
+
+    assert encoding == name
+    assert codec.decode(body) == payload
+
+
+@pytest.mark.parametrize("body", [
+    codec.PREFIX + "json+zlib",                  # prefijo sin ':' tras la codificación
+    codec.PREFIX + "json+zlib:abc",              # base64 con padding incorrecto
+    codec.PREFIX + "json+zlib:%%%%",             # no es base64
+    codec.PREFIX + "json+zlib:aG9sYQ==",         # base64 válido, zlib no
+])
+def test_malformed_payloads_raise_codec_error(body):
+    with pytest.raises(codec.CodecError):
+        codec.decode(body)
@@ -0,0 +1,140 @@
+import importlib
+import json
+import time
+import types
+
+import pytest
+
+pytest.importorskip("boto3.dynamodb.conditions")
+
+from router_common import clients, connections  # noqa: E402
+
+
+class FakeBatch:
+    def __init__(self, table):
+        self.table = table
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def put_item(self, Item):
+        self.table.items[(Item["connectionId"], Item["channel"])] = dict(Item)
+
+    def delete_item(self, Key):
+        self.table.items.pop((Key["connectionId"], Key["channel"]), None)
+
+
+class FakeConnectionsTable:
+    """PK connectionId + SK channel; con IndexName, el GSI por canal. Páginas de page_size items."""
+
+    def __init__(self, page_size=2):
+        self.items = {}
+        self.page_size = page_size
+        self.queries = []
+
+    def batch_writer(self):
+        return FakeBatch(self)
+
+    def query(self, KeyConditionExpression, IndexName=None, ExclusiveStartKey=None, **_):
+        self.queries.append(IndexName)
+        key, value = KeyConditionExpression.get_expression()["values"]
+        matches = [item for _, item in sorted(self.items.items()) if item[key.name] == value]
+        start = ExclusiveStartKey or 0
+        page = {"Items": matches[start:start + self.page_size]}
+        if start + self.page_size < len(matches):
+            page["LastEvaluatedKey"] = start + self.page_size
+        return page
+
+
+@pytest.fixture
+def table(monkeypatch):
+    table = FakeConnectionsTable()
+    monkeypatch.setattr(connections, "_table", table)
+    return table
+
+
+def test_register_keeps_valid_channels_and_sets_ttl(table):
+    before = int(time.time())
+    channels = connections.register_connection("c1", ["", "$connection", "x" * 200, "message:1"])
+
+    assert channels == ["message:1"]
+    assert {channel for _, channel in table.items} == {connections.CONNECTION_ITEM, "message:1"}
+    for item in table.items.values():
+        assert before + connections.CONNECTION_TTL_SECONDS <= item["expiresAt"] <= int(time.time()) + connections.CONNECTION_TTL_SECONDS
+
+
+def test_subscribers_are_read_per_channel_across_pages(table):
+    for i in range(5):
+        connections.register_connection(f"c{i}", ["message:1"])
+    connections.register_connection("c9", ["message:2"])
+    connections.subscribe("c0", ["message:2"])
+
+    assert sorted(connections.get_subscribers(["message:1"])) == [f"c{i}" for i in range(5)]
+    # Sin duplicados aunque la conexión esté en varios canales
+    assert sorted(connections.get_subscribers(["message:1", "message:2"])) == [f"c{i}" for i in range(5)] + ["c9"]
+    assert set(table.queries) == {connections.CHANNEL_INDEX_NAME}
+
+
+def test_expired_subscriptions_are_ignored(table):
+    connections.register_connection("live", ["message:1"])
+    connections.register_connection("stale", ["message:1"])
+    table.items[("stale", "message:1")]["expiresAt"] = int(time.time()) - 1
+
+    assert connections.get_subscribers(["message:1"]) == ["live"]
+
+
+def test_remove_connection_deletes_every_subscription(table):
+    connections.register_connection("c1", ["message:1", "message:2", "message:3"])
+    connections.register_connection("c2", ["message:1"])
+
+    assert connections.remove_connection("c1") == 4
+    assert set(table.items) == {("c2", connections.CONNECTION_ITEM), ("c2", "message:1")}
+
+
+def test_connect_without_channels_is_rejected(table, monkeypatch):
+    monkeypatch.delenv("VALKEY_HOST", raising=False)
+    app = importlib.reload(importlib.import_module("handlers.websocket.connect.app"))
+
+    def connect(connection_id, query=None):
+        return app.lambda_handler({"requestContext": {"connectionId": connection_id},
+                                   "queryStringParameters": query}, None)
+
+    assert connect("c1")["statusCode"] == 400
+    assert connect("c2", {"channels": ",$connection"})["statusCode"] == 400
+    assert table.items == {}
+
+    assert connect("c3", {"channels": "message:1,all"}) == {"statusCode": 200}
+    assert {channel for _, channel in table.items} == {connections.CONNECTION_ITEM, "message:1", "all"}
+
+
+class FakeManagementApi:
+    exceptions = types.SimpleNamespace(GoneException=type("GoneException", (Exception,), {}))
+
+    def __init__(self):
+        self.posts = []
+
+    def post_to_connection(self, ConnectionId, Data):
+        self.posts.append((ConnectionId, json.loads(Data)))
+
+
+def test_targeted_result_is_not_broadcast_to_default_channels(table, monkeypatch):
+    ws = FakeManagementApi()
+    clients.reset()
+    clients.set_client("s3", object())
+    clients.set_client("bedrock-runtime", object())
+    clients.set_client("apigatewaymanagementapi", ws)
+    monkeypatch.setenv("WEBSOCKET_ENDPOINT", "https://ws.example.com/prod")
+    monkeypatch.setenv("CONNECTIONS_TABLE", "ConnectionsTable")
+    monkeypatch.delenv("VALKEY_HOST", raising=False)
+    app = importlib.reload(importlib.import_module("handlers.lambda_s3_to_bedrock.app"))
+    connections.register_connection("watcher", ["message:1"])
+    connections.register_connection("everyone", connections.DEFAULT_CHANNELS)
+
+    app._broadcast_websocket("hola", "respuesta", "bedrock", message_id="1")
+    app._broadcast_websocket("hola", "respuesta", "bedrock")
+    clients.reset()
+
+    assert [(c, p["messageId"]) for c, p in ws.posts] == [("watcher", "1"), ("everyone", None)]
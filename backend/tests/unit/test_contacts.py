@@ -0,0 +1,194 @@
+import importlib
+import json
+
+import pytest
+
+from router_common import clients
+
+pytest.importorskip("boto3.dynamodb.conditions")
+
+
+def _matches(condition, item):
+    expression = condition.get_expression()
+    operator, values = expression["operator"], expression["values"]
+    if operator == "AND":
+        return all(_matches(value, item) for value in values)
+    if operator == "attribute_exists":
+        return values[0].name in item
+    if operator == "<>":
+        return item.get(values[0].name) != values[1]
+    assert operator == "=", operator
+    return item.get(values[0].name) == values[1]
+
+
+class FakeContactsTable:
+    """
+    GSIs de ContactsTable: cada Query lee page_size items del índice y aplica
+    FilterExpression después, como DynamoDB (páginas vacías con LastEvaluatedKey).
+    """
+
+    def __init__(self, items, page_size=2):
+        self.items = items
+        self.page_size = page_size
+        self.queries = []
+        self.writes = []
+
+    def query(self, IndexName, KeyConditionExpression, FilterExpression=None, ExclusiveStartKey=None):
+        self.queries.append((IndexName, ExclusiveStartKey))
+        matches = [item for item in self.items if _matches(KeyConditionExpression, item)]
+        start = ExclusiveStartKey["offset"] if ExclusiveStartKey else 0
+        page = matches[start:start + self.page_size]
+        result = {"Items": [item for item in page if FilterExpression is None or _matches(FilterExpression, item)]}
+        if start + self.page_size < len(matches):
+            result["LastEvaluatedKey"] = {"offset": start + self.page_size}
+        return result
+
+    def scan(self, **_):
+        raise AssertionError("ContactsTable no debe recorrerse con Scan")
+
+    def batch_writer(self, **_):
+        return FakeBatch(self)
+
+
+class FakeBatch:
+    def __init__(self, table):
+        self.table = table
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def put_item(self, Item):
+        self.table.writes.append(("put", Item["contactId"]))
+
+    def delete_item(self, Key):
+        self.table.writes.append(("delete", Key["contactId"]))
+
+
+class FakeDynamoDB:
+    def __init__(self, table):
+        self.table = table
+
+    def Table(self, name):
+        return self.table
+
+
+def _contact(i, message_id="msg-1", subscription="arn:aws:sns:us-east-1:000000000000:test:{i}"):
+    contact = {"contactId": f"c{i}", "type": "sms", "fullNumber": f"+52555000{i:04d}", "lastMessageId": message_id}
+    if subscription:
+        contact["subscriptionArn"] = subscription.format(i=i)
+    return contact
+
+
+@pytest.fixture
+def contacts_app(monkeypatch):
+    def load(items, page_size=2):
+        table = FakeContactsTable(items, page_size)
+        clients.reset()
+        clients.set_client("dynamodb", FakeDynamoDB(table), kind="resource")
+        clients.set_client("sns", object())
+        clients.set_client("sqs", object())
+        monkeypatch.setenv("EMAIL_SNS_TOPIC_ARN", "arn:aws:sns:us-east-1:000000000000:test")
+        monkeypatch.delenv("SEND_JOBS_TABLE_NAME", raising=False)
+        app = importlib.reload(importlib.import_module("handlers.sms_validation_send.app"))
+        return app, table
+    yield load
+    clients.reset()
+
+
+def test_query_all_follows_every_page(contacts_app):
+    items = [_contact(i) for i in range(5)] + [_contact(9, message_id="msg-2")]
+    app, table = contacts_app(items)
+
+    contacts = app.get_contacts_by_message_id("msg-1", include_pending=True)
+
+    assert [c["contactId"] for c in contacts] == [f"c{i}" for i in range(5)]
+    assert table.queries == [(app.MESSAGE_INDEX_NAME, None), (app.MESSAGE_INDEX_NAME, {"offset": 2}),
+                             (app.MESSAGE_INDEX_NAME, {"offset": 4})]
+
+
+def test_filtered_pages_without_items_do_not_end_the_query(contacts_app):
+    # Las dos primeras páginas se quedan vacías tras el filtro de suscripción
+    items = [_contact(i, subscription="pending confirmation") for i in range(3)] + [_contact(3, subscription=None),
+                                                                                    _contact(4), _contact(5)]
+    app, table = contacts_app(items)
+
+    assert [c["contactId"] for c in app.get_contacts_by_message_id("msg-1")] == ["c4", "c5"]
+    assert len(app.get_contacts_by_message_id("msg-1", include_pending=True)) == 6
+    assert len(table.queries) == 6
+
+
+def test_existing_contact_stops_at_the_first_match(contacts_app):
+    items = [_contact(i) for i in range(5)]
+    items[3]["fullNumber"] = items[4]["fullNumber"] = "+525550001234"
+    app, table = contacts_app(items, page_size=1)
+
+    assert app.check_existing_contact("phone", "+525550001234")["contactId"] == "c3"
+    # Con max_items=1 no se pide la segunda página aunque haya LastEvaluatedKey
+    assert table.queries == [(app.PHONE_INDEX_NAME, None)]
+    assert app.check_existing_contact("phone", "+520000000000") is None
+
+
+class FakeSNS:
+    def __init__(self, fail_email=False):
+        self.published = []
+        self.fail_email = fail_email
+
+    def publish(self, **params):
+        # Solo los publish de email llevan Subject
+        if self.fail_email and "Subject" in params:
+            raise RuntimeError("Throttling")
+        self.published.append(params)
+        return {"MessageId": f"sns-{len(self.published)}"}
+
+
+def _email(i):
+    return {"contactId": f"e{i}", "type": "email", "fullEmail": f"user{i}@example.com",
+            "subscriptionArn": f"arn:aws:sns:us-east-1:000000000000:test:e{i}"}
+
+
+def test_fanout_publishes_one_message_per_channel_chunk(contacts_app, monkeypatch):
+    app, _ = contacts_app([])
+    sns = FakeSNS()
+    monkeypatch.setattr(app, "sns", sns)
+    monkeypatch.setattr(app, "FANOUT_MAX_RECIPIENTS", 2)
+    contacts = [_contact(i) for i in range(5)] + [_email(i) for i in range(2)]
+
+    deliveries = app.publish_fanout(contacts, "hola")
+
+    recipients = sorted(
+        (json.loads(p["MessageAttributes"]["contactId"]["StringValue"]), "Subject" in p) for p in sns.published)
+    assert recipients == [(["c0", "c1"], False), (["c2", "c3"], False), (["c4"], False), (["e0", "e1"], True)]
+    assert all(p["MessageAttributes"]["contactId"]["DataType"] == "String.Array" for p in sns.published)
+    # Cada contacto recibe el resultado del publish de su bloque
+    assert sorted(c["contactId"] for c, _ in deliveries) == sorted(c["contactId"] for c in contacts)
+    by_message = {}
+    for contact, result in deliveries:
+        by_message.setdefault(result["messageId"], []).append(contact["contactId"])
+    assert sorted(len(ids) for ids in by_message.values()) == [1, 2, 2, 2]
+
+
+def test_failed_fanout_chunk_marks_only_its_recipients(contacts_app, monkeypatch):
+    app, _ = contacts_app([])
+    monkeypatch.setattr(app, "sns", FakeSNS(fail_email=True))
+    monkeypatch.setattr(app, "FANOUT_MAX_RECIPIENTS", 2)
+
+    deliveries = app.publish_fanout([_contact(0), _email(0), _email(1)], "hola")
+
+    assert {c["contactId"]: r["success"] for c, r in deliveries} == {"c0": True, "e0": False, "e1": False}
+    assert app.publish_fanout([], "hola") == []
+
+
+def test_sent_contacts_are_deleted_without_a_status_write(contacts_app, monkeypatch):
+    app, table = contacts_app([])
+    monkeypatch.setattr(app, "sns", FakeSNS(fail_email=True))
+    contacts = [_contact(0), _email(0)]
+    pending = _contact(1, subscription="pending confirmation")
+
+    results = app.send_messages(contacts, "hola", "msg-1", all_contacts=contacts + [pending])
+
+    assert (results["sent"], results["failed"]) == (1, 1)
+    # Una sola escritura por contacto: el DeleteItem
+    assert sorted(table.writes) == [("delete", "c0"), ("delete", "c1"), ("delete", "e0")]
@@ -0,0 +1,48 @@
+import importlib
+import json
+
+import pytest
+
+pytest.importorskip("boto3.dynamodb.types")
+
+from router_common import clients, idempotency  # noqa: E402
+
+from tests.unit.test_idempotency import MemoryStore  # noqa: E402
+
+
+class FakeS3:
+    def __init__(self):
+        self.objects = {}
+
+    def put_object(self, Bucket, Key, Body, ContentType=None):
+        self.objects[Key] = json.loads(Body)
+
+
+def _stream_record(event_id, message_id):
+    return {
+        "eventID": event_id,
+        "eventName": "INSERT",
+        "dynamodb": {
+            "Keys": {"MessageId": {"S": message_id}},
+            "NewImage": {"MessageId": {"S": message_id}, "Message": {"S": "hola"}},
+        },
+    }
+
+
+def test_redelivered_stream_record_is_written_once(monkeypatch, capsys):
+    s3 = FakeS3()
+    clients.reset()
+    clients.set_client("s3", s3)
+    app = importlib.reload(importlib.import_module("handlers.lambda_ddb_to_s3.app"))
+    monkeypatch.setattr(app, "written", idempotency.Idempotency("lambda_ddb_to_s3", store=MemoryStore()))
+
+    event = {"Records": [_stream_record("e1", "m1"), _stream_record("e2", "m2")]}
+    assert app.lambda_handler(event, None)["statusCode"] == 200
+    # Lambda reentrega el lote: los registros ya escritos no se vuelven a escribir
+    assert app.lambda_handler(event, None)["statusCode"] == 200
+
+    assert sorted(obj["item"]["MessageId"] for obj in s3.objects.values()) == ["m1", "m2"]
+    # El decorador de métricas sigue envolviendo el handler: una línea EMF por invocación
+    emf = [json.loads(line) for line in capsys.readouterr().out.splitlines() if '"_aws"' in line]
+    assert [doc.get("Service") for doc in emf if doc.get("Service") == "lambda_ddb_to_s3"] == ["lambda_ddb_to_s3"] * 2
+    assert emf[-1]["IdempotentHits"] == 2
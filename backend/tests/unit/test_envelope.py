@@ -0,0 +1,37 @@
+import json
+
+import pytest
+
+from router_common import envelope, hops
+
+
+def test_roundtrip_keeps_json_body_as_object():
+    env = envelope.new({"text": "hola", "n": 1}, trace=hops.new_trace(ingress_ts=1000))
+    raw = envelope.encode(env)
+
+    data = json.loads(raw)
+    assert data["body"] == {"text": "hola", "n": 1}
+    assert data["contentType"] == envelope.JSON
+    assert hops.get_trace(data)["ingressTs"] == 1000
+
+    decoded = envelope.decode(raw)
+    assert decoded.id == env.id
+    assert decoded.body == env.body
+    assert decoded.text() == '{"text":"hola","n":1}'
+
+
+@pytest.mark.parametrize("legacy, text", [
+    ('{"message": "hola", "trace": {"traceId": "t", "ingressTs": 1, "lastHopTs": 1}}', "hola"),
+    ({"messageId": "sqs-1", "body": {"message": "hola"}, "status": {"status": "ok"}}, "hola"),
+    ({"messageId": "sqs-1", "body": '{"message": "hola"}'}, "hola"),
+    ("texto plano", "texto plano"),
+])
+def test_legacy_payloads(legacy, text):
+    env = envelope.decode(legacy, message_id="fallback")
+    assert env.text() == text
+    assert env.id in ("sqs-1", "fallback")
+
+
+def test_unknown_version_is_rejected():
+    with pytest.raises(envelope.EnvelopeError):
+        envelope.decode({"v": 99, "id": "x", "body": "hola"})
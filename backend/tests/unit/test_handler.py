@@ -42,12 +42,18 @@ def import_app_with_fake_sqs(monkeypatch):
     fake_boto3.client = client
     monkeypatch.setitem(sys.modules, "boto3", fake_boto3)
 
-    # Opcional: mockear aws_xray_sdk.core.patch_all si no está instalado
+    # Opcional: mockear aws_xray_sdk.core (patch/patch_all) si no está instalado
     fake_xray_core = types.ModuleType("aws_xray_sdk.core")
     fake_xray_core.xray_recorder = types.SimpleNamespace()
     fake_xray_core.patch_all = lambda *a, **k: None
+    fake_xray_core.patch = lambda *a, **k: None
     monkeypatch.setitem(sys.modules, "aws_xray_sdk.core", fake_xray_core)
 
+    # La app pide sus clientes a router_common.clients: inyectamos el FakeSQS
+    from router_common import clients
+    clients.reset()
+    clients.set_client("sqs", FakeSQS())
+
     # Importar la app (usa handlers.message_router_queue.app porque tu PYTHONPATH=backend/src)
     if "handlers.message_router_queue.app" in sys.modules:
         importlib.reload(sys.modules["handlers.message_router_queue.app"])
@@ -85,7 +91,11 @@ def test_post_single_message(monkeypatch):
     queue_url, message_body = fake.sent_messages[0]
     assert queue_url == os.environ["QUEUE_URL"]
     data = json.loads(message_body)
-    assert data["message"] == "hola"
+    assert data["v"] == 1
+    assert data["body"] == "hola"
+    assert data["id"] in body["messageIds"]
+    assert data["trace"]["traceId"] in body["traceIds"]
+    assert data["trace"]["ingressTs"] == data["trace"]["lastHopTs"]
 
 
 def test_post_multiple_messages(monkeypatch):
@@ -102,7 +112,7 @@ def test_post_multiple_messages(monkeypatch):
     assert fake and fake.batches, "Expected send_message_batch to be called"
     queue_url, entries = fake.batches[0]
     assert queue_url == os.environ["QUEUE_URL"]
-    sent = [json.loads(e["MessageBody"])["message"] for e in entries]
+    sent = [json.loads(e["MessageBody"])["body"] for e in entries]
     assert sent == messages
 
 
@@ -0,0 +1,59 @@
+import json
+
+from router_common import hops, metrics
+
+
+def test_observe_measures_hop_and_end_to_end(capsys):
+    trace = hops.new_trace(ingress_ts=1000)
+    trace["lastHopTs"] = 1500
+
+    @metrics.handler("eb_to_sqs2")
+    def handler(event, context):
+        recorder = hops.HopRecorder("eb_to_sqs2")
+        updated = recorder.observe(trace, at=1800)
+        recorder.flush()
+        return updated
+
+    updated = handler({}, None)
+
+    assert updated["lastHopTs"] == 1800
+    assert updated["ingressTs"] == 1000
+    assert trace["lastHopTs"] == 1500
+
+    # Una sola línea EMF por invocación: las métricas del servicio y las del salto
+    (line,) = capsys.readouterr().out.strip().splitlines()
+    doc = json.loads(line)
+    assert doc["Hop"] == "eb_to_sqs2"
+    assert doc["HopLatency"] == [300]
+    assert doc["EndToEndLatency"] == [800]
+    assert doc["traceIds"] == [trace["traceId"]]
+    directives = {d["Namespace"]: d for d in doc["_aws"]["CloudWatchMetrics"]}
+    assert directives[hops.METRICS_NAMESPACE]["Dimensions"] == [["Hop"]]
+    assert directives[metrics.METRICS_NAMESPACE]["Dimensions"] == [["Service"]]
+
+
+def test_trace_ids_follow_the_sampled_latencies(capsys):
+    @metrics.handler("lambda_s3_to_bedrock")
+    def handler(event, context):
+        # Un recorder por objeto, como lambda_s3_to_bedrock
+        for i in range(hops._EMF_MAX_VALUES + 20):
+            recorder = hops.HopRecorder("lambda_s3_to_bedrock")
+            trace = {"ingressTs": 0, "lastHopTs": 0} if i % 7 == 0 else {"traceId": f"t{i}", "ingressTs": 0, "lastHopTs": 0}
+            recorder.observe(trace, at=i)
+            recorder.flush()
+
+    handler({}, None)
+
+    doc = json.loads(capsys.readouterr().out)
+    assert len(doc["HopLatency"]) == len(doc["traceIds"]) == hops._EMF_MAX_VALUES
+    for latency, trace_id in zip(doc["HopLatency"], doc["traceIds"]):
+        assert trace_id == (None if latency % 7 == 0 else f"t{latency}")
+
+
+def test_observe_without_trace_emits_nothing(capsys):
+    recorder = hops.HopRecorder("lambda_dynamo")
+    assert recorder.observe(None) is None
+    assert hops.get_trace({"message": "hola"}) is None
+    recorder.flush()
+    metrics.current().flush()
+    assert capsys.readouterr().out == ""
@@ -0,0 +1,75 @@
+import pytest
+
+from router_common import idempotency
+
+
+class MemoryStore:
+    def __init__(self):
+        self.records = {}
+
+    def acquire(self, key, in_progress_ttl):
+        if key in self.records:
+            return self.records[key]
+        self.records[key] = {"status": idempotency.IN_PROGRESS}
+        return None
+
+    def complete(self, key, result, ttl):
+        self.records[key] = {"status": idempotency.COMPLETED, "result": result}
+
+    def release(self, key):
+        self.records.pop(key, None)
+
+
+def test_duplicate_returns_stored_result_without_calling_again():
+    store = MemoryStore()
+    calls = []
+
+    @idempotency.idempotent("test", key=lambda bucket, key: [bucket, key], store=store)
+    def process(bucket, key):
+        calls.append(key)
+        return {"key": key}
+
+    assert process("b", "k1") == {"key": "k1"}
+    # Otro contenedor (sin el LRU) también ve el resultado en el almacenamiento
+    process.idempotency.completed.clear()
+    assert process("b", "k1") == {"key": "k1"}
+    assert process("b", "k2") == {"key": "k2"}
+    assert calls == ["k1", "k2"]
+
+
+def test_in_progress_raises_and_failure_releases_the_key():
+    store = MemoryStore()
+    guard = idempotency.Idempotency("test", store=store)
+    key, previous = guard.begin({"id": 1})
+    assert previous is None
+    with pytest.raises(idempotency.IdempotencyInProgressError):
+        guard.begin({"id": 1})
+
+    @idempotency.idempotent("failing", store=store)
+    def fail(item):
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        fail({"id": 2})
+    assert not [k for k in store.records if k.startswith("failing#")]
+
+
+def test_disabled_without_store():
+    @idempotency.idempotent("test", store=None)
+    def echo(item):
+        return item
+
+    assert echo(1) == 1 and echo(1) == 1
+    assert not echo.idempotency.enabled
+
+
+def test_zero_settings_are_not_replaced_by_defaults():
+    store = MemoryStore()
+    guard = idempotency.Idempotency("test", store=store, ttl=0, in_progress_ttl=0, lru_size=0)
+    assert (guard.ttl, guard.in_progress_ttl, guard.completed.maxsize) == (0, 0, 0)
+
+    key, _ = guard.begin({"id": 1})
+    guard.complete(key, "done")
+    # Sin LRU local: el duplicado se resuelve en el almacenamiento
+    assert len(guard.completed) == 0
+    assert guard.begin({"id": 1})[1] == {"status": idempotency.COMPLETED, "result": "done"}
@@ -0,0 +1,179 @@
+import datetime
+import importlib
+import json
+import types
+
+import pytest
+
+from router_common import clients
+
+pytest.importorskip("requests")
+
+
+@pytest.fixture
+def app(monkeypatch):
+    clients.reset()
+    clients.set_client("s3", object())
+    monkeypatch.setenv("OPENSEARCH_ENDPOINT", "search.local")
+    monkeypatch.setenv("OPENSEARCH_MASTER_SECRET_ARN", "arn:test")
+    monkeypatch.delenv("VALKEY_HOST", raising=False)
+    module = importlib.reload(importlib.import_module("handlers.index_to_opensearch.app"))
+    yield module
+    clients.reset()
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_provisioning_steps_are_cached_separately_with_failure_backoff(app, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(app.time, "monotonic", clock)
+    calls = []
+    pattern_results = iter([None, None, "pattern-1"])
+    monkeypatch.setattr(app, "provision_index_template", lambda s, a: calls.append("template") or True)
+    monkeypatch.setattr(app, "provision_index_pattern", lambda s, a: calls.append("pattern") or next(pattern_results))
+    monkeypatch.setattr(app, "provision_dashboard", lambda s, a, idx: calls.append("dashboard") or f"dash-{idx}")
+
+    assert app.ensure_saved_objects(None, None) == {"index_template": True, "index_pattern_id": None, "dashboard_id": None}
+    assert calls == ["template", "pattern"]
+
+    # Dentro del backoff no se vuelve a intentar el index-pattern (ni la plantilla, que funcionó)
+    clock.now += app.SAVED_OBJECTS_RETRY_SECONDS - 1
+    app.ensure_saved_objects(None, None)
+    assert calls == ["template", "pattern"]
+
+    clock.now += 1
+    app.ensure_saved_objects(None, None)
+    assert calls == ["template", "pattern", "pattern"]
+
+    # Segundo fallo seguido: el backoff se duplica
+    clock.now += app.SAVED_OBJECTS_RETRY_SECONDS
+    app.ensure_saved_objects(None, None)
+    assert calls == ["template", "pattern", "pattern"]
+    clock.now += app.SAVED_OBJECTS_RETRY_SECONDS
+
+    ids = app.ensure_saved_objects(None, None)
+    assert ids == {"index_template": True, "index_pattern_id": "pattern-1", "dashboard_id": "dash-pattern-1"}
+    assert calls == ["template", "pattern", "pattern", "pattern", "dashboard"]
+
+    app.ensure_saved_objects(None, None)
+    assert len(calls) == 5
+    assert app.saved_object_ids() == ids
+
+
+def _action(i, text="hola"):
+    return {"index": "messages", "id": f"doc-{i}", "doc": {"message": text}}
+
+
+def test_bulk_chunks_respect_doc_and_byte_limits(app):
+    actions = [_action(i) for i in range(5)]
+
+    chunks = app.build_bulk_chunks(actions, max_docs=2)
+    assert [len(items) for _, items in chunks] == [2, 2, 1]
+    body, items = chunks[0]
+    lines = body.decode("utf-8").splitlines()
+    assert json.loads(lines[0]) == {"index": {"_index": "messages", "_id": "doc-0"}}
+    assert json.loads(lines[1]) == {"message": "hola"}
+
+    entry_size = len(app.build_bulk_chunks(actions[:1])[0][0])
+    chunks = app.build_bulk_chunks(actions, max_bytes=entry_size * 2 + 1)
+    assert [len(items) for _, items in chunks] == [2, 2, 1]
+    assert all(len(body) <= entry_size * 2 + 1 for body, _ in chunks)
+
+    # Un documento mayor que el límite va solo en su chunk, no se descarta
+    big = _action(9, "x" * 100)
+    assert [len(items) for _, items in app.build_bulk_chunks([big, *actions[:1]], max_bytes=10)] == [1, 1]
+
+
+def test_bulk_retries_only_rejected_items(app, monkeypatch):
+    sent = []
+    responses = iter([
+        {"errors": True, "items": [
+            {"index": {"status": 201}},
+            {"index": {"status": 429, "error": {"type": "es_rejected_execution_exception"}}},
+            {"index": {"status": 400, "error": {"type": "mapper_parsing_exception"}}},
+            {"index": {"status": 409, "error": {"type": "version_conflict_engine_exception"}}},
+        ]},
+        {"errors": True, "items": [{"index": {"status": 200}}, {"index": {"status": 429}}]},
+        {"errors": False, "items": [{"index": {"status": 201}}]},
+    ])
+    sleeps = []
+    monkeypatch.setattr(app, "send_bulk", lambda body: sent.append(body) or next(responses))
+    monkeypatch.setattr(app.time, "sleep", sleeps.append)
+
+    actions = [_action(i) for i in range(4)]
+    indexed, failed = app.bulk_index_documents(actions)
+
+    assert indexed == 3
+    assert [(action["id"], error["type"]) for action, error in failed] == [("doc-2", "mapper_parsing_exception")]
+    # Cada reintento lleva solo los items rechazados con 429/409
+    assert [body.count(b'"_id"') for body in sent] == [4, 2, 1]
+    assert sleeps == [app.BULK_RETRY_BACKOFF, app.BULK_RETRY_BACKOFF * 2]
+
+
+def test_bulk_gives_up_after_max_retries(app, monkeypatch):
+    monkeypatch.setattr(app, "BULK_MAX_RETRIES", 2)
+    monkeypatch.setattr(app, "send_bulk", lambda body: {"errors": True, "items": [{"index": {"status": 429}}]})
+    monkeypatch.setattr(app.time, "sleep", lambda seconds: None)
+
+    indexed, failed = app.bulk_index_documents([_action(0)])
+
+    assert indexed == 0
+    assert [(action["id"], error) for action, error in failed] == [("doc-0", 429)]
+
+
+def test_daily_index_uses_the_utc_day(app, monkeypatch):
+    monkeypatch.setattr(app, "OPENSEARCH_INDEX_MODE", "daily")
+
+    assert app.resolve_write_index({"@timestamp": "2026-03-01T10:00:00Z"}) == "messages-2026.03.01"
+    # 23:30 en UTC-06:00 ya es el día siguiente en UTC
+    assert app.resolve_write_index({"@timestamp": "2026-03-01T23:30:00-06:00"}) == "messages-2026.03.02"
+    assert app.resolve_write_index({"@timestamp": "2026-03-02T01:00:00+02:00"}) == "messages-2026.03.01"
+    assert app.resolve_write_index({"@timestamp": "2026-03-01T23:30:00"}) == "messages-2026.03.01"
+
+    today = datetime.datetime.now(datetime.timezone.utc)
+    assert app.resolve_write_index({"@timestamp": "no es una fecha"}) in {
+        f"messages-{day:%Y.%m.%d}" for day in (today, datetime.datetime.now(datetime.timezone.utc))}
+    doc = app.build_document("hola")
+    assert doc["@timestamp"].endswith("Z") and "+00:00" not in doc["@timestamp"]
+    assert app.resolve_write_index(doc).startswith("messages-")
+
+
+@pytest.mark.parametrize("mode", ["single", "rollover"])
+def test_single_and_rollover_write_to_the_index_name(app, monkeypatch, mode):
+    # En rollover OPENSEARCH_INDEX es el alias de escritura que ISM va rotando
+    monkeypatch.setattr(app, "OPENSEARCH_INDEX_MODE", mode)
+    assert app.resolve_write_index({"@timestamp": "2026-03-01T10:00:00Z"}) == "messages"
+
+
+class RotatedSecretSession:
+    """Responde 401 a las credenciales anteriores a la rotación."""
+
+    def __init__(self):
+        self.requests = []
+
+    def request(self, method, url, auth=None, **_):
+        self.requests.append((method, auth))
+        return types.SimpleNamespace(status_code=401 if auth == "old" else 200, text="")
+
+
+def test_provisioning_refreshes_credentials_on_401(app, monkeypatch):
+    secret = {"current": "old"}
+
+    def get_master_auth(force_refresh=False):
+        if force_refresh:
+            secret["current"] = "new"
+        return secret["current"]
+
+    monkeypatch.setattr(app, "get_master_auth", get_master_auth)
+    session = RotatedSecretSession()
+
+    assert app.ensure_index_template(session, None)
+    assert app.ensure_index_template(session, None)
+    # Solo la primera petición ve el 401; las siguientes ya usan el secreto refrescado
+    assert session.requests == [("PUT", "old"), ("PUT", "new"), ("PUT", "new")]
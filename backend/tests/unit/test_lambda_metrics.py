@@ -0,0 +1,69 @@
+import importlib
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from router_common import clients
+from router_common.timeseries import SeriesBuffer
+
+
+class FakeCloudWatch:
+    """Un punto por minuto para las queries de `with_data`; las demás no devuelven nada."""
+
+    def __init__(self, with_data):
+        self.with_data = set(with_data)
+        self.calls = []
+
+    def get_metric_data(self, MetricDataQueries, StartTime, EndTime, **_):
+        self.calls.append((StartTime, EndTime))
+        minutes = int((EndTime - StartTime).total_seconds() // 60)
+        timestamps = [StartTime + timedelta(minutes=i) for i in range(minutes + 1)]
+        return {"MetricDataResults": [
+            {"Id": q["Id"], "Timestamps": timestamps if q["Id"] in self.with_data else [],
+             "Values": [1.0] * len(timestamps) if q["Id"] in self.with_data else []}
+            for q in MetricDataQueries
+        ]}
+
+
+def _query(query_id, function):
+    return {"Id": query_id, "MetricStat": {
+        "Metric": {"Namespace": "AWS/Lambda", "MetricName": "Invocations",
+                   "Dimensions": [{"Name": "FunctionName", "Value": function}]},
+        "Period": 60, "Stat": "Sum"}}
+
+
+@pytest.fixture
+def metrics_app(monkeypatch):
+    cloudwatch = FakeCloudWatch(with_data={"busy"})
+    clients.reset()
+    clients.set_client("cloudwatch", cloudwatch)
+    for name in ("STACK_NAME", "MONITOR_TAG", "VALKEY_HOST"):
+        monkeypatch.delenv(name, raising=False)
+    app = importlib.reload(importlib.import_module("handlers.lambda_metrics.app"))
+    yield app, cloudwatch
+    clients.reset()
+
+
+def test_empty_series_does_not_restart_from_window_start(metrics_app):
+    app, cloudwatch = metrics_app
+    queries = [_query("busy", "fn-busy"), _query("idle", "fn-idle")]
+    now = datetime(2026, 1, 1, 12, 0, tzinfo=timezone.utc)
+
+    series = app.refresh_series(queries, now)
+    assert len(series["busy"]) > 0 and len(series["idle"]) == 0
+    assert cloudwatch.calls[0][0] == now - timedelta(minutes=app.WINDOW_MINUTES)
+
+    later = now + timedelta(minutes=2)
+    app._fresh_markers.clear()
+    series = app.refresh_series(queries, later)
+
+    # Desde la consulta anterior menos un periodo, no desde el inicio de la ventana
+    assert cloudwatch.calls[1][0] == now - timedelta(seconds=60)
+    assert series["idle"].fetched_through == int(later.timestamp() * 1000)
+    assert series["busy"].last_timestamp == int(later.timestamp() * 1000)
+
+
+def test_fetched_through_survives_serialization():
+    buf = SeriesBuffer(fetched_through=123456)
+    assert SeriesBuffer.loads(buf.dumps()).fetched_through == 123456
+    assert SeriesBuffer.loads(SeriesBuffer().dumps()).fetched_through is None
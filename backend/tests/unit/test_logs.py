@@ -0,0 +1,48 @@
+import io
+import json
+import logging
+
+from router_common import logs
+
+
+class _Counted:
+    calls = 0
+
+    def __str__(self):
+        _Counted.calls += 1
+        return "x"
+
+
+def _capture(logger):
+    stream = io.StringIO()
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(logs.JsonFormatter())
+    logger.addHandler(handler)
+    logger.propagate = False
+    return stream
+
+
+def test_debug_payloads_are_not_formatted_unless_emitted(monkeypatch):
+    monkeypatch.setenv("LOG_LEVEL_TEST_HANDLER", "INFO")
+    logger = logs.get_logger("test_handler")
+    stream = _capture(logger)
+    event = {"body": "a" * 5000}
+
+    logger.debug("Evento: %s", logs.payload(event), _Counted())
+    assert _Counted.calls == 0
+    assert stream.getvalue() == ""
+
+    monkeypatch.setattr(logs, "LOG_DEBUG_SAMPLE_RATE", 1.0)
+    sampled = logs.start_invocation(logger, type("Ctx", (), {"aws_request_id": "req-1"})())
+    logger.debug("Evento: %s", logs.payload(event, limit=100), extra={"records": 1})
+
+    entry = json.loads(stream.getvalue())
+    assert sampled and entry["sampled"] is True
+    assert entry["level"] == "DEBUG" and entry["requestId"] == "req-1" and entry["records"] == 1
+    assert entry["message"].endswith("chars)") and len(entry["message"]) < 200
+
+
+def test_level_per_handler(monkeypatch):
+    monkeypatch.setenv("LOG_LEVEL_QUIET_HANDLER", "ERROR")
+    assert logs.get_logger("quiet_handler").level == logging.ERROR
+    assert logs.configured_level("other_handler") == logging.getLevelName(logs.LOG_LEVEL)
@@ -0,0 +1,60 @@
+import importlib
+
+from router_common import clients, codec, envelope
+
+
+class FakeStepFunctions:
+    def __init__(self):
+        self.inputs = []
+
+    def start_execution(self, stateMachineArn, name, input):
+        self.inputs.append(input)
+        return {"executionArn": f"{stateMachineArn}:{name}", "ResponseMetadata": {"HTTPStatusCode": 200}}
+
+
+class FakeEvents:
+    def __init__(self):
+        self.entries = []
+
+    def put_events(self, Entries):
+        self.entries.extend(Entries)
+        return {"FailedEntryCount": 0, "Entries": [{"EventId": str(i)} for i in range(len(Entries))]}
+
+
+def _record(message_id, body, encoding=None):
+    record = {"messageId": message_id, "body": body, "attributes": {"SentTimestamp": "1700000000000"}}
+    if encoding:
+        record["messageAttributes"] = {codec.ATTRIBUTE: {"stringValue": encoding, "dataType": "String"}}
+    return record
+
+
+def _batch():
+    good = [_record(f"ok-{i}", envelope.encode(envelope.new(f"hola {i}"))) for i in range(3)]
+    # Cuerpo que dice ir comprimido pero no es base64/zlib válido
+    bad = _record("bad", "rc1:zlib:%%%no-es-base64%%%", encoding=codec.ZLIB)
+    return good[:1] + [bad] + good[1:]
+
+
+def test_sqs2_to_stepfn_reports_only_the_malformed_record(monkeypatch):
+    sfn = FakeStepFunctions()
+    clients.reset()
+    clients.set_client("stepfunctions", sfn)
+    monkeypatch.setenv("STATE_MACHINE_ARN", "arn:aws:states:us-east-1:000000000000:stateMachine:test")
+    app = importlib.reload(importlib.import_module("handlers.sqs2_to_stepfn.app"))
+
+    result = app.lambda_handler({"Records": _batch()}, None)
+
+    assert result == {"batchItemFailures": [{"itemIdentifier": "bad"}]}
+    assert len(sfn.inputs) == 3
+
+
+def test_dispatcher_drops_the_malformed_record_and_publishes_the_rest():
+    events = FakeEvents()
+    clients.reset()
+    clients.set_client("events", events)
+    app = importlib.reload(importlib.import_module("handlers.lambda_dispatcher.app"))
+
+    result = app.lambda_handler({"Records": _batch()}, None)
+
+    assert result["statusCode"] == 200
+    assert [envelope.decode(e["Detail"]).body for e in events.entries] == ["hola 0", "hola 1", "hola 2"]
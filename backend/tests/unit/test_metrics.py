@@ -0,0 +1,41 @@
+import json
+
+from router_common import metrics
+
+
+def test_handler_emits_one_emf_line_per_invocation(capsys):
+    @metrics.handler("bench")
+    def handler(event, context):
+        m = metrics.current()
+        m.records_in(3)
+        for i in range(250):
+            m.observe("PutLatency", i)
+        m.cache(hit=True)
+        m.records_out(2)
+        return "ok"
+
+    assert handler({}, None) == "ok"
+
+    lines = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert len(lines) == 1
+    doc = lines[0]
+    directive = doc["_aws"]["CloudWatchMetrics"][0]
+    assert directive["Dimensions"] == [["Service"]]
+    assert {"RecordsIn", "RecordsOut", "BatchSize", "PutLatency", "CacheHits", "Invocations"} <= {
+        metric["Name"] for metric in directive["Metrics"]}
+    assert doc["Service"] == "bench"
+    assert doc["RecordsIn"] == 3 and doc["RecordsOut"] == 2
+    # EMF admite 100 valores por métrica: el resto se muestrea
+    assert len(doc["PutLatency"]) == 100
+
+
+def test_high_cardinality_dimensions_become_properties():
+    m = metrics.Metrics("bench", dimensions={"Service": "bench", "MessageId": "3f2a9c1d-aaaa-bbbb-cccc-123456789012"})
+    m.dimension("Queue", "orders")
+    m.count("RecordsIn")
+
+    doc = m.to_emf()
+
+    assert doc["_aws"]["CloudWatchMetrics"][0]["Dimensions"] == [["Service"]]
+    assert doc["MessageId"] == "3f2a9c1d-aaaa-bbbb-cccc-123456789012"
+    assert doc["Queue"] == "orders"
@@ -0,0 +1,31 @@
+import pytest
+
+# lambda_ddb_to_s3 usa el TypeDeserializer de boto3
+pytest.importorskip("boto3")
+
+from tests.simulator import SimulationConfig, simulate
+
+
+def test_all_messages_reach_bedrock():
+    report = simulate(25, SimulationConfig(image_generation=False))
+
+    assert report["messages"] == 25
+    assert report["incomplete"] == 0
+    assert report["functions"]["lambda_s3_to_bedrock"]["invocations"] == 25
+    assert report["hopLatencyMs"]["lambda_ddb_to_s3"]["count"] == 25
+    assert report["s3Objects"]["sim-target-bucket"] == 25
+
+
+def test_throttled_step_functions_are_retried_through_sqs():
+    config = SimulationConfig(
+        throttle={"stepfunctions": 0.5},
+        report_batch_item_failures=True,
+        image_generation=False,
+        seed=7,
+    )
+    report = simulate(20, config)
+
+    assert report["throttled"]["stepfunctions"] > 0
+    assert report["functions"]["sqs2_to_stepfn"]["records"] > 20
+    assert report["incomplete"] == 0
+    assert report["deadLetters"]["QueueTwoDLQ"] == 0
@@ -0,0 +1,68 @@
+import pytest
+
+from router_common import ratelimit
+from router_common.ratelimit import TokenBucket
+
+
+class FakeClock:
+    """
+    time.monotonic/time.sleep de ratelimit: sleep avanza el reloj sin esperar.
+    Los tests usan rates potencia de 2 para que los tiempos sean exactos en float.
+    """
+
+    def __init__(self):
+        self.now = 100.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(ratelimit.time, "monotonic", clock.monotonic)
+    monkeypatch.setattr(ratelimit.time, "sleep", clock.sleep)
+    return clock
+
+
+def test_acquire_paces_calls_to_the_rate(clock):
+    bucket = TokenBucket(8)
+
+    start = clock.now
+    for _ in range(24):
+        assert bucket.acquire()
+
+    # La ráfaga inicial (burst = un segundo de rate) sale sin esperar; el resto a 8/s
+    assert clock.sleeps == [0.125] * 16
+    assert clock.now - start == 2.0
+
+
+def test_burst_limits_tokens_accumulated_while_idle(clock):
+    bucket = TokenBucket(4, burst=2)
+    clock.now += 60
+
+    assert [bucket.try_acquire() for _ in range(3)] == [True, True, False]
+    clock.now += 0.25
+    assert bucket.try_acquire()
+    assert not bucket.try_acquire()
+
+
+def test_acquire_gives_up_at_timeout(clock):
+    bucket = TokenBucket(1)
+    assert bucket.acquire()
+
+    assert not bucket.acquire(timeout=0.5)
+    assert clock.sleeps == []
+    assert bucket.acquire(timeout=1)
+    assert clock.sleeps == [1.0]
+
+
+def test_zero_rate_disables_the_limit(clock):
+    bucket = TokenBucket(0)
+    assert all(bucket.acquire() for _ in range(1000))
+    assert clock.sleeps == []
@@ -0,0 +1,107 @@
+import json
+import threading
+
+from router_common import codec, redrive
+
+
+class FakeSQS:
+    """Dos colas en memoria; los mensajes recibidos quedan invisibles hasta borrarse."""
+
+    def __init__(self, messages, fail_ids=()):
+        self.dlq = {m["MessageId"]: m for m in messages}
+        self.invisible = set()
+        self.target = []
+        self.fail_ids = set(fail_ids)
+        self._lock = threading.Lock()
+
+    def receive_message(self, QueueUrl, MaxNumberOfMessages, **_):
+        with self._lock:
+            visible = [m for mid, m in self.dlq.items() if mid not in self.invisible][:MaxNumberOfMessages]
+            self.invisible.update(m["MessageId"] for m in visible)
+        return {"Messages": [dict(m, ReceiptHandle=m["MessageId"]) for m in visible]}
+
+    def send_message_batch(self, QueueUrl, Entries):
+        ok, failed = [], []
+        for entry in Entries:
+            if codec.decode_sqs({"Body": entry["MessageBody"], "MessageAttributes": entry.get("MessageAttributes")})["n"] in self.fail_ids:
+                failed.append({"Id": entry["Id"], "Code": "InternalError"})
+            else:
+                self.target.append(entry)
+                ok.append({"Id": entry["Id"]})
+        return {"Successful": ok, "Failed": failed}
+
+    def delete_message_batch(self, QueueUrl, Entries):
+        with self._lock:
+            for entry in Entries:
+                self.dlq.pop(entry["ReceiptHandle"], None)
+        return {"Successful": [{"Id": e["Id"]} for e in Entries], "Failed": []}
+
+
+def _message(n):
+    message = {"MessageId": f"m{n}", "Body": json.dumps({"n": n, "tenant": "acme" if n % 2 else "other"})}
+    if n == 1:
+        body = codec.encode_sqs({"n": n, "tenant": "acme", "text": "x" * 8000})
+        message = {"MessageId": "m1", "Body": body["MessageBody"],
+                   "MessageAttributes": {k: dict(v, StringListValues=[]) for k, v in body["MessageAttributes"].items()}}
+    return message
+
+
+def test_redrive_filters_keeps_attributes_and_only_deletes_sent():
+    sqs = FakeSQS([_message(n) for n in range(25)], fail_ids={3})
+
+    stats = redrive.redrive("dlq", target_url="target", rate=0, workers=3,
+                            keep=redrive.contains('"tenant": "acme"'), sqs=sqs)
+
+    assert stats["received"] == 25 and stats["drained"]
+    assert stats["sent"] == 11 and stats["skipped"] == 13 and stats["failed"] == 1
+    # Los filtrados y el envío fallido siguen en la DLQ
+    assert len(sqs.dlq) == 14 and "m3" in sqs.dlq
+    compressed = next(e for e in sqs.target if "MessageAttributes" in e)
+    assert codec.decode_sqs({"Body": compressed["MessageBody"], "MessageAttributes": compressed["MessageAttributes"]})["n"] == 1
+    assert "StringListValues" not in compressed["MessageAttributes"][codec.ATTRIBUTE]
+
+
+def test_transform_and_max_messages():
+    sqs = FakeSQS([_message(n) for n in range(2, 30)])
+
+    def bump(message):
+        data = redrive.payload(message)
+        return {"Body": json.dumps(dict(data, redriven=True))}
+
+    stats = redrive.redrive("dlq", target_url="target", rate=0, workers=2, transform=bump,
+                            max_messages=15, sqs=sqs)
+
+    assert stats["sent"] == 15 and not stats["drained"]
+    assert all(json.loads(e["MessageBody"])["redriven"] for e in sqs.target)
+    assert len(sqs.dlq) == 13
+
+
+def test_transform_of_a_compressed_message_is_reencoded():
+    sqs = FakeSQS([_message(1)])
+
+    def shorten(message):
+        return {"Body": json.dumps(dict(redrive.payload(message), text="corto"))}
+
+    stats = redrive.redrive("dlq", target_url="target", rate=0, workers=1, transform=shorten, sqs=sqs)
+
+    (entry,) = sqs.target
+    assert stats["sent"] == 1
+    # Ya no va comprimido: el ContentEncoding del original no debe acompañarlo
+    assert codec.ATTRIBUTE not in entry.get("MessageAttributes", {})
+    assert codec.decode_sqs({"Body": entry["MessageBody"], "MessageAttributes": entry.get("MessageAttributes")}) == \
+        {"n": 1, "tenant": "acme", "text": "corto"}
+
+
+def test_receive_errors_abort_the_pass(monkeypatch):
+    class BrokenSQS(FakeSQS):
+        def receive_message(self, QueueUrl, MaxNumberOfMessages, **_):
+            self.calls = getattr(self, "calls", 0) + 1
+            raise RuntimeError("AccessDenied")
+
+    sqs = BrokenSQS([_message(n) for n in range(3)])
+    monkeypatch.setattr(redrive, "REDRIVE_MAX_RECEIVE_ERRORS", 2)
+
+    stats = redrive.redrive("dlq", target_url="target", rate=0, workers=2, sqs=sqs)
+
+    assert stats["aborted"] and not stats["drained"]
+    assert sqs.calls <= 4 and stats["failed"] == sqs.calls
@@ -0,0 +1,64 @@
+import json
+import threading
+
+import pytest
+
+from router_common import secrets_cache
+
+
+class FakeSecretsManager:
+    def __init__(self):
+        self.calls = 0
+        self.password = "p1"
+
+    def get_secret_value(self, SecretId):
+        self.calls += 1
+        return {"SecretString": json.dumps({"username": "master", "password": self.password})}
+
+
+@pytest.fixture
+def fake_secrets(monkeypatch):
+    fake = FakeSecretsManager()
+    monkeypatch.setattr(secrets_cache, "_client", fake)
+    secrets_cache.invalidate()
+    yield fake
+    secrets_cache.invalidate()
+
+
+def test_cached_within_ttl(fake_secrets):
+    first = secrets_cache.get_secret_json("arn:secret", ttl=60)
+    second = secrets_cache.get_secret_json("arn:secret", ttl=60)
+
+    assert first == second == {"username": "master", "password": "p1"}
+    assert fake_secrets.calls == 1
+
+
+def test_force_refresh_reads_new_value(fake_secrets):
+    secrets_cache.get_secret_json("arn:secret", ttl=60)
+    fake_secrets.password = "p2"
+
+    assert secrets_cache.get_secret_json("arn:secret", ttl=60)["password"] == "p1"
+    assert secrets_cache.get_secret_json("arn:secret", ttl=60, force_refresh=True)["password"] == "p2"
+    assert fake_secrets.calls == 2
+
+
+def test_expired_entry_is_fetched_again(fake_secrets):
+    secrets_cache.get_secret("arn:secret", ttl=0)
+    secrets_cache.get_secret("arn:secret", ttl=0)
+
+    assert fake_secrets.calls == 2
+
+
+def test_concurrent_misses_fetch_once(fake_secrets):
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(secrets_cache.get_secret("arn:secret", ttl=60)))
+        for _ in range(8)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(results) == 8
+    assert fake_secrets.calls == 1
@@ -0,0 +1,199 @@
+import copy
+import importlib
+import json
+import time
+import types
+
+import pytest
+
+from router_common import clients
+
+pytest.importorskip("boto3.dynamodb.conditions")
+
+
+class ConditionalCheckFailedException(Exception):
+    pass
+
+
+class FakeJobsTable:
+    """SendJobsTable: solo las actualizaciones que usa el handler de envíos."""
+
+    def __init__(self):
+        self.items = {}
+        self.fail_progress = 0
+
+    def put_item(self, Item):
+        self.items[Item["jobId"]] = copy.deepcopy(Item)
+
+    def get_item(self, Key, **_):
+        item = self.items.get(Key["jobId"])
+        return {"Item": copy.deepcopy(item)} if item else {}
+
+    def update_item(self, Key, UpdateExpression, ExpressionAttributeValues, ExpressionAttributeNames=None,
+                    ConditionExpression=None, **_):
+        job = self.items.get(Key["jobId"])
+        names = ExpressionAttributeNames or {}
+        values = ExpressionAttributeValues
+        if UpdateExpression.startswith("SET shardState.#shard"):
+            state = job["shardState"]
+            if ConditionExpression and (job["status"] != "running" or names["#shard"] in state):
+                raise ConditionalCheckFailedException()
+            state[names["#shard"]] = copy.deepcopy(values.get(":claim") or values.get(":result"))
+            return {}
+        if UpdateExpression.startswith("ADD"):
+            if self.fail_progress:
+                self.fail_progress -= 1
+                raise RuntimeError("timeout actualizando contadores")
+            if job is None or values[":shardId"] in job.setdefault("doneShards", set()):
+                raise ConditionalCheckFailedException()
+            job["doneShards"] |= values[":shard"]
+            job["sent"] += values[":sent"]
+            job["failed"] += values[":failed"]
+            job["pending"] += values[":done"]
+            return {"Attributes": {"pending": job["pending"]}}
+        # SET #status = ...
+        job["status"] = values.get(":completed") or values.get(":failed")
+        if ":error" in values:
+            job["error"] = values[":error"]
+        return {}
+
+
+class FakeContactsTable:
+    def batch_writer(self, **_):
+        raise RuntimeError("sin tabla de contactos en el test")
+
+
+class FakeDynamoDB:
+    def __init__(self):
+        self.jobs = FakeJobsTable()
+        self.meta = types.SimpleNamespace(client=types.SimpleNamespace(exceptions=types.SimpleNamespace(
+            ConditionalCheckFailedException=ConditionalCheckFailedException)))
+
+    def Table(self, name):
+        return self.jobs if name == "SendJobsTable" else FakeContactsTable()
+
+
+class FakeSNS:
+    def __init__(self):
+        self.published = []
+
+    def publish(self, **params):
+        self.published.append(params)
+        return {"MessageId": f"sns-{len(self.published)}"}
+
+
+class FakeSQS:
+    def __init__(self, fail_after=None):
+        self.batches = []
+        self.fail_after = fail_after
+
+    def send_message_batch(self, QueueUrl, Entries):
+        if self.fail_after is not None and len(self.batches) >= self.fail_after:
+            return {"Successful": [], "Failed": [{"Id": e["Id"], "Code": "InternalError"} for e in Entries]}
+        self.batches.append(Entries)
+        return {"Successful": [{"Id": e["Id"]} for e in Entries], "Failed": []}
+
+
+DLQ_ARN = "arn:aws:sqs:us-east-1:000000000000:send-jobs-dlq"
+
+
+@pytest.fixture
+def send_app(monkeypatch):
+    def load(sqs=None):
+        services = types.SimpleNamespace(dynamodb=FakeDynamoDB(), sns=FakeSNS(), sqs=sqs or FakeSQS())
+        clients.reset()
+        clients.set_client("dynamodb", services.dynamodb, kind="resource")
+        clients.set_client("sns", services.sns)
+        clients.set_client("sqs", services.sqs)
+        monkeypatch.setenv("EMAIL_SNS_TOPIC_ARN", "arn:aws:sns:us-east-1:000000000000:test")
+        monkeypatch.setenv("SEND_JOBS_TABLE_NAME", "SendJobsTable")
+        monkeypatch.setenv("SEND_JOBS_QUEUE_URL", "https://sqs.us-east-1.amazonaws.com/000000000000/send-jobs")
+        monkeypatch.setenv("SEND_JOBS_DLQ_ARN", DLQ_ARN)
+        monkeypatch.setenv("SEND_JOB_SHARD_SIZE", "2")
+        app = importlib.reload(importlib.import_module("handlers.sms_validation_send.app"))
+        return app, services
+    yield load
+    clients.reset()
+
+
+def _contacts(n):
+    return [{"contactId": f"c{i}", "type": "sms", "fullNumber": f"+52555000{i:04d}",
+             "subscriptionArn": f"arn:aws:sns:us-east-1:000000000000:test:{i}"} for i in range(n)]
+
+
+def _job(app, jobs, shards=2, size=2):
+    jobs.put_item(Item={"jobId": "job-1", "messageId": "msg-1", "status": "running", "total": shards * size,
+                        "sent": 0, "failed": 0, "pending": shards * size, "shards": shards, "shardState": {}})
+    return [{"jobId": "job-1", "shardId": str(i), "messageId": "msg-1", "message": "hola", "mode": "per_contact",
+             "contacts": _contacts(size)} for i in range(shards)]
+
+
+def _records(shards, source="arn:aws:sqs:us-east-1:000000000000:send-jobs"):
+    return {"Records": [{"messageId": f"m-{s['shardId']}", "eventSource": "aws:sqs", "eventSourceARN": source,
+                         "body": json.dumps(s)} for s in shards]}
+
+
+def test_redelivered_shard_is_not_sent_twice(send_app):
+    app, services = send_app()
+    shards = _job(app, services.dynamodb.jobs)
+    services.dynamodb.jobs.fail_progress = 1
+
+    # Primera entrega: envía, pero falla al sumar los contadores -> SQS la reentrega
+    assert app.lambda_handler(_records(shards[:1]), None) == {"batchItemFailures": [{"itemIdentifier": "m-0"}]}
+    assert len(services.sns.published) == 2
+
+    app.lambda_handler(_records(shards), None)
+
+    job = services.dynamodb.jobs.items["job-1"]
+    assert len(services.sns.published) == 4
+    assert (job["sent"], job["failed"], job["pending"], job["status"]) == (4, 0, 0, "completed")
+
+
+def test_shard_claimed_by_a_live_invocation_is_retried_later(send_app):
+    app, services = send_app()
+    shards = _job(app, services.dynamodb.jobs, shards=1)
+    services.dynamodb.jobs.items["job-1"]["shardState"]["0"] = {"state": "sending", "leaseUntil": int(time.time()) + 60}
+
+    assert app.lambda_handler(_records(shards), None) == {"batchItemFailures": [{"itemIdentifier": "m-0"}]}
+    assert services.sns.published == []
+
+
+def test_shard_with_expired_claim_counts_as_failed_without_resending(send_app):
+    app, services = send_app()
+    shards = _job(app, services.dynamodb.jobs, shards=1)
+    services.dynamodb.jobs.items["job-1"]["shardState"]["0"] = {"state": "sending", "leaseUntil": int(time.time()) - 1}
+
+    assert app.lambda_handler(_records(shards), None) == {"batchItemFailures": []}
+
+    job = services.dynamodb.jobs.items["job-1"]
+    assert services.sns.published == []
+    assert (job["failed"], job["pending"], job["status"]) == (2, 0, "completed")
+
+
+def test_dead_shard_completes_the_job(send_app):
+    app, services = send_app()
+    shards = _job(app, services.dynamodb.jobs)
+    app.lambda_handler(_records(shards[:1]), None)
+
+    assert app.lambda_handler(_records(shards[1:], source=DLQ_ARN), None) == {"batchItemFailures": []}
+
+    job = services.dynamodb.jobs.items["job-1"]
+    assert len(services.sns.published) == 2
+    assert (job["sent"], job["failed"], job["pending"], job["status"]) == (2, 2, 0, "completed")
+
+
+def test_enqueue_failure_marks_the_job_failed(send_app, monkeypatch):
+    app, services = send_app(sqs=FakeSQS(fail_after=1))
+    monkeypatch.setattr(app, "get_contacts_by_message_id", lambda message_id, include_pending=False: _contacts(30))
+
+    with pytest.raises(RuntimeError):
+        app.start_send_job("hola", "msg-1")
+
+    (job,) = services.dynamodb.jobs.items.values()
+    assert job["status"] == "failed"
+    assert "No se pudieron encolar" in job["error"]
+
+    # Los shards que sí se encolaron se descartan sin enviar
+    queued = [json.loads(e["MessageBody"]) for e in services.sqs.batches[0]]
+    assert app.lambda_handler(_records(queued), None) == {"batchItemFailures": []}
+    assert services.sns.published == []
@@ -0,0 +1,20 @@
+from router_common.timeseries import SeriesBuffer
+
+
+def test_merge_replaces_authoritative_range_and_trims():
+    buf = SeriesBuffer([1000, 2000, 3000], [1.0, 2.0, 3.0])
+
+    # CloudWatch corrige el último periodo y añade uno nuevo
+    buf.merge([3000, 4000], [5.0, 6.0], start=2500)
+    assert list(buf.points()) == [(1000, 1.0), (2000, 2.0), (3000, 5.0), (4000, 6.0)]
+
+    buf.trim(2000)
+    assert buf.last_timestamp == 4000
+    assert list(buf.points(since=3000)) == [(4000, 6.0)]
+
+
+def test_dumps_roundtrip():
+    buf = SeriesBuffer([1000, 2000], [0.5, 1.5])
+    restored = SeriesBuffer.loads(buf.dumps())
+    assert list(restored.points()) == [(1000, 0.5), (2000, 1.5)]
+    assert len(SeriesBuffer.loads(SeriesBuffer().dumps())) == 0
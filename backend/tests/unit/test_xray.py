@@ -0,0 +1,25 @@
+import sys
+import types
+
+from router_common import xray
+
+
+def test_patch_only_requested_libraries_once(monkeypatch):
+    calls = []
+    fake_core = types.ModuleType("aws_xray_sdk.core")
+    fake_core.patch = lambda libs: calls.append(list(libs))
+    monkeypatch.setitem(sys.modules, "aws_xray_sdk.core", fake_core)
+    monkeypatch.setattr(xray, "_patched", set())
+
+    assert xray.patch(("botocore",)) is True
+    assert xray.patch(("botocore", "requests")) is True
+    assert calls == [["botocore"], ["requests"]]
+
+
+def test_disabled_does_not_import_sdk(monkeypatch):
+    monkeypatch.setenv("XRAY_ENABLED", "false")
+    monkeypatch.setattr(xray, "_patched", set())
+    monkeypatch.delitem(sys.modules, "aws_xray_sdk.core", raising=False)
+
+    assert xray.patch(("botocore",)) is False
+    assert "aws_xray_sdk.core" not in sys.modules
@@ -0,0 +1,160 @@
+"""
+Build del CommonDependenciesLayer reducido.
+
+1. Calcula los servicios AWS que usan los handlers y router_common (literales en
+   clients.client()/clients.resource()/boto3.client()/boto3.resource()).
+2. Copia dependencies/python al directorio de salida quitando de botocore/data
+   los modelos de los servicios no usados (y los examples-1.json, que solo
+   sirven para documentación).
+3. Precompila todo a .pyc (UNCHECKED_HASH: Lambda no puede escribir en /opt y
+   los mtimes del zip no son fiables).
+4. Informa del tamaño y del tiempo de import + creación de clientes antes y después.
+
+Lo usa SAM (BuildMethod: makefile, ver dependencies/Makefile); a mano:
+    python dependencies/build_layer.py --output .aws-sam/layer/python
+    python dependencies/build_layer.py --list-services
+"""
+import argparse
+import compileall
+import os
+import py_compile
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+HERE = Path(__file__).resolve().parent
+DEFAULT_SOURCE = HERE / "python"
+DEFAULT_HANDLERS = HERE.parent / "backend" / "src" / "handlers"
+RUNTIME_VERSION = (3, 12)
+
+SERVICE_CALL = re.compile(r"""(?:clients|boto3)\.(?:client|resource)\(\s*["']([a-z0-9-]+)["']""")
+# Nada de esto se importa en Lambda
+SKIP_NAMES = {"__pycache__", "bin"}
+SKIP_DATA_FILES = {"examples-1.json"}
+
+
+def find_services(paths):
+    services = set()
+    for root in paths:
+        for path in Path(root).rglob("*.py"):
+            services.update(SERVICE_CALL.findall(path.read_text(encoding="utf-8", errors="ignore")))
+    return services
+
+
+def _ignore(source, keep):
+    data_dir = (source / "botocore" / "data").resolve()
+
+    def ignore(directory, names):
+        skipped = {n for n in names if n in SKIP_NAMES or n.endswith(".pyc")}
+        if Path(directory).resolve() == data_dir:
+            skipped.update(n for n in names if (Path(directory) / n).is_dir() and n not in keep)
+        elif data_dir in Path(directory).resolve().parents:
+            skipped.update(n for n in names if n in SKIP_DATA_FILES)
+        return skipped
+
+    return ignore
+
+
+def build(source, output, services):
+    if output.exists():
+        shutil.rmtree(output)
+    shutil.copytree(source, output, ignore=_ignore(source, services))
+    compileall.compile_dir(
+        str(output), quiet=1, workers=0,
+        invalidation_mode=py_compile.PycInvalidationMode.UNCHECKED_HASH,
+    )
+
+
+def dir_size(path, include_pyc=True):
+    total = files = 0
+    for p in Path(path).rglob("*"):
+        if p.is_file() and (include_pyc or "__pycache__" not in p.parts):
+            total += p.stat().st_size
+            files += 1
+    return total, files
+
+
+def measure_startup(layer, services, runs=5):
+    """Mediana (ms) de importar botocore y crear un cliente por servicio en un proceso nuevo."""
+    snippet = (
+        "import time; t = time.perf_counter()\n"
+        "import botocore.session\n"
+        "s = botocore.session.get_session()\n"
+        f"for svc in {sorted(services)!r}:\n"
+        "    s.create_client(svc, region_name='us-east-1', aws_access_key_id='x', aws_secret_access_key='x')\n"
+        "import router_common.clients, router_common.hops\n"
+        "print((time.perf_counter() - t) * 1000)\n"
+    )
+    env = dict(os.environ, PYTHONPATH=str(layer), PYTHONDONTWRITEBYTECODE="1")
+    samples = []
+    for _ in range(runs):
+        proc = subprocess.run([sys.executable, "-c", snippet], env=env, capture_output=True, text=True)
+        if proc.returncode != 0:
+            return None, proc.stderr.strip().splitlines()[-1]
+        samples.append(float(proc.stdout.strip()))
+    return statistics.median(samples), None
+
+
+def _mb(size):
+    return f"{size / (1024 * 1024):.1f} MB"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--source", type=Path, default=DEFAULT_SOURCE)
+    parser.add_argument("--output", type=Path, default=HERE.parent / ".aws-sam" / "layer" / "python")
+    parser.add_argument("--handlers", type=Path, action="append",
+                        help="directorios a escanear (por defecto, backend/src/handlers y router_common)")
+    parser.add_argument("--keep", action="append", default=[], help="servicio extra a conservar (repetible)")
+    parser.add_argument("--list-services", action="store_true", help="solo muestra los servicios detectados")
+    parser.add_argument("--no-report", action="store_true", help="no mide el tiempo de import")
+    args = parser.parse_args(argv)
+
+    scan = args.handlers or [DEFAULT_HANDLERS, args.source / "router_common"]
+    for path in scan:
+        if not Path(path).is_dir():
+            # Sin los handlers se podarían modelos que sí se usan
+            parser.error(f"no existe {path} (¿build fuera del repo? usa BuildInSource o --handlers)")
+    services = find_services(scan) | set(args.keep)
+    available = {p.name for p in (args.source / "botocore" / "data").iterdir() if p.is_dir()}
+    missing = services - available
+    if missing:
+        parser.error(f"servicios sin modelo en botocore/data: {', '.join(sorted(missing))}")
+
+    print(f"Servicios usados ({len(services)}): {', '.join(sorted(services))}")
+    if args.list_services:
+        return 0
+
+    if sys.version_info[:2] != RUNTIME_VERSION:
+        print(f"AVISO: los .pyc se generan con Python {sys.version_info[0]}.{sys.version_info[1]}, "
+              f"el runtime es python{RUNTIME_VERSION[0]}.{RUNTIME_VERSION[1]}; Lambda los ignorará.")
+
+    started = time.perf_counter()
+    build(args.source, args.output, services)
+    print(f"Layer generado en {args.output} ({time.perf_counter() - started:.1f}s)")
+
+    # "Antes" = el layer tal y como está en el repo (sin __pycache__, igual que se subía)
+    before_size, before_files = dir_size(args.source, include_pyc=False)
+    after_size, after_files = dir_size(args.output)
+    print(f"Tamaño:   {_mb(before_size)} ({before_files} ficheros) -> {_mb(after_size)} ({after_files} ficheros, con .pyc)")
+
+    if not args.no_report:
+        with tempfile.TemporaryDirectory() as tmp:
+            original = Path(tmp) / "python"
+            shutil.copytree(args.source, original, ignore=shutil.ignore_patterns("__pycache__", "*.pyc"))
+            before_ms, before_err = measure_startup(original, services)
+        after_ms, after_err = measure_startup(args.output, services)
+        if before_err or after_err:
+            print(f"Import:   no medido ({before_err or after_err})")
+        else:
+            print(f"Import:   {before_ms:.0f} ms -> {after_ms:.0f} ms (botocore + {len(services)} clientes, mediana)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,2 @@
+# Código compartido por los handlers del message router.
+# Se distribuye en la capa CommonDependenciesLayer (dependencies/python -> /opt/python).
@@ -0,0 +1,89 @@
+"""
+Cachés compartidas por los handlers:
+- TTLCache: en memoria, por contenedor, thread-safe, con expiración y desalojo LRU.
+- get_valkey(): cliente Valkey/Redis compartido entre contenedores (opcional).
+"""
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+VALKEY_HOST = os.environ.get("VALKEY_HOST")
+VALKEY_PORT = int(os.environ.get("VALKEY_PORT", 6379))
+VALKEY_TIMEOUT_SECONDS = float(os.environ.get("VALKEY_TIMEOUT_SECONDS", "0.5"))
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Diccionario con TTL por entrada y tamaño máximo (desaloja la menos usada)."""
+
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                return default
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+_valkey_client = None
+_valkey_lock = threading.Lock()
+
+
+def get_valkey():
+    """
+    Cliente Valkey si VALKEY_HOST está configurado y redis está disponible;
+    None en caso contrario (los llamadores deben funcionar sin caché compartida).
+    """
+    global _valkey_client
+    if not VALKEY_HOST:
+        return None
+    if _valkey_client is None:
+        with _valkey_lock:
+            if _valkey_client is None:
+                try:
+                    import redis
+                except ImportError:
+                    logger.warning("VALKEY_HOST is set but redis is not installed; shared cache disabled")
+                    return None
+                _valkey_client = redis.StrictRedis(
+                    host=VALKEY_HOST,
+                    port=VALKEY_PORT,
+                    decode_responses=True,
+                    socket_connect_timeout=VALKEY_TIMEOUT_SECONDS,
+                    socket_timeout=VALKEY_TIMEOUT_SECONDS,
+                )
+    return _valkey_client
@@ -0,0 +1,298 @@
+"""
+Circuit breaker para dependencias externas (Bedrock, OpenSearch) con el
+estado compartido entre contenedores en Valkey.
+
+    bedrock_breaker = circuit_breaker.CircuitBreaker("bedrock")
+
+    try:
+        resp = bedrock_breaker.call(bedrock.converse, modelId=..., messages=...)
+    except circuit_breaker.CircuitOpenError:
+        bedrock_breaker.defer(sns_message)  # cola de reintentos con retardo
+
+Estados:
+  - CLOSED: las llamadas pasan. CIRCUIT_FAILURE_THRESHOLD fallos transitorios
+    (throttling, 5xx, timeouts, conexión) en CIRCUIT_FAILURE_WINDOW_SECONDS
+    abren el circuito. Los errores del llamador (validación, 4xx) no cuentan.
+  - OPEN: durante CIRCUIT_OPEN_SECONDS las llamadas fallan al instante con
+    CircuitOpenError, sin tocar la dependencia ni gastar concurrencia en esperas.
+  - HALF_OPEN: pasado ese tiempo, una sola llamada de prueba (de cualquier
+    contenedor) pasa; si funciona el circuito se cierra, si falla se reabre.
+
+Sin Valkey (o si falla) el estado es por contenedor: sigue protegiendo, pero
+cada contenedor tiene que ver sus propios fallos para abrir. Para compartirlo,
+la función necesita VALKEY_HOST, acceso de red a Valkey (VPC) y `redis` en su
+requirements.txt.
+
+El trabajo rechazado se puede aplazar con defer(): se encola en
+CIRCUIT_RETRY_QUEUE_URL con DelaySeconds creciente por intento (máximo 15 min
+de SQS), y la misma función lo consume de esa cola (deferred()). Pasados
+CIRCUIT_RETRY_MAX_ATTEMPTS intentos defer() devuelve False y el llamador
+lanza, para que el mensaje acabe en la DLQ.
+"""
+import json
+import logging
+import os
+import threading
+import time
+
+from router_common import codec
+from router_common.cache import get_valkey
+
+logger = logging.getLogger(__name__)
+
+CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_FAILURE_WINDOW_SECONDS = int(os.environ.get("CIRCUIT_FAILURE_WINDOW_SECONDS", "60"))
+CIRCUIT_OPEN_SECONDS = int(os.environ.get("CIRCUIT_OPEN_SECONDS", "30"))
+CIRCUIT_PROBE_TIMEOUT_SECONDS = int(os.environ.get("CIRCUIT_PROBE_TIMEOUT_SECONDS", "30"))
+CIRCUIT_RETRY_QUEUE_URL = os.environ.get("CIRCUIT_RETRY_QUEUE_URL")
+CIRCUIT_RETRY_DELAY_SECONDS = int(os.environ.get("CIRCUIT_RETRY_DELAY_SECONDS", "60"))
+CIRCUIT_RETRY_MAX_ATTEMPTS = int(os.environ.get("CIRCUIT_RETRY_MAX_ATTEMPTS", "5"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# DelaySeconds máximo de SQS
+_MAX_DELAY_SECONDS = 900
+
+_TRANSIENT_CODES = frozenset({
+    "ThrottlingException",
+    "TooManyRequestsException",
+    "ServiceUnavailableException",
+    "ServiceUnavailable",
+    "InternalServerException",
+    "InternalFailure",
+    "ModelTimeoutException",
+    "ModelNotReadyException",
+    "RequestTimeout",
+})
+
+
+class CircuitOpenError(Exception):
+    """El circuito está abierto: la llamada no se ha hecho."""
+
+    def __init__(self, name, retry_after):
+        super().__init__(f"circuit {name} is open; retry in {retry_after:.0f}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+def is_failure(exc):
+    """
+    True si la excepción indica que la dependencia está degradada: códigos de
+    throttling/indisponibilidad, HTTP 429/5xx, timeouts y errores de conexión
+    (de botocore o de requests, sin importarlos).
+    """
+    response = getattr(exc, "response", None)
+    if isinstance(response, dict):
+        # botocore ClientError
+        code = (response.get("Error") or {}).get("Code")
+        status = (response.get("ResponseMetadata") or {}).get("HTTPStatusCode") or 0
+        return code in _TRANSIENT_CODES or status == 429 or status >= 500
+    status = getattr(response, "status_code", None)
+    if status is not None:
+        # requests HTTPError
+        return status == 429 or status >= 500
+    return any("Timeout" in cls.__name__ or "Connection" in cls.__name__ for cls in type(exc).__mro__)
+
+
+class _LocalState:
+    """Estado en memoria del contenedor (sin Valkey o si Valkey falla)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._opened = {}
+        self._failures = {}
+        self._probes = {}
+
+    def get(self, name):
+        return self._opened.get(name)
+
+    def open(self, name, until, ttl):
+        with self._lock:
+            self._opened[name] = {"state": OPEN, "until": until}
+            self._failures.pop(name, None)
+            self._probes.pop(name, None)
+
+    def close(self, name):
+        with self._lock:
+            self._opened.pop(name, None)
+            self._failures.pop(name, None)
+            self._probes.pop(name, None)
+
+    def add_failure(self, name, window):
+        now = time.time()
+        with self._lock:
+            failures = [t for t in self._failures.get(name, []) if t > now - window]
+            failures.append(now)
+            self._failures[name] = failures
+            return len(failures)
+
+    def try_probe(self, name, ttl):
+        now = time.time()
+        with self._lock:
+            if self._probes.get(name, 0) > now:
+                return False
+            self._probes[name] = now + ttl
+            return True
+
+
+class _ValkeyState:
+    """Estado compartido: circuit:<nombre>:{state,failures,probe}."""
+
+    def __init__(self, client, prefix="circuit:"):
+        self.valkey = client
+        self.prefix = prefix
+
+    def get(self, name):
+        raw = self.valkey.get(f"{self.prefix}{name}:state")
+        return json.loads(raw) if raw else None
+
+    def open(self, name, until, ttl):
+        self.valkey.set(f"{self.prefix}{name}:state", json.dumps({"state": OPEN, "until": until}), ex=ttl)
+        self.valkey.delete(f"{self.prefix}{name}:failures", f"{self.prefix}{name}:probe")
+
+    def close(self, name):
+        self.valkey.delete(f"{self.prefix}{name}:state", f"{self.prefix}{name}:failures", f"{self.prefix}{name}:probe")
+
+    def add_failure(self, name, window):
+        # Ventana fija desde el primer fallo: basta para detectar una racha. SET NX EX
+        # e INCR en una transacción: el contador nunca queda sin TTL (INCR lo conserva)
+        key = f"{self.prefix}{name}:failures"
+        pipe = self.valkey.pipeline()
+        pipe.set(key, 0, nx=True, ex=window)
+        pipe.incr(key)
+        return int(pipe.execute()[-1])
+
+    def try_probe(self, name, ttl):
+        return bool(self.valkey.set(f"{self.prefix}{name}:probe", "1", nx=True, ex=ttl))
+
+
+def _count(name, value=1):
+    from router_common import metrics
+    metrics.current().count(name, value)
+
+
+class CircuitBreaker:
+    """Circuito de una dependencia; `name` identifica el estado compartido."""
+
+    _UNSET = object()
+
+    def __init__(self, name, failure_threshold=None, failure_window=None, open_seconds=None,
+                 probe_timeout=None, failure=is_failure, valkey=_UNSET, retry_queue_url=None):
+        self.name = name
+        self.failure_threshold = failure_threshold or CIRCUIT_FAILURE_THRESHOLD
+        self.failure_window = failure_window or CIRCUIT_FAILURE_WINDOW_SECONDS
+        self.open_seconds = CIRCUIT_OPEN_SECONDS if open_seconds is None else open_seconds
+        self.probe_timeout = probe_timeout or CIRCUIT_PROBE_TIMEOUT_SECONDS
+        self.failure = failure
+        self.retry_queue_url = retry_queue_url or CIRCUIT_RETRY_QUEUE_URL
+        self._valkey = valkey
+        self._shared = None
+        self._local = _LocalState()
+
+    def _storage(self):
+        if self._shared is None:
+            client = get_valkey() if self._valkey is CircuitBreaker._UNSET else self._valkey
+            self._shared = _ValkeyState(client) if client is not None else self._local
+        return self._shared
+
+    def _run(self, operation, *args):
+        """Operación sobre el estado compartido; si Valkey falla, sobre el local."""
+        storage = self._storage()
+        try:
+            return getattr(storage, operation)(self.name, *args)
+        except Exception:
+            if storage is self._local:
+                raise
+            logger.warning("Circuit %s: shared state unavailable; using container state", self.name, exc_info=True)
+            return getattr(self._local, operation)(self.name, *args)
+
+    @property
+    def state(self):
+        current = self._run("get")
+        if not current:
+            return CLOSED
+        return OPEN if time.time() < current["until"] else HALF_OPEN
+
+    def retry_after(self):
+        """Segundos hasta que el circuito admita una llamada de prueba (0 si está cerrado)."""
+        current = self._run("get")
+        return max(0.0, current["until"] - time.time()) if current else 0.0
+
+    def before_call(self):
+        """
+        Lanza CircuitOpenError si la llamada no debe hacerse. Devuelve True si
+        es la llamada de prueba de HALF_OPEN.
+        """
+        current = self._run("get")
+        if not current:
+            return False
+        remaining = current["until"] - time.time()
+        if remaining <= 0 and self._run("try_probe", self.probe_timeout):
+            logger.info("Circuit %s half-open: probing", self.name)
+            return True
+        _count("CircuitRejected")
+        raise CircuitOpenError(self.name, max(remaining, 0.0) or self.probe_timeout)
+
+    def record_success(self, probe=False):
+        if probe:
+            logger.warning("Circuit %s closed", self.name)
+            self._run("close")
+
+    def record_failure(self, probe=False):
+        if probe or self._run("add_failure", self.failure_window) >= self.failure_threshold:
+            self.trip()
+
+    def trip(self):
+        """Abre el circuito durante open_seconds."""
+        logger.warning("Circuit %s open for %ss", self.name, self.open_seconds)
+        _count("CircuitOpened")
+        # El registro sobrevive a la apertura para que el siguiente pase por HALF_OPEN
+        self._run("open", time.time() + self.open_seconds, self.open_seconds + self.failure_window + self.probe_timeout)
+
+    def call(self, fn, *args, **kwargs):
+        """fn(*args, **kwargs) protegida: CircuitOpenError si el circuito está abierto."""
+        probe = self.before_call()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            if self.failure(e):
+                self.record_failure(probe)
+            elif probe:
+                # La dependencia ha respondido: el error es del llamador
+                self.record_success(probe)
+            raise
+        self.record_success(probe)
+        return result
+
+    # --- Aplazamiento a la cola de reintentos ---
+
+    def defer(self, payload, attempt=0, delay=None):
+        """
+        Encola payload (serializable a JSON) en la cola de reintentos, con más
+        retardo en cada intento. False si no hay cola o se agotaron los intentos.
+        """
+        if not self.retry_queue_url or attempt >= CIRCUIT_RETRY_MAX_ATTEMPTS:
+            return False
+        if delay is None:
+            delay = max(self.retry_after(), CIRCUIT_RETRY_DELAY_SECONDS * (2 ** attempt))
+        from router_common import clients
+        message = codec.encode_sqs({"circuit": self.name, "attempt": attempt + 1, "payload": payload})
+        clients.client("sqs").send_message(
+            QueueUrl=self.retry_queue_url,
+            DelaySeconds=int(min(delay, _MAX_DELAY_SECONDS)),
+            **message,
+        )
+        _count("CircuitDeferred")
+        logger.info("Circuit %s: deferred work (attempt %d) for %ds", self.name, attempt + 1, min(delay, _MAX_DELAY_SECONDS))
+        return True
+
+    def deferred(self, record):
+        """(payload, intento) si el registro viene de la cola de reintentos; si no, None."""
+        if record.get("eventSource") != "aws:sqs":
+            return None
+        data = codec.decode_sqs(record)
+        if not isinstance(data, dict) or data.get("circuit") != self.name:
+            return None
+        return data.get("payload"), int(data.get("attempt", 0))
@@ -0,0 +1,119 @@
+"""
+Clientes AWS compartidos por los handlers.
+
+client()/resource() construyen cada cliente la primera vez que se pide y lo
+reutilizan en las siguientes invocaciones del contenedor, con una
+botocore Config común:
+  - max_pool_connections acorde a la concurrencia del handler (por defecto
+    AWS_CLIENT_MAX_POOL; se puede subir por llamada para fan-outs)
+  - reintentos en modo adaptive
+  - timeouts de conexión y lectura cortos (Bedrock tiene uno de lectura mayor)
+  - TCP keepalive
+  - latencia, reintentos y errores por llamada en las métricas EMF (metrics.instrument)
+
+Endpoints: set_endpoint(), o las variables ROUTER_ENDPOINT_URL_<SERVICIO>
+(p.ej. ROUTER_ENDPOINT_URL_SQS) y ROUTER_ENDPOINT_URL para todos, permiten
+apuntar a sustitutos locales. set_client() inyecta directamente un objeto
+(tests); reset() limpia la caché.
+"""
+import os
+import threading
+
+MAX_POOL_CONNECTIONS = int(os.environ.get("AWS_CLIENT_MAX_POOL", "25"))
+CONNECT_TIMEOUT = float(os.environ.get("AWS_CLIENT_CONNECT_TIMEOUT", "2"))
+READ_TIMEOUT = float(os.environ.get("AWS_CLIENT_READ_TIMEOUT", "10"))
+MAX_ATTEMPTS = int(os.environ.get("AWS_CLIENT_MAX_ATTEMPTS", "5"))
+RETRY_MODE = os.environ.get("AWS_CLIENT_RETRY_MODE", "adaptive")
+TCP_KEEPALIVE = os.environ.get("AWS_CLIENT_TCP_KEEPALIVE", "true").lower() == "true"
+
+# Ajustes por servicio que sustituyen a los valores comunes
+SERVICE_CONFIG = {
+    # La generación de texto/imagen tarda bastante más que una llamada de control
+    "bedrock-runtime": {"read_timeout": float(os.environ.get("BEDROCK_READ_TIMEOUT", "60"))},
+}
+
+_lock = threading.Lock()
+_cache = {}
+_endpoints = {}
+
+
+def _env_key(service):
+    return service.upper().replace("-", "_")
+
+
+def endpoint_for(service):
+    """Endpoint configurado para un servicio, o None para el de AWS."""
+    if service in _endpoints:
+        return _endpoints[service]
+    return (os.environ.get(f"ROUTER_ENDPOINT_URL_{_env_key(service)}")
+            or os.environ.get("ROUTER_ENDPOINT_URL")
+            or None)
+
+
+def build_config(service=None, **overrides):
+    from botocore.config import Config
+
+    settings = {
+        "max_pool_connections": MAX_POOL_CONNECTIONS,
+        "connect_timeout": CONNECT_TIMEOUT,
+        "read_timeout": READ_TIMEOUT,
+        "retries": {"max_attempts": MAX_ATTEMPTS, "mode": RETRY_MODE},
+        "tcp_keepalive": TCP_KEEPALIVE,
+    }
+    settings.update(SERVICE_CONFIG.get(service, {}))
+    settings.update(overrides)
+    return Config(**settings)
+
+
+def _get_or_create(kind, service, endpoint_url, region_name, overrides):
+    endpoint = endpoint_url or endpoint_for(service)
+    key = (kind, service, endpoint, region_name, tuple(sorted((k, repr(v)) for k, v in overrides.items())))
+    obj = _cache.get(key)
+    if obj is not None:
+        return obj
+    with _lock:
+        obj = _cache.get(key) or _cache.get((kind, service))
+        if obj is None:
+            import boto3
+            from router_common import metrics
+
+            factory = boto3.client if kind == "client" else boto3.resource
+            kwargs = {"config": build_config(service, **overrides)}
+            if endpoint:
+                kwargs["endpoint_url"] = endpoint
+            if region_name:
+                kwargs["region_name"] = region_name
+            # Latencia, reintentos y errores por operación en las métricas EMF del handler
+            obj = metrics.instrument(factory(service, **kwargs))
+        _cache[key] = obj
+    return obj
+
+
+def client(service, endpoint_url=None, region_name=None, **config_overrides):
+    """Cliente boto3 cacheado. config_overrides: campos de botocore Config."""
+    return _get_or_create("client", service, endpoint_url, region_name, config_overrides)
+
+
+def resource(service, endpoint_url=None, region_name=None, **config_overrides):
+    """Resource boto3 cacheado (p.ej. DynamoDB)."""
+    return _get_or_create("resource", service, endpoint_url, region_name, config_overrides)
+
+
+def set_endpoint(service, endpoint_url):
+    """Apunta un servicio a otro endpoint; los clientes se crean de nuevo al pedirlos."""
+    with _lock:
+        _endpoints[service] = endpoint_url
+
+
+def set_client(service, obj, kind="client"):
+    """Inyecta el objeto a devolver para un servicio, sea cual sea la configuración pedida."""
+    with _lock:
+        for key in [k for k in _cache if k[0] == kind and k[1] == service]:
+            del _cache[key]
+        _cache[(kind, service)] = obj
+
+
+def reset():
+    with _lock:
+        _cache.clear()
+        _endpoints.clear()
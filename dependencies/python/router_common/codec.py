@@ -0,0 +1,213 @@
+"""
+Codificación de los payloads que viajan por SQS entre saltos.
+
+    encoding = "<formato>[+<compresión>]"   p.ej. "json", "msgpack", "json+zlib", "cbor+zstd"
+
+  - formato: json (por defecto, sin dependencias), msgpack (paquete msgpack) o cbor (paquete cbor2)
+  - compresión: zlib (stdlib) o zstd (paquete zstandard), solo si el payload
+    serializado supera PAYLOAD_COMPRESSION_THRESHOLD bytes y el resultado ocupa menos
+
+El JSON sin comprimir viaja tal cual (compatible con los consumidores anteriores).
+Todo lo binario se enmarca como texto, porque SQS solo admite cuerpos de texto:
+
+    "rc1:<encoding>:<base64>"
+
+y además se declara en el MessageAttribute ContentEncoding. El receptor detecta
+la codificación por el atributo o, si no llega (reenvíos a mano, redrive), por el prefijo.
+
+Configuración por función (variables de entorno):
+    PAYLOAD_CODEC=json|msgpack|cbor
+    PAYLOAD_COMPRESSION=zlib|zstd|none
+    PAYLOAD_COMPRESSION_THRESHOLD=<bytes>
+Un formato configurado pero no instalado en la capa se degrada a json con un warning.
+"""
+import base64
+import json
+import logging
+import os
+import zlib
+
+logger = logging.getLogger(__name__)
+
+JSON = "json"
+MSGPACK = "msgpack"
+CBOR = "cbor"
+ZLIB = "zlib"
+ZSTD = "zstd"
+
+ATTRIBUTE = "ContentEncoding"
+PREFIX = "rc1:"
+
+PAYLOAD_CODEC = os.environ.get("PAYLOAD_CODEC", JSON).strip().lower()
+PAYLOAD_COMPRESSION = os.environ.get("PAYLOAD_COMPRESSION", ZLIB).strip().lower()
+PAYLOAD_COMPRESSION_THRESHOLD = int(os.environ.get("PAYLOAD_COMPRESSION_THRESHOLD", "4096"))
+
+
+class CodecError(ValueError):
+    """
+    Payload con una codificación desconocida, no disponible en este entorno o
+    con un cuerpo que no se puede decodificar (base64, compresión o formato).
+    """
+
+
+def _json_dumps(obj):
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _json_loads(data):
+    return json.loads(data)
+
+
+def _msgpack():
+    import msgpack
+    return (lambda obj: msgpack.packb(obj, use_bin_type=True),
+            lambda data: msgpack.unpackb(data, raw=False))
+
+
+def _cbor():
+    import cbor2
+    return cbor2.dumps, cbor2.loads
+
+
+def _zlib():
+    return (lambda data: zlib.compress(data, 6)), zlib.decompress
+
+
+def _zstd():
+    import zstandard
+    compressor = zstandard.ZstdCompressor(level=3)
+    decompressor = zstandard.ZstdDecompressor()
+    return compressor.compress, decompressor.decompress
+
+
+# nombre -> función que devuelve (codificar, decodificar); se resuelven al primer uso
+_FORMAT_LOADERS = {JSON: lambda: (_json_dumps, _json_loads), MSGPACK: _msgpack, CBOR: _cbor}
+_COMPRESSION_LOADERS = {ZLIB: _zlib, ZSTD: _zstd}
+_loaded = {}
+
+
+def _get(name, loaders):
+    if name not in _loaded:
+        loader = loaders.get(name)
+        if loader is None:
+            raise CodecError(f"Codificación desconocida: {name!r}")
+        try:
+            _loaded[name] = loader()
+        except ImportError as e:
+            raise CodecError(f"{name} no está disponible: {e}") from e
+    return _loaded[name]
+
+
+def available(name):
+    """True si el formato o compresión se puede usar en este entorno."""
+    try:
+        _get(name, _FORMAT_LOADERS if name in _FORMAT_LOADERS else _COMPRESSION_LOADERS)
+        return True
+    except CodecError:
+        return False
+
+
+def _resolve(codec, compression):
+    codec = (codec or PAYLOAD_CODEC) or JSON
+    compression = compression if compression is not None else PAYLOAD_COMPRESSION
+    if compression in ("", "none"):
+        compression = None
+    if codec != JSON and not available(codec):
+        logger.warning("PAYLOAD_CODEC=%s is not installed; falling back to json", codec)
+        codec = JSON
+    if compression and not available(compression):
+        logger.warning("PAYLOAD_COMPRESSION=%s is not installed; falling back to zlib", compression)
+        compression = ZLIB
+    return codec, compression
+
+
+def encode(obj, codec=None, compression=None, threshold=None):
+    """
+    obj -> (texto, encoding). codec/compression/threshold sobrescriben la
+    configuración del entorno (compression="none" la desactiva).
+    """
+    codec, compression = _resolve(codec, compression)
+    threshold = PAYLOAD_COMPRESSION_THRESHOLD if threshold is None else threshold
+
+    data = _get(codec, _FORMAT_LOADERS)[0](obj)
+    encoding = codec
+    if compression and len(data) >= threshold:
+        compressed = _get(compression, _COMPRESSION_LOADERS)[0](data)
+        # El base64 añade un 33%: solo compensa si la compresión gana más que eso
+        if len(compressed) * 4 // 3 + len(PREFIX) + 16 < len(data):
+            data = compressed
+            encoding = f"{codec}+{compression}"
+
+    if encoding == JSON:
+        return data.decode("utf-8"), JSON
+    return f"{PREFIX}{encoding}:{base64.b64encode(data).decode('ascii')}", encoding
+
+
+def _data_start(text):
+    """Posición del base64 en "rc1:<encoding>:<base64>"."""
+    end = text.find(":", len(PREFIX))
+    if end < 0:
+        raise CodecError(f"Payload con el prefijo {PREFIX!r} sin codificación")
+    return end + 1
+
+
+def detect(text, encoding=None):
+    """Encoding de un payload: el declarado, el del prefijo o json."""
+    if encoding:
+        return encoding
+    if isinstance(text, str) and text.startswith(PREFIX):
+        return text[len(PREFIX):_data_start(text) - 1]
+    return JSON
+
+
+def decode(text, encoding=None):
+    """
+    texto -> objeto. Un JSON inválido (texto plano de productores antiguos)
+    se devuelve tal cual para que lo interprete el consumidor.
+    """
+    if isinstance(text, (bytes, bytearray)):
+        text = text.decode("utf-8")
+    encoding = detect(text, encoding)
+    if encoding == JSON and not text.startswith(PREFIX):
+        try:
+            return json.loads(text)
+        except ValueError:
+            return text
+
+    if not text.startswith(PREFIX):
+        raise CodecError(f"Payload declarado como {encoding} sin el prefijo {PREFIX!r}")
+    codec, _, compression = encoding.partition("+")
+    start = _data_start(text)
+    decompress = _get(compression, _COMPRESSION_LOADERS)[1] if compression else None
+    loads = _get(codec, _FORMAT_LOADERS)[1]
+    try:
+        data = base64.b64decode(text[start:], validate=True)
+        if decompress:
+            data = decompress(data)
+        return loads(data)
+    except Exception as e:
+        # binascii.Error, zlib.error, JSON/msgpack inválido...: todo como CodecError
+        raise CodecError(f"Payload {encoding} inválido: {e}") from e
+
+
+def encode_sqs(obj, **options):
+    """
+    Argumentos de send_message / entrada de send_message_batch:
+    {"MessageBody": ..., "MessageAttributes": {...}} (sin atributos para json).
+    """
+    body, encoding = encode(obj, **options)
+    if encoding == JSON:
+        return {"MessageBody": body}
+    return {
+        "MessageBody": body,
+        "MessageAttributes": {ATTRIBUTE: {"DataType": "String", "StringValue": encoding}},
+    }
+
+
+def decode_sqs(record):
+    """Registro SQS de un evento Lambda (o mensaje de receive_message) -> objeto."""
+    attributes = record.get("messageAttributes") or record.get("MessageAttributes") or {}
+    attribute = attributes.get(ATTRIBUTE) or {}
+    encoding = attribute.get("stringValue") or attribute.get("StringValue")
+    body = record["body"] if "body" in record else record.get("Body", "")
+    return decode(body, encoding)
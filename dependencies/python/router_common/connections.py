@@ -0,0 +1,118 @@
+"""
+Registro de conexiones WebSocket con suscripciones por canal.
+
+Tabla CONNECTIONS_TABLE (PK connectionId, SK channel):
+  - {connectionId, channel: "$connection"}  -> la propia conexión
+  - {connectionId, channel: "<canal>"}      -> una suscripción
+El GSI CONNECTIONS_CHANNEL_INDEX (PK channel) permite leer solo los suscriptores
+de un canal. Todos los items llevan expiresAt (TTL de DynamoDB) para que las
+conexiones abandonadas desaparezcan solas.
+"""
+import os
+import time
+
+from boto3.dynamodb.conditions import Key
+
+CONNECTION_ITEM = "$connection"
+CHANNEL_INDEX_NAME = os.environ.get("CONNECTIONS_CHANNEL_INDEX", "channel-index")
+# API Gateway cierra las conexiones WebSocket a las 2 horas
+CONNECTION_TTL_SECONDS = int(os.environ.get("CONNECTION_TTL_SECONDS", "7200"))
+# Canales de los resultados sin messageId (los que lo tienen solo van a message:<id>).
+# Una conexión los recibe si se suscribe a ellos explícitamente (?channels=all)
+DEFAULT_CHANNELS = [c.strip() for c in os.environ.get("DEFAULT_CHANNELS", "all").split(",") if c.strip()]
+MAX_CHANNEL_LENGTH = 128
+
+_table = None
+
+
+def _get_table():
+    global _table
+    if _table is None:
+        from router_common import clients
+        _table = clients.resource("dynamodb").Table(os.environ["CONNECTIONS_TABLE"])
+    return _table
+
+
+def _expires_at():
+    return int(time.time()) + CONNECTION_TTL_SECONDS
+
+
+def valid_channels(channels):
+    return [c for c in channels or [] if isinstance(c, str) and c and c != CONNECTION_ITEM and len(c) <= MAX_CHANNEL_LENGTH]
+
+
+def register_connection(connection_id, channels):
+    """
+    Guarda la conexión y sus suscripciones iniciales (solo los canales válidos).
+    $connect rechaza antes las conexiones sin ninguno: no recibirían nada.
+    """
+    channels = valid_channels(channels)
+    expires_at = _expires_at()
+    with _get_table().batch_writer() as batch:
+        batch.put_item(Item={"connectionId": connection_id, "channel": CONNECTION_ITEM, "expiresAt": expires_at})
+        for channel in channels:
+            batch.put_item(Item={"connectionId": connection_id, "channel": channel, "expiresAt": expires_at})
+    return channels
+
+
+def subscribe(connection_id, channels):
+    channels = valid_channels(channels)
+    expires_at = _expires_at()
+    with _get_table().batch_writer() as batch:
+        for channel in channels:
+            batch.put_item(Item={"connectionId": connection_id, "channel": channel, "expiresAt": expires_at})
+    return channels
+
+
+def unsubscribe(connection_id, channels):
+    channels = valid_channels(channels)
+    with _get_table().batch_writer() as batch:
+        for channel in channels:
+            batch.delete_item(Key={"connectionId": connection_id, "channel": channel})
+    return channels
+
+
+def remove_connection(connection_id):
+    """Elimina la conexión y todas sus suscripciones."""
+    table = _get_table()
+    params = {
+        "KeyConditionExpression": Key("connectionId").eq(connection_id),
+        "ProjectionExpression": "connectionId, channel",
+    }
+    keys = []
+    while True:
+        page = table.query(**params)
+        keys.extend(page.get("Items", []))
+        if not page.get("LastEvaluatedKey"):
+            break
+        params["ExclusiveStartKey"] = page["LastEvaluatedKey"]
+    with table.batch_writer() as batch:
+        for key in keys:
+            batch.delete_item(Key={"connectionId": key["connectionId"], "channel": key["channel"]})
+    return len(keys)
+
+
+def get_subscribers(channels):
+    """connectionIds suscritos a cualquiera de los canales (sin duplicados)."""
+    table = _get_table()
+    now = int(time.time())
+    subscribers = []
+    seen = set()
+    for channel in valid_channels(channels):
+        params = {
+            "IndexName": CHANNEL_INDEX_NAME,
+            "KeyConditionExpression": Key("channel").eq(channel),
+        }
+        while True:
+            page = table.query(**params)
+            for item in page.get("Items", []):
+                connection_id = item["connectionId"]
+                # El borrado por TTL no es inmediato: ignorar items ya caducados
+                if int(item.get("expiresAt", now)) < now or connection_id in seen:
+                    continue
+                seen.add(connection_id)
+                subscribers.append(connection_id)
+            if not page.get("LastEvaluatedKey"):
+                break
+            params["ExclusiveStartKey"] = page["LastEvaluatedKey"]
+    return subscribers
@@ -0,0 +1,144 @@
+"""
+Sobre (envelope) canónico de los mensajes del pipeline.
+
+Cada mensaje viaja entre saltos como un único objeto JSON:
+    {"v": 1, "id": ..., "ts": <ms>, "contentType": "text/plain" | "application/json",
+     "trace": {...}, "body": ...}
+  - id: identificador estable del mensaje desde la API (MessageId en DynamoDB)
+  - ts: ms en que entró al pipeline
+  - trace: el bloque de router_common.hops (misma clave, get_trace() sigue funcionando)
+  - body: el texto tal cual, o el objeto JSON como objeto (nunca JSON dentro de un string)
+
+decode() se llama una sola vez por salto. Los formatos anteriores
+({"message": ..., "trace": ...}, {"messageId", "body"} de Step Functions,
+texto plano) se convierten con from_legacy() aplicando las heurísticas antiguas
+una sola vez, para los mensajes que ya estaban en vuelo durante un despliegue.
+"""
+import json
+import uuid
+
+from router_common.hops import TRACE_FIELD, now_ms
+
+VERSION = 1
+TEXT = "text/plain"
+JSON = "application/json"
+
+# Claves del formato anterior que contienen el texto del mensaje
+_LEGACY_TEXT_KEYS = ("message", "text", "msg", "payload")
+
+
+class EnvelopeError(ValueError):
+    """El payload dice ser un envelope pero no es válido (p.ej. versión desconocida)."""
+
+
+class Envelope:
+    __slots__ = ("id", "body", "content_type", "trace", "ts", "version")
+
+    def __init__(self, body, content_type=None, id=None, trace=None, ts=None, version=VERSION):
+        self.id = id or str(uuid.uuid4())
+        self.body = body
+        self.content_type = content_type or (TEXT if isinstance(body, str) else JSON)
+        self.trace = trace
+        self.ts = ts if ts is not None else now_ms()
+        self.version = version
+
+    def text(self):
+        """El cuerpo como texto: el propio string, o el JSON compacto de un objeto."""
+        if isinstance(self.body, str):
+            return self.body
+        return json.dumps(self.body, ensure_ascii=False, separators=(",", ":"))
+
+    def to_dict(self):
+        data = {"v": self.version, "id": self.id, "ts": self.ts, "contentType": self.content_type, "body": self.body}
+        if self.trace:
+            data[TRACE_FIELD] = self.trace
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        version = data.get("v")
+        if not isinstance(version, int) or version > VERSION:
+            raise EnvelopeError(f"Versión de envelope no soportada: {version!r}")
+        return cls(
+            data["body"],
+            content_type=data.get("contentType"),
+            id=data.get("id"),
+            trace=data.get(TRACE_FIELD),
+            ts=data.get("ts"),
+            version=version,
+        )
+
+    def __repr__(self):
+        return f"Envelope(id={self.id!r}, content_type={self.content_type!r}, body={self.body!r})"
+
+
+def is_envelope(data):
+    return isinstance(data, dict) and "v" in data and "id" in data and "body" in data
+
+
+def new(body, trace=None, content_type=None, id=None):
+    return Envelope(body, content_type=content_type, id=id, trace=trace)
+
+
+def encode(envelope):
+    """Envelope -> str JSON compacto (cuerpo de SQS, Detail de EventBridge, input de Step Functions)."""
+    return json.dumps(envelope.to_dict(), ensure_ascii=False, separators=(",", ":"))
+
+
+def decode(raw, message_id=None):
+    """
+    str/bytes/dict -> Envelope. Si no es un envelope se interpreta con
+    from_legacy(); message_id es el id a usar si el formato antiguo no trae uno.
+    """
+    data = raw
+    if isinstance(raw, (bytes, bytearray)):
+        raw = raw.decode("utf-8")
+    if isinstance(raw, str):
+        try:
+            data = json.loads(raw)
+        except ValueError:
+            return Envelope(raw, content_type=TEXT, id=message_id)
+    if is_envelope(data):
+        return Envelope.from_dict(data)
+    return from_legacy(data, message_id=message_id)
+
+
+def _maybe_json(value):
+    if isinstance(value, str):
+        stripped = value.strip()
+        if stripped[:1] in ("{", "[") and stripped[-1:] in ("}", "]"):
+            try:
+                return json.loads(stripped)
+            except ValueError:
+                pass
+    return value
+
+
+def from_legacy(data, message_id=None):
+    """Convierte los payloads anteriores al envelope (un solo nivel de JSON anidado)."""
+    data = _maybe_json(data)
+    if is_envelope(data):
+        return Envelope.from_dict(data)
+    if not isinstance(data, dict):
+        return Envelope(data, id=message_id)
+
+    trace = data.get(TRACE_FIELD) if isinstance(data.get(TRACE_FIELD), dict) else None
+    message_id = data.get("messageId") or data.get("id") or message_id
+
+    # Input/salida de Step Functions: {"messageId", "body": {"message", "trace"}}
+    if "body" in data and "message" not in data:
+        inner = _maybe_json(data["body"])
+        if is_envelope(inner):
+            return Envelope.from_dict(inner)
+        if isinstance(inner, dict):
+            envelope = from_legacy(inner, message_id=message_id)
+            envelope.trace = envelope.trace or trace
+            return envelope
+        return Envelope(inner, id=message_id, trace=trace)
+
+    for key in _LEGACY_TEXT_KEYS:
+        if key in data:
+            return Envelope(_maybe_json(data[key]), id=message_id, trace=trace)
+
+    body = {k: v for k, v in data.items() if k != TRACE_FIELD}
+    return Envelope(body, content_type=JSON, id=message_id, trace=trace)
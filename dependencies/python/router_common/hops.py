@@ -0,0 +1,111 @@
+"""
+Latencia real por salto del pipeline.
+
+message_router_queue estampa en cada mensaje un bloque "trace":
+    {"traceId": ..., "ingressTs": <ms>, "lastHopTs": <ms>}
+Cada handler del camino llama a HopRecorder.observe() al procesar el mensaje,
+que mide:
+  - HopLatency: ms desde el salto anterior (lastHopTs)
+  - EndToEndLatency: ms desde la entrada por la API (ingressTs)
+y devuelve el trace actualizado para que el handler lo reenvíe al siguiente
+salto. flush() pasa las latencias a metrics.current() (namespace
+METRICS_NAMESPACE, dimensión Hop), que las escribe en la línea EMF de la
+invocación, y lambda_metrics consulta después los percentiles p50/p95/p99 por salto.
+"""
+import os
+import random
+import time
+import uuid
+
+from router_common import metrics
+
+TRACE_FIELD = "trace"
+METRICS_NAMESPACE = os.environ.get("HOP_METRICS_NAMESPACE", "MessageRouter/Pipeline")
+HOP_LATENCY_METRIC = "HopLatency"
+END_TO_END_METRIC = "EndToEndLatency"
+HOP_DIMENSION = "Hop"
+
+# Saltos instrumentados, en orden del pipeline (lo usa lambda_metrics)
+HOPS = [
+    "lambda_dispatcher",
+    "eb_to_sqs2",
+    "sqs2_to_stepfn",
+    "lambda_dynamo",
+    "lambda_ddb_to_s3",
+    "lambda_s3_to_bedrock",
+]
+
+# EMF admite como máximo 100 valores por métrica en un mismo documento
+_EMF_MAX_VALUES = 100
+
+
+def now_ms():
+    return int(time.time() * 1000)
+
+
+def new_trace(ingress_ts=None):
+    """Trace nuevo para un mensaje que entra al pipeline."""
+    ts = int(ingress_ts) if ingress_ts is not None else now_ms()
+    return {"traceId": uuid.uuid4().hex, "ingressTs": ts, "lastHopTs": ts}
+
+
+def get_trace(payload):
+    """Devuelve el trace de un payload (dict) o None si no trae uno válido."""
+    if not isinstance(payload, dict):
+        return None
+    trace = payload.get(TRACE_FIELD)
+    if isinstance(trace, dict) and "ingressTs" in trace:
+        return trace
+    return None
+
+
+class HopRecorder:
+    """Acumula las latencias de una invocación para un salto y las pasa a metrics.current()."""
+
+    def __init__(self, hop):
+        self.hop = hop
+        # (HopLatency, EndToEndLatency, traceId o None) por mensaje observado
+        self._observed = []
+
+    def observe(self, trace, at=None):
+        """
+        Registra el paso de un mensaje por este salto. Devuelve una copia del
+        trace con lastHopTs actualizado (o None si no había trace).
+        """
+        if not trace:
+            return None
+        at = at if at is not None else now_ms()
+        try:
+            ingress = int(trace["ingressTs"])
+            last = int(trace.get("lastHopTs", ingress))
+        except (KeyError, TypeError, ValueError):
+            return None
+        # Relojes de distintos contenedores: nunca latencias negativas
+        self._observed.append((max(0, at - last), max(0, at - ingress), trace.get("traceId")))
+        updated = dict(trace)
+        updated["lastHopTs"] = at
+        updated["hop"] = self.hop
+        return updated
+
+    def flush(self):
+        """
+        Pasa las latencias acumuladas a las métricas de la invocación y limpia el
+        buffer. traceIds se llena con los mismos mensajes y en el mismo orden que
+        las latencias; pasados _EMF_MAX_VALUES en la invocación (varios
+        recorders o varios flush()) se muestrean mensajes enteros.
+        """
+        observed, self._observed = self._observed, []
+        if not observed:
+            return
+        m = metrics.current()
+        trace_ids = list(m.get_property("traceIds", []))
+        room = _EMF_MAX_VALUES - len(trace_ids)
+        if len(observed) > room:
+            observed = [observed[i] for i in sorted(random.sample(range(len(observed)), max(room, 0)))]
+        dimensions = {HOP_DIMENSION: self.hop}
+        for hop_ms, e2e_ms, trace_id in observed:
+            m.observe(HOP_LATENCY_METRIC, hop_ms, namespace=METRICS_NAMESPACE, dimensions=dimensions)
+            m.observe(END_TO_END_METRIC, e2e_ms, namespace=METRICS_NAMESPACE, dimensions=dimensions)
+            trace_ids.append(trace_id)
+        # Propiedad (no dimensión): permite buscar trazas en Logs Insights
+        m.property("traceIds", trace_ids)
@@ -0,0 +1,252 @@
+"""
+Idempotencia de los consumidores (SQS, SNS, EventBridge y DynamoDB Streams
+entregan al menos una vez).
+
+    @idempotency.idempotent("lambda_s3_to_bedrock", key=lambda bucket, key: [bucket, key])
+    def process_object(bucket, key):
+        ...  # Bedrock, S3, WebSocket
+        return {"response": ...}
+
+Cada llamada se identifica con "<nombre>#<sha256 de key(*args)>" (por defecto,
+el primer argumento) y pasa por dos estados:
+  - IN_PROGRESS: reservado con una escritura condicional; caduca a los
+    IDEMPOTENCY_IN_PROGRESS_TTL_SECONDS (debe cubrir el timeout de la función)
+    por si el contenedor muere a mitad
+  - COMPLETED: guarda el resultado (JSON) durante IDEMPOTENCY_TTL_SECONDS
+
+Un duplicado de una llamada completada recibe el resultado guardado sin
+ejecutar la función; uno de una llamada en curso lanza
+IdempotencyInProgressError para que el origen lo reintente más tarde. Si la
+función lanza, la reserva se borra y el reintento se procesa de nuevo.
+
+Almacenamiento: la tabla IDEMPOTENCY_TABLE (clave "id", TTL "expiresAt") o,
+con IDEMPOTENCY_BACKEND=valkey, el Valkey compartido (cache.get_valkey()).
+Delante, un LRU por contenedor con los resultados completados: un duplicado
+que cae en el mismo contenedor no hace ninguna llamada de red.
+Sin almacenamiento configurado el decorador no hace nada. Si el almacenamiento
+falla, se procesa igualmente (se prefiere duplicar trabajo a perder mensajes).
+"""
+import functools
+import hashlib
+import json
+import logging
+import os
+import time
+
+from router_common.cache import TTLCache, get_valkey
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_TABLE = os.environ.get("IDEMPOTENCY_TABLE")
+IDEMPOTENCY_BACKEND = os.environ.get("IDEMPOTENCY_BACKEND", "dynamodb").lower()
+IDEMPOTENCY_TTL_SECONDS = int(os.environ.get("IDEMPOTENCY_TTL_SECONDS", "86400"))
+IDEMPOTENCY_IN_PROGRESS_TTL_SECONDS = int(os.environ.get("IDEMPOTENCY_IN_PROGRESS_TTL_SECONDS", "180"))
+IDEMPOTENCY_LRU_SIZE = int(os.environ.get("IDEMPOTENCY_LRU_SIZE", "1024"))
+
+IN_PROGRESS = "IN_PROGRESS"
+COMPLETED = "COMPLETED"
+
+
+class IdempotencyInProgressError(Exception):
+    """Otra invocación está procesando la misma llamada: reintentar más tarde."""
+
+
+class DynamoDBStore:
+    """Registros en una tabla DynamoDB: {"id", "status", "expiresAt", "result"}."""
+
+    def __init__(self, table_name, client=None):
+        self.table_name = table_name
+        self._client = client
+
+    @property
+    def client(self):
+        if self._client is None:
+            from router_common import clients
+            self._client = clients.client("dynamodb")
+        return self._client
+
+    def acquire(self, key, in_progress_ttl):
+        """Reserva la clave. None si se ha reservado; el registro existente si no."""
+        from botocore.exceptions import ClientError
+
+        now = int(time.time())
+        try:
+            self.client.put_item(
+                TableName=self.table_name,
+                Item={"id": {"S": key}, "status": {"S": IN_PROGRESS}, "expiresAt": {"N": str(now + in_progress_ttl)}},
+                # El TTL de DynamoDB borra con retraso: un registro caducado cuenta como libre
+                ConditionExpression="attribute_not_exists(id) OR expiresAt < :now",
+                ExpressionAttributeValues={":now": {"N": str(now)}},
+                ReturnValuesOnConditionCheckFailure="ALL_OLD",
+            )
+            return None
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") != "ConditionalCheckFailedException":
+                raise
+            item = e.response.get("Item") or {}
+        record = {"status": item.get("status", {}).get("S", IN_PROGRESS)}
+        if "result" in item:
+            record["result"] = json.loads(item["result"]["S"])
+        return record
+
+    def complete(self, key, result, ttl):
+        self.client.put_item(
+            TableName=self.table_name,
+            Item={
+                "id": {"S": key},
+                "status": {"S": COMPLETED},
+                "expiresAt": {"N": str(int(time.time()) + ttl)},
+                "result": {"S": json.dumps(result, ensure_ascii=False, default=str)},
+            },
+        )
+
+    def release(self, key):
+        self.client.delete_item(TableName=self.table_name, Key={"id": {"S": key}})
+
+
+class ValkeyStore:
+    """Registros en Valkey: SET NX con expiración para reservar."""
+
+    def __init__(self, client, prefix="idempotency:"):
+        self.valkey = client
+        self.prefix = prefix
+
+    def acquire(self, key, in_progress_ttl):
+        name = self.prefix + key
+        if self.valkey.set(name, json.dumps({"status": IN_PROGRESS}), nx=True, ex=in_progress_ttl):
+            return None
+        raw = self.valkey.get(name)
+        if raw is None:
+            # Caducó entre el SET y el GET: se vuelve a intentar una vez
+            if self.valkey.set(name, json.dumps({"status": IN_PROGRESS}), nx=True, ex=in_progress_ttl):
+                return None
+            return {"status": IN_PROGRESS}
+        return json.loads(raw)
+
+    def complete(self, key, result, ttl):
+        self.valkey.set(self.prefix + key, json.dumps({"status": COMPLETED, "result": result},
+                                                      ensure_ascii=False, default=str), ex=ttl)
+
+    def release(self, key):
+        self.valkey.delete(self.prefix + key)
+
+
+def default_store():
+    """Almacenamiento según IDEMPOTENCY_BACKEND / IDEMPOTENCY_TABLE, o None."""
+    if IDEMPOTENCY_BACKEND == "valkey":
+        valkey = get_valkey()
+        if valkey is not None:
+            return ValkeyStore(valkey)
+        logger.warning("IDEMPOTENCY_BACKEND=valkey but Valkey is not available; trying IDEMPOTENCY_TABLE")
+    if IDEMPOTENCY_TABLE:
+        return DynamoDBStore(IDEMPOTENCY_TABLE)
+    return None
+
+
+def _count(name):
+    from router_common import metrics
+    metrics.current().count(name)
+
+
+class Idempotency:
+    """
+    Reserva/completa llamadas de un consumidor. El decorador idempotent() lo
+    usa por llamada; los handlers por lotes (p.ej. bulk de OpenSearch) llaman
+    a begin()/complete()/release() directamente.
+    """
+
+    _UNSET = object()
+
+    def __init__(self, name, store=_UNSET, ttl=None, in_progress_ttl=None, lru_size=None):
+        self.name = name
+        self._store = store
+        self.ttl = ttl if ttl is not None else IDEMPOTENCY_TTL_SECONDS
+        self.in_progress_ttl = in_progress_ttl if in_progress_ttl is not None else IDEMPOTENCY_IN_PROGRESS_TTL_SECONDS
+        self.completed = TTLCache(maxsize=lru_size if lru_size is not None else IDEMPOTENCY_LRU_SIZE, ttl=self.ttl)
+
+    @property
+    def store(self):
+        if self._store is Idempotency._UNSET:
+            self._store = default_store()
+        return self._store
+
+    @property
+    def enabled(self):
+        return self.store is not None
+
+    def key(self, data):
+        raw = json.dumps(data, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+        return f"{self.name}#{hashlib.sha256(raw.encode('utf-8')).hexdigest()}"
+
+    def begin(self, data):
+        """
+        (clave, resultado previo o None). None: la llamada queda reservada y hay
+        que terminarla con complete() o release(). Lanza IdempotencyInProgressError
+        si otra invocación la tiene reservada.
+        """
+        key = self.key(data)
+        cached = self.completed.get(key, Idempotency._UNSET)
+        if cached is not Idempotency._UNSET:
+            _count("IdempotentHits")
+            return key, {"status": COMPLETED, "result": cached}
+        try:
+            record = self.store.acquire(key, self.in_progress_ttl)
+        except Exception:
+            logger.warning("Idempotency store unavailable; processing %s without dedupe", key, exc_info=True)
+            _count("IdempotencyErrors")
+            return key, None
+        if record is None:
+            return key, None
+        if record.get("status") == COMPLETED:
+            self.completed.set(key, record.get("result"))
+            _count("IdempotentHits")
+            return key, record
+        _count("IdempotentInProgress")
+        raise IdempotencyInProgressError(f"{key} is already being processed")
+
+    def complete(self, key, result=None):
+        self.completed.set(key, result)
+        try:
+            self.store.complete(key, result, self.ttl)
+        except Exception:
+            logger.warning("Could not store idempotency result for %s", key, exc_info=True)
+            _count("IdempotencyErrors")
+
+    def release(self, key):
+        try:
+            self.store.release(key)
+        except Exception:
+            # La reserva caduca sola a los in_progress_ttl segundos
+            logger.warning("Could not release idempotency key %s", key, exc_info=True)
+            _count("IdempotencyErrors")
+
+
+def idempotent(name, key=None, **options):
+    """
+    Decorador: la función se ejecuta una vez por valor de key(*args, **kwargs)
+    (por defecto, el primer argumento) y los duplicados reciben su resultado.
+    El resultado debe ser serializable a JSON.
+    """
+    def decorate(fn):
+        guard = Idempotency(name, **options)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not guard.enabled:
+                return fn(*args, **kwargs)
+            data = key(*args, **kwargs) if key else args[0]
+            idem_key, previous = guard.begin(data)
+            if previous is not None:
+                logger.info("Duplicate call %s; returning stored result", idem_key)
+                return previous.get("result")
+            try:
+                result = fn(*args, **kwargs)
+            except Exception:
+                guard.release(idem_key)
+                raise
+            guard.complete(idem_key, result)
+            return result
+
+        wrapper.idempotency = guard
+        return wrapper
+    return decorate
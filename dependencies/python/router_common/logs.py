@@ -0,0 +1,146 @@
+"""
+Logging estructurado (una línea JSON por entrada) para los handlers.
+
+    logger = logs.get_logger("eb_to_sqs2")
+
+    @logs.handler(logger)
+    def lambda_handler(event, context):
+        logger.debug("Evento: %s", logs.payload(event))
+        logger.info("Batch enviado", extra={"entries": len(entries)})
+
+  - Nivel por handler: LOG_LEVEL_<HANDLER> (p.ej. LOG_LEVEL_EB_TO_SQS2=DEBUG),
+    si no LOG_LEVEL, si no INFO. El nivel de las librerías (botocore, urllib3)
+    es LOG_LEVEL_LIBRARIES (WARNING por defecto).
+  - Muestreo por invocación: con probabilidad LOG_DEBUG_SAMPLE_RATE (0..1) una
+    invocación entera se registra en DEBUG, payloads incluidos; el resto, en el
+    nivel configurado.
+  - Formateo perezoso: los argumentos solo se formatean si la línea se escribe,
+    y payload() no serializa nada hasta entonces. Los payloads se recortan a
+    LOG_PAYLOAD_MAX_CHARS caracteres.
+"""
+import functools
+import json
+import logging
+import os
+import random
+import sys
+import time
+
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+LOG_LEVEL_LIBRARIES = os.environ.get("LOG_LEVEL_LIBRARIES", "WARNING").upper()
+LOG_DEBUG_SAMPLE_RATE = float(os.environ.get("LOG_DEBUG_SAMPLE_RATE", "0"))
+LOG_PAYLOAD_MAX_CHARS = int(os.environ.get("LOG_PAYLOAD_MAX_CHARS", "1024"))
+
+# Atributos propios de LogRecord: lo demás viene de extra= y se escribe como campo
+_RESERVED = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_configured = False
+_context = {}
+
+
+class _Payload:
+    """Se serializa (y recorta) solo si la línea llega a escribirse."""
+
+    __slots__ = ("obj", "limit")
+
+    def __init__(self, obj, limit):
+        self.obj = obj
+        self.limit = limit
+
+    def __str__(self):
+        obj = self.obj
+        if isinstance(obj, (bytes, bytearray)):
+            obj = obj.decode("utf-8", errors="replace")
+        text = obj if isinstance(obj, str) else json.dumps(obj, ensure_ascii=False, default=str)
+        if len(text) > self.limit:
+            return f"{text[:self.limit]}…(+{len(text) - self.limit} chars)"
+        return text
+
+    __repr__ = __str__
+
+
+def payload(obj, limit=None):
+    """Argumento de log para eventos, respuestas o items: JSON recortado y perezoso."""
+    return _Payload(obj, LOG_PAYLOAD_MAX_CHARS if limit is None else limit)
+
+
+def truncate(text, limit=None):
+    """Recorta un texto ya construido a LOG_PAYLOAD_MAX_CHARS."""
+    limit = LOG_PAYLOAD_MAX_CHARS if limit is None else limit
+    if text is None or len(text) <= limit:
+        return text
+    return f"{text[:limit]}…(+{len(text) - limit} chars)"
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update(_context)
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def _level(name):
+    return logging.getLevelName(name) if isinstance(logging.getLevelName(name), int) else logging.INFO
+
+
+def _configure_root():
+    global _configured
+    if _configured:
+        return
+    root = logging.getLogger()
+    # En Lambda el runtime ya instala un handler en la raíz: solo se cambia el formato
+    if not root.handlers:
+        root.addHandler(logging.StreamHandler(sys.stdout))
+    formatter = JsonFormatter()
+    for h in root.handlers:
+        h.setFormatter(formatter)
+    root.setLevel(_level(LOG_LEVEL_LIBRARIES))
+    _configured = True
+
+
+def configured_level(name):
+    """Nivel de un handler según LOG_LEVEL_<HANDLER> / LOG_LEVEL."""
+    return _level(os.environ.get(f"LOG_LEVEL_{name.upper()}", LOG_LEVEL).upper())
+
+
+def get_logger(name):
+    """Logger JSON del handler `name` con su nivel configurado."""
+    _configure_root()
+    logger = logging.getLogger(f"router.{name}")
+    logger.setLevel(configured_level(name))
+    logger.router_level = logger.level
+    return logger
+
+
+def start_invocation(logger, context=None):
+    """Decide el muestreo de la invocación y fija los campos comunes (requestId, sampled)."""
+    sampled = LOG_DEBUG_SAMPLE_RATE > 0 and random.random() < LOG_DEBUG_SAMPLE_RATE
+    logger.setLevel(logging.DEBUG if sampled else logger.router_level)
+    _context.clear()
+    request_id = getattr(context, "aws_request_id", None)
+    if request_id:
+        _context["requestId"] = request_id
+    if sampled:
+        _context["sampled"] = True
+    return sampled
+
+
+def handler(logger):
+    """Decorador de lambda_handler: start_invocation() antes de cada invocación."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(event, context):
+            start_invocation(logger, context)
+            return fn(event, context)
+        return wrapper
+    return decorate
@@ -0,0 +1,347 @@
+"""
+Métricas por handler en CloudWatch Embedded Metric Format (EMF).
+
+Durante la invocación se acumulan en memoria contadores y distribuciones, y
+flush() escribe una sola línea JSON EMF al final (sin llamadas a la API de
+CloudWatch: la extrae el propio servicio de los logs de Lambda).
+
+    @metrics.handler("eb_to_sqs2")
+    def lambda_handler(event, context):
+        m = metrics.current()
+        m.records_in(len(records))
+        ...
+        m.records_out(sent)
+
+Métricas comunes:
+  - RecordsIn / RecordsOut (Count) y BatchSize (distribución)
+  - <Operación>Latency (ms) y <Operación>Errors por llamada a AWS, Retries:
+    las registra instrument() con los eventos de botocore (clients.py lo
+    aplica a todos los clientes), sin código en los handlers
+  - CacheHits / CacheMisses (cache())
+  - Invocations, Errors y ColdStart (decorador handler())
+
+observe(..., namespace=, dimensions=) registra una distribución con otro
+namespace y dimensiones propias (p.ej. la latencia por salto de hops.py): va
+como otra directiva del mismo documento, no como una línea EMF aparte.
+
+Dimensiones: solo las de METRICS_DIMENSIONS (por defecto Service) se publican
+como dimensión. Los valores de alta cardinalidad (ids, uuids, textos largos) o
+que superan METRICS_MAX_DIMENSION_VALUES valores distintos por contenedor se
+descartan como dimensión y se escriben como propiedad (buscables en Logs
+Insights, sin crear series nuevas en CloudWatch).
+"""
+import functools
+import json
+import os
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+METRICS_NAMESPACE = os.environ.get("METRICS_NAMESPACE", "MessageRouter/Handlers")
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "true").lower() != "false"
+METRICS_DIMENSIONS = tuple(
+    d.strip() for d in os.environ.get("METRICS_DIMENSIONS", "Service").split(",") if d.strip()
+)
+METRICS_MAX_DIMENSION_VALUES = int(os.environ.get("METRICS_MAX_DIMENSION_VALUES", "20"))
+
+SERVICE_DIMENSION = "Service"
+COUNT = "Count"
+MILLISECONDS = "Milliseconds"
+BYTES = "Bytes"
+
+# Límites de EMF por documento
+_EMF_MAX_VALUES = 100
+_EMF_MAX_METRICS = 100
+_EMF_MAX_DIMENSIONS = 30
+
+_MAX_DIMENSION_LENGTH = 64
+_HIGH_CARDINALITY = re.compile(
+    r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}"  # uuid
+    r"|[0-9a-f]{16,}"                                                   # hashes / trace ids
+    r"|\d{6,}",                                                         # timestamps, teléfonos
+    re.IGNORECASE,
+)
+
+# Valores de dimensión vistos por el contenedor: {dimensión: set(valores)}
+_seen_dimension_values = {}
+_seen_lock = threading.Lock()
+_current = None
+_cold_start = True
+
+
+def _now_ms():
+    return int(time.time() * 1000)
+
+
+def _accept_dimension(name, value):
+    if name not in METRICS_DIMENSIONS:
+        return False
+    if len(value) > _MAX_DIMENSION_LENGTH or _HIGH_CARDINALITY.search(value):
+        return False
+    with _seen_lock:
+        seen = _seen_dimension_values.setdefault(name, set())
+        if value in seen:
+            return True
+        if len(seen) >= METRICS_MAX_DIMENSION_VALUES:
+            return False
+        seen.add(value)
+        return True
+
+
+class _Distribution:
+    """Valores de una métrica; más allá del límite de EMF, muestreo uniforme (reservoir)."""
+
+    __slots__ = ("unit", "values", "count")
+
+    def __init__(self, unit):
+        self.unit = unit
+        self.values = []
+        self.count = 0
+
+    def add(self, value):
+        self.count += 1
+        if len(self.values) < _EMF_MAX_VALUES:
+            self.values.append(value)
+            return
+        slot = random.randrange(self.count)
+        if slot < _EMF_MAX_VALUES:
+            self.values[slot] = value
+
+
+class Metrics:
+    """Contadores y distribuciones de una invocación; flush() escribe una línea EMF."""
+
+    def __init__(self, service, namespace=None, dimensions=None):
+        self.service = service
+        self.namespace = namespace or METRICS_NAMESPACE
+        self._dimensions = {}
+        self._properties = {}
+        self._counters = {}
+        self._distributions = {}
+        # {(namespace, ((dimensión, valor), ...)): {nombre: _Distribution}}
+        self._groups = {}
+        # Los handlers con ThreadPoolExecutor registran desde varios hilos
+        self._lock = threading.Lock()
+        self.dimension(SERVICE_DIMENSION, service)
+        for name, value in (dimensions or {}).items():
+            self.dimension(name, value)
+
+    def dimension(self, name, value):
+        """Añade una dimensión; si no está permitida o es de alta cardinalidad, queda como propiedad."""
+        value = str(value)
+        if len(self._dimensions) < _EMF_MAX_DIMENSIONS and _accept_dimension(name, value):
+            self._dimensions[name] = value
+        else:
+            self._properties[name] = value
+
+    def property(self, name, value):
+        """Campo del log que no es métrica ni dimensión (p.ej. un id de job)."""
+        self._properties[name] = value
+
+    def get_property(self, name, default=None):
+        return self._properties.get(name, default)
+
+    def count(self, name, value=1, unit=COUNT):
+        with self._lock:
+            entry = self._counters.get(name)
+            if entry is None:
+                self._counters[name] = [value, unit]
+            else:
+                entry[0] += value
+
+    def observe(self, name, value, unit=MILLISECONDS, namespace=None, dimensions=None):
+        """
+        Añade un valor a la distribución `name`. Con namespace/dimensions va en su
+        propia directiva; esas dimensiones las fija el llamador y no se filtran.
+        """
+        with self._lock:
+            if namespace is None and not dimensions:
+                target = self._distributions
+            else:
+                key = (namespace or self.namespace, tuple(sorted((dimensions or {}).items())))
+                target = self._groups.setdefault(key, {})
+            dist = target.get(name)
+            if dist is None:
+                dist = target[name] = _Distribution(unit)
+            dist.add(value)
+
+    @contextmanager
+    def timer(self, name):
+        """Mide en ms el bloque como distribución `name`."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, round((time.perf_counter() - started) * 1000, 2))
+
+    def records_in(self, n):
+        self.count("RecordsIn", n)
+        self.observe("BatchSize", n, unit=COUNT)
+
+    def records_out(self, n=1):
+        self.count("RecordsOut", n)
+
+    def cache(self, hit):
+        self.count("CacheHits" if hit else "CacheMisses")
+
+    def call(self, operation, latency_ms, retries=0, error=False):
+        """Una llamada a un servicio externo (la registran los eventos de botocore)."""
+        self.observe(f"{operation}Latency", round(latency_ms, 2))
+        if retries:
+            self.count("Retries", retries)
+        if error:
+            self.count(f"{operation}Errors")
+
+    def to_emf(self):
+        """Documento EMF con lo acumulado, o None si no hay nada que publicar."""
+        documents = self.to_emf_documents()
+        return documents[0] if documents else None
+
+    def to_emf_documents(self):
+        """
+        Documentos EMF con lo acumulado: normalmente uno. Un grupo (namespace,
+        dimensiones) cuyas dimensiones o nombres chocan con lo ya escrito (p.ej.
+        dos saltos en la misma invocación) va en un documento aparte.
+        """
+        with self._lock:
+            counters = dict(self._counters)
+            distributions = dict(self._distributions)
+            groups = {key: dict(dists) for key, dists in self._groups.items()}
+        if not counters and not distributions and not groups:
+            return []
+
+        document = dict(self._properties)
+        definitions = []
+        for name, (value, unit) in counters.items():
+            definitions.append({"Name": name, "Unit": unit})
+            document[name] = value
+        for name, dist in distributions.items():
+            definitions.append({"Name": name, "Unit": dist.unit})
+            document[name] = dist.values
+        document.update(self._dimensions)
+        directives = []
+        if definitions:
+            # Más de 100 métricas: las sobrantes quedan como propiedades
+            directives.append({
+                "Namespace": self.namespace,
+                "Dimensions": [list(self._dimensions)],
+                "Metrics": definitions[:_EMF_MAX_METRICS],
+            })
+        documents = [document]
+        for (namespace, dimensions), dists in groups.items():
+            target = document
+            if any(target.get(d, v) != v for d, v in dimensions) or any(name in target for name in dists):
+                target = dict(self._properties)
+                documents.append(target)
+            target.update(dimensions)
+            for name, dist in dists.items():
+                target[name] = dist.values
+            directive = {
+                "Namespace": namespace,
+                "Dimensions": [[d for d, _ in dimensions]],
+                "Metrics": [{"Name": name, "Unit": dist.unit} for name, dist in dists.items()][:_EMF_MAX_METRICS],
+            }
+            if target is document:
+                directives.append(directive)
+            else:
+                target["_aws"] = {"Timestamp": _now_ms(), "CloudWatchMetrics": [directive]}
+        document["_aws"] = {"Timestamp": _now_ms(), "CloudWatchMetrics": directives}
+        return documents
+
+    def flush(self):
+        """Escribe la línea EMF de la invocación (una por grupo que no cabe en ella) y limpia los acumulados."""
+        documents = self.to_emf_documents() if METRICS_ENABLED else []
+        with self._lock:
+            self._counters = {}
+            self._distributions = {}
+            self._groups = {}
+        for document in documents:
+            print(json.dumps(document, separators=(",", ":"), default=str))
+
+
+def start(service, **dimensions):
+    """Crea las métricas de una invocación y las deja como actuales (current())."""
+    global _current
+    _current = Metrics(service, dimensions=dimensions)
+    return _current
+
+
+def current():
+    """Métricas de la invocación en curso (fuera de un handler, unas sin publicar)."""
+    global _current
+    if _current is None:
+        _current = Metrics(os.environ.get("AWS_LAMBDA_FUNCTION_NAME", "local"))
+    return _current
+
+
+def handler(service, **dimensions):
+    """
+    Decorador de lambda_handler: métricas nuevas por invocación (Invocations,
+    ColdStart, Errors si lanza) y flush() al terminar, también con excepción.
+    """
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(event, context):
+            global _cold_start
+            m = start(service, **dimensions)
+            m.count("Invocations")
+            if _cold_start:
+                m.count("ColdStart")
+                _cold_start = False
+            try:
+                return fn(event, context)
+            except Exception:
+                m.count("Errors")
+                raise
+            finally:
+                m.flush()
+        return wrapper
+    return decorate
+
+
+# --- Instrumentación de clientes botocore ---
+
+_CONTEXT_KEY = "router_metrics"
+
+
+def _before_call(model=None, context=None, **_):
+    if context is not None and model is not None:
+        context[_CONTEXT_KEY] = (model.name, time.perf_counter())
+
+
+def _after_call(http_response=None, parsed=None, context=None, **_):
+    started = (context or {}).get(_CONTEXT_KEY)
+    if not started:
+        return
+    operation, t0 = started
+    retries = ((parsed or {}).get("ResponseMetadata") or {}).get("RetryAttempts", 0)
+    error = http_response is not None and http_response.status_code >= 300
+    current().call(operation, (time.perf_counter() - t0) * 1000, retries=retries, error=error)
+
+
+def _after_call_error(context=None, **_):
+    started = (context or {}).get(_CONTEXT_KEY)
+    if started:
+        operation, t0 = started
+        current().call(operation, (time.perf_counter() - t0) * 1000, error=True)
+
+
+def instrument(obj):
+    """
+    Registra latencia, reintentos y errores de cada llamada de un cliente (o
+    resource) boto3 en las métricas actuales. Los objetos sin eventos de
+    botocore (p.ej. clientes falsos de los tests) se devuelven tal cual.
+    """
+    meta = getattr(obj, "meta", None)
+    inner = getattr(meta, "client", None)
+    events = getattr(getattr(inner, "meta", None) or meta, "events", None)
+    if events is None or not METRICS_ENABLED:
+        return obj
+    # Con el nombre más específico y primero: antes de cualquier handler que
+    # responda sin llamar al servicio (p.ej. botocore Stubber)
+    events.register_first("before-call.*.*", _before_call, unique_id=f"{_CONTEXT_KEY}-before")
+    events.register("after-call", _after_call, unique_id=f"{_CONTEXT_KEY}-after")
+    events.register("after-call-error", _after_call_error, unique_id=f"{_CONTEXT_KEY}-error")
+    return obj
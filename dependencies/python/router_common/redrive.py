@@ -0,0 +1,338 @@
+"""
+Redrive de una DLQ a su cola de origen con ritmo limitado.
+
+    stats = redrive.redrive(dlq_url, rate=50, workers=4)
+
+  - Varios bucles de receive_message en paralelo (workers), 10 mensajes por
+    llamada con long polling; los mensajes reenviados se borran de la DLQ con
+    delete_message_batch.
+  - Reenvío con send_message_batch al ritmo de un TokenBucket compartido
+    (rate mensajes/s entre todos los workers), para no volver a saturar a
+    quien consume la cola (p.ej. Step Functions tras un incidente).
+  - Los MessageAttributes se conservan: el ContentEncoding de
+    router_common.codec sigue describiendo el cuerpo reenviado.
+  - keep(message) decide qué se reenvía; los descartados se quedan en la DLQ
+    (o se borran con delete_skipped). transform(message) devuelve los
+    campos a cambiar (Body, MessageAttributes) antes del envío, o None para
+    descartarlo. Un Body nuevo (texto JSON u objeto) sin MessageAttributes se
+    vuelve a codificar con codec.encode_sqs.
+  - Solo se borra de la DLQ lo que SQS confirma como enviado: un fallo de
+    envío deja el mensaje en la DLQ para la siguiente pasada.
+
+Los mensajes recibidos quedan invisibles visibility_timeout segundos: en una
+misma pasada no se vuelven a recibir los descartados ni los fallidos, y la
+pasada termina cuando los workers encuentran la cola vacía. Si receive_message
+falla REDRIVE_MAX_RECEIVE_ERRORS veces seguidas (permisos, cola inexistente...)
+la pasada se aborta.
+"""
+import importlib
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from router_common import clients, codec
+from router_common.ratelimit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+REDRIVE_RATE = float(os.environ.get("REDRIVE_RATE", "50"))
+REDRIVE_WORKERS = int(os.environ.get("REDRIVE_WORKERS", "4"))
+REDRIVE_VISIBILITY_TIMEOUT = int(os.environ.get("REDRIVE_VISIBILITY_TIMEOUT", "300"))
+REDRIVE_PROGRESS_SECONDS = float(os.environ.get("REDRIVE_PROGRESS_SECONDS", "10"))
+REDRIVE_MAX_RECEIVE_ERRORS = int(os.environ.get("REDRIVE_MAX_RECEIVE_ERRORS", "5"))
+
+# Límites de SQS por llamada
+_BATCH = 10
+_WAIT_SECONDS = 2
+# Recepciones vacías seguidas (por worker) para dar la cola por vacía
+_EMPTY_RECEIVES = 2
+_MAX_ERRORS = 20
+
+
+class RedriveStats:
+    """Contadores de una pasada, compartidos por los workers."""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.received = 0
+        self.sent = 0
+        self.skipped = 0
+        self.failed = 0
+        self.errors = []
+        self.drained = False
+        self.aborted = False
+        self._lock = threading.Lock()
+
+    def add(self, **counts):
+        with self._lock:
+            for name, value in counts.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def error(self, message):
+        with self._lock:
+            self.failed += 1
+            if len(self.errors) < _MAX_ERRORS:
+                self.errors.append(message)
+
+    def to_dict(self):
+        elapsed = time.monotonic() - self.started
+        return {
+            "received": self.received,
+            "sent": self.sent,
+            "skipped": self.skipped,
+            "failed": self.failed,
+            "drained": self.drained,
+            "aborted": self.aborted,
+            "elapsedSeconds": round(elapsed, 1),
+            "rate": round(self.sent / elapsed, 1) if elapsed > 0 else 0.0,
+            "errors": list(self.errors),
+        }
+
+
+def payload(message):
+    """Cuerpo decodificado (codec/ContentEncoding) de un mensaje recibido, para filtros y transformaciones."""
+    return codec.decode_sqs(message)
+
+
+def contains(text):
+    """keep() que reenvía solo los mensajes cuyo cuerpo decodificado contiene `text`."""
+    def keep(message):
+        data = payload(message)
+        return text in (data if isinstance(data, str) else json.dumps(data, ensure_ascii=False))
+    return keep
+
+
+def load_callable(path):
+    """"paquete.modulo:funcion" -> función, para filtros y transformaciones a medida."""
+    module, _, name = path.partition(":")
+    if not name:
+        raise ValueError(f"expected module:function, got {path!r}")
+    return getattr(importlib.import_module(module), name)
+
+
+def source_queue(dlq_url, sqs=None):
+    """Cola de origen de una DLQ (la única cuya redrive policy apunta a ella)."""
+    sqs = sqs or clients.client("sqs")
+    urls = sqs.list_dead_letter_source_queues(QueueUrl=dlq_url).get("queueUrls", [])
+    if len(urls) != 1:
+        raise ValueError(f"{dlq_url} is the DLQ of {len(urls)} queues; pass the target queue explicitly")
+    return urls[0]
+
+
+def _transformed(message, changed):
+    """
+    Mensaje con los cambios de transform(). Si cambia el Body sin MessageAttributes
+    nuevos, el ContentEncoding original ya no lo describe: se vuelve a codificar.
+    """
+    # El ReceiptHandle sigue siendo el del mensaje recibido
+    result = {**message, **changed, "ReceiptHandle": message["ReceiptHandle"]}
+    if "Body" in changed and "MessageAttributes" not in changed:
+        body = changed["Body"]
+        data = codec.decode(body) if isinstance(body, (str, bytes)) else body
+        if isinstance(data, str) and data == body:
+            # Texto plano (no JSON): viaja tal cual
+            encoded = {"MessageBody": body}
+        else:
+            encoded = codec.encode_sqs(data)
+        attributes = {k: v for k, v in (message.get("MessageAttributes") or {}).items() if k != codec.ATTRIBUTE}
+        attributes.update(encoded.get("MessageAttributes", {}))
+        result["Body"] = encoded["MessageBody"]
+        result["MessageAttributes"] = attributes
+    return result
+
+
+def _entry(index, message, fifo):
+    entry = {"Id": str(index), "MessageBody": message["Body"]}
+    attributes = {
+        name: {k: v for k, v in value.items() if k in ("DataType", "StringValue", "BinaryValue")}
+        for name, value in (message.get("MessageAttributes") or {}).items()
+    }
+    if attributes:
+        entry["MessageAttributes"] = attributes
+    if fifo:
+        system = message.get("Attributes") or {}
+        entry["MessageGroupId"] = system.get("MessageGroupId", "redrive")
+        entry["MessageDeduplicationId"] = system.get("MessageDeduplicationId", message["MessageId"])
+    return entry
+
+
+class _Redrive:
+    def __init__(self, sqs, dlq_url, target_url, limiter, stats, keep, transform, delete_skipped,
+                 dry_run, max_messages, deadline, visibility_timeout):
+        self.sqs = sqs
+        self.dlq_url = dlq_url
+        self.target_url = target_url
+        self.fifo = target_url.endswith(".fifo")
+        self.limiter = limiter
+        self.stats = stats
+        self.keep = keep
+        self.transform = transform
+        self.delete_skipped = delete_skipped
+        self.dry_run = dry_run
+        self.remaining = max_messages
+        self.deadline = deadline
+        self.visibility_timeout = visibility_timeout
+        self.stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def _claim(self):
+        """Cuántos mensajes puede recibir este worker (max_messages repartido entre todos)."""
+        if self.remaining is None:
+            return _BATCH
+        with self._lock:
+            n = min(_BATCH, self.remaining)
+            self.remaining -= n
+            return n
+
+    def _unclaim(self, n):
+        if self.remaining is not None and n > 0:
+            with self._lock:
+                self.remaining += n
+
+    def _out_of_time(self):
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+    def worker(self):
+        empty = errors = 0
+        while not self.stop.is_set() and not self._out_of_time():
+            n = self._claim()
+            if n <= 0:
+                return
+            try:
+                messages = self.sqs.receive_message(
+                    QueueUrl=self.dlq_url,
+                    MaxNumberOfMessages=n,
+                    WaitTimeSeconds=_WAIT_SECONDS,
+                    VisibilityTimeout=self.visibility_timeout,
+                    MessageAttributeNames=["All"],
+                    AttributeNames=["MessageGroupId", "MessageDeduplicationId"],
+                ).get("Messages", [])
+            except Exception as e:
+                self._unclaim(n)
+                self.stats.error(f"receive: {e}")
+                logger.warning("Receive from %s failed", self.dlq_url, exc_info=True)
+                errors += 1
+                if errors >= REDRIVE_MAX_RECEIVE_ERRORS:
+                    logger.error("Aborting redrive of %s after %d receive errors in a row", self.dlq_url, errors)
+                    self.stats.aborted = True
+                    self.stop.set()
+                    return
+                time.sleep(1)
+                continue
+            errors = 0
+            self._unclaim(n - len(messages))
+            if not messages:
+                empty += 1
+                if empty >= _EMPTY_RECEIVES:
+                    return
+                continue
+            empty = 0
+            self.stats.add(received=len(messages))
+            self.process(messages)
+
+    def process(self, messages):
+        selected, skipped = [], []
+        for message in messages:
+            try:
+                if self.keep is not None and not self.keep(message):
+                    skipped.append(message)
+                    continue
+                if self.transform is not None:
+                    changed = self.transform(message)
+                    if changed is None:
+                        skipped.append(message)
+                        continue
+                    message = _transformed(message, changed)
+                selected.append(message)
+            except Exception as e:
+                # Un filtro/transformación que falla deja el mensaje en la DLQ
+                self.stats.error(f"{message.get('MessageId')}: {e}")
+        self.stats.add(skipped=len(skipped))
+        if self.dry_run:
+            self.stats.add(sent=len(selected))
+            return
+        if self.delete_skipped:
+            self._delete(skipped)
+        if not selected:
+            return
+
+        entries = [_entry(i, m, self.fifo) for i, m in enumerate(selected)]
+        for _ in entries:
+            self.limiter.acquire()
+        try:
+            response = self.sqs.send_message_batch(QueueUrl=self.target_url, Entries=entries)
+        except Exception as e:
+            for m in selected:
+                self.stats.error(f"{m.get('MessageId')}: send: {e}")
+            return
+        for failure in response.get("Failed", []):
+            message = selected[int(failure["Id"])]
+            self.stats.error(f"{message.get('MessageId')}: {failure.get('Code')} {failure.get('Message', '')}".strip())
+        sent = [selected[int(ok["Id"])] for ok in response.get("Successful", [])]
+        self.stats.add(sent=len(sent))
+        self._delete(sent)
+
+    def _delete(self, messages):
+        if not messages:
+            return
+        try:
+            response = self.sqs.delete_message_batch(
+                QueueUrl=self.dlq_url,
+                Entries=[{"Id": str(i), "ReceiptHandle": m["ReceiptHandle"]} for i, m in enumerate(messages)],
+            )
+        except Exception as e:
+            # Ya reenviados: reaparecerán en la DLQ y se reenviarían dos veces
+            self.stats.error(f"delete: {e}")
+            return
+        for failure in response.get("Failed", []):
+            self.stats.error(f"{messages[int(failure['Id'])].get('MessageId')}: delete: {failure.get('Code')}")
+
+
+def redrive(dlq_url, target_url=None, rate=None, workers=None, keep=None, transform=None,
+            delete_skipped=False, dry_run=False, max_messages=None, time_limit=None,
+            visibility_timeout=None, progress=None, progress_seconds=None, sqs=None):
+    """
+    Reenvía los mensajes de dlq_url a target_url (por defecto, su cola de
+    origen) y devuelve las estadísticas de la pasada (RedriveStats.to_dict()).
+
+    rate <= 0 no limita. time_limit (segundos) corta la pasada a tiempo en
+    Lambda; progress(stats_dict) se llama cada progress_seconds.
+    """
+    sqs = sqs or clients.client("sqs", max_pool_connections=max(clients.MAX_POOL_CONNECTIONS, 2 * (workers or REDRIVE_WORKERS)))
+    target_url = target_url or source_queue(dlq_url, sqs)
+    workers = workers or REDRIVE_WORKERS
+    rate = REDRIVE_RATE if rate is None else rate
+    stats = RedriveStats()
+    run = _Redrive(
+        sqs, dlq_url, target_url, TokenBucket(rate), stats, keep, transform, delete_skipped, dry_run,
+        max_messages, None if time_limit is None else time.monotonic() + time_limit,
+        visibility_timeout or REDRIVE_VISIBILITY_TIMEOUT,
+    )
+    logger.info("Redriving %s -> %s at %s msg/s with %d workers", dlq_url, target_url, rate or "unlimited", workers)
+
+    interval = progress_seconds or REDRIVE_PROGRESS_SECONDS
+    next_report = time.monotonic() + interval
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(run.worker) for _ in range(workers)]
+        try:
+            while not all(f.done() for f in futures):
+                time.sleep(min(interval, 0.5))
+                if progress and time.monotonic() >= next_report:
+                    next_report += interval
+                    progress(stats.to_dict())
+        except KeyboardInterrupt:
+            run.stop.set()
+            raise
+        for f in futures:
+            f.result()
+
+    # Vacía si ningún worker paró por tiempo, por max_messages ni por errores
+    stats.drained = (not stats.aborted and not run._out_of_time()
+                     and (run.remaining is None or run.remaining > 0))
+    result = stats.to_dict()
+    if progress:
+        progress(result)
+    return result
@@ -0,0 +1,109 @@
+"""
+Caché de secretos de Secrets Manager, por contenedor y con TTL.
+
+- get_secret / get_secret_json devuelven el valor cacheado mientras no expire.
+- Pasado SECRETS_CACHE_REFRESH_RATIO del TTL, el valor se sigue sirviendo y se
+  refresca en segundo plano (una sola vez por secreto).
+- force_refresh=True lo vuelve a leer de forma síncrona, p.ej. tras un 401.
+"""
+import os
+import json
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+SECRETS_CACHE_TTL_SECONDS = int(os.environ.get("SECRETS_CACHE_TTL_SECONDS", "300"))
+SECRETS_CACHE_REFRESH_RATIO = float(os.environ.get("SECRETS_CACHE_REFRESH_RATIO", "0.8"))
+
+_lock = threading.Lock()
+# secret_id -> {"value", "fetched_at", "refresh_at", "expires_at", "refreshing"}
+_entries = {}
+# secret_id -> Lock: evita que varios hilos lean el mismo secreto a la vez
+_fetch_locks = {}
+_client = None
+
+
+def _get_client():
+    global _client
+    if _client is None:
+        from router_common import clients
+        _client = clients.client("secretsmanager")
+    return _client
+
+
+def _fetch(secret_id):
+    resp = _get_client().get_secret_value(SecretId=secret_id)
+    value = resp.get("SecretString")
+    if value is None:
+        value = resp.get("SecretBinary")
+    if value is None:
+        raise RuntimeError(f"Secret {secret_id} has no value")
+    return value
+
+
+def _store(secret_id, value, ttl):
+    now = time.monotonic()
+    _entries[secret_id] = {
+        "value": value,
+        "fetched_at": now,
+        "refresh_at": now + ttl * SECRETS_CACHE_REFRESH_RATIO,
+        "expires_at": now + ttl,
+        "refreshing": False,
+    }
+
+
+def _refresh_in_background(secret_id, ttl):
+    try:
+        value = _fetch(secret_id)
+        with _lock:
+            _store(secret_id, value, ttl)
+        logger.info("Secret %s refreshed in background", secret_id)
+    except Exception:
+        logger.warning("Background refresh failed for secret %s", secret_id, exc_info=True)
+        with _lock:
+            entry = _entries.get(secret_id)
+            if entry:
+                entry["refreshing"] = False
+
+
+def get_secret(secret_id, ttl=None, force_refresh=False):
+    """Devuelve el valor (SecretString o SecretBinary) de secret_id usando la caché."""
+    ttl = SECRETS_CACHE_TTL_SECONDS if ttl is None else ttl
+    requested_at = time.monotonic()
+
+    with _lock:
+        entry = _entries.get(secret_id)
+        if entry and not force_refresh and requested_at < entry["expires_at"]:
+            if requested_at >= entry["refresh_at"] and not entry["refreshing"]:
+                entry["refreshing"] = True
+                threading.Thread(target=_refresh_in_background, args=(secret_id, ttl), daemon=True).start()
+            return entry["value"]
+        fetch_lock = _fetch_locks.setdefault(secret_id, threading.Lock())
+
+    with fetch_lock:
+        # Otro hilo pudo haberlo leído mientras esperábamos el lock
+        with _lock:
+            entry = _entries.get(secret_id)
+            if entry and entry["fetched_at"] >= requested_at:
+                return entry["value"]
+        value = _fetch(secret_id)
+        with _lock:
+            _store(secret_id, value, ttl)
+        logger.info("Secret %s fetched from Secrets Manager", secret_id)
+        return value
+
+
+def get_secret_json(secret_id, ttl=None, force_refresh=False):
+    """Igual que get_secret pero decodificando el valor como JSON."""
+    return json.loads(get_secret(secret_id, ttl=ttl, force_refresh=force_refresh))
+
+
+def invalidate(secret_id=None):
+    """Elimina un secreto (o todos) de la caché."""
+    with _lock:
+        if secret_id is None:
+            _entries.clear()
+        else:
+            _entries.pop(secret_id, None)
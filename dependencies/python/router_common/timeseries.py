@@ -0,0 +1,79 @@
+"""
+Buffer compacto de series temporales para métricas de CloudWatch.
+
+Cada serie guarda timestamps (ms, array 'q') y valores (array 'd') ordenados,
+de forma que se pueden fusionar solo los puntos nuevos de cada consulta,
+recortar la ventana y serializar a una cadena corta para Valkey. fetched_through
+(ms) recuerda hasta dónde se consultó, aunque la consulta no devolviera puntos.
+"""
+import base64
+import struct
+from array import array
+from bisect import bisect_left, bisect_right
+
+# Número de puntos y fetched_through (-1 si no se ha consultado)
+_HEADER = struct.Struct("<Iq")
+
+
+class SeriesBuffer:
+    """Serie ordenada por timestamp; los puntos con el mismo timestamp se sustituyen."""
+
+    __slots__ = ("timestamps", "values", "fetched_through")
+
+    def __init__(self, timestamps=(), values=(), fetched_through=None):
+        self.timestamps = array("q", timestamps)
+        self.values = array("d", values)
+        self.fetched_through = fetched_through
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    @property
+    def last_timestamp(self):
+        return self.timestamps[-1] if self.timestamps else None
+
+    def merge(self, timestamps, values, start=None):
+        """
+        Fusiona puntos recién consultados. Si se indica start (ms), el rango
+        [start, ∞) se considera autoritativo: los puntos antiguos en ese rango
+        se sustituyen (CloudWatch corrige el último periodo, aún incompleto).
+        """
+        incoming = {}
+        for ts, val in zip(timestamps, values):
+            incoming[int(ts)] = float(val)
+        if not incoming and start is None:
+            return
+        cut = min(incoming) if start is None else min([int(start)] + list(incoming))
+        i = bisect_left(self.timestamps, cut)
+        del self.timestamps[i:]
+        del self.values[i:]
+        for ts in sorted(incoming):
+            self.timestamps.append(ts)
+            self.values.append(incoming[ts])
+
+    def trim(self, min_timestamp):
+        """Descarta los puntos anteriores a min_timestamp (ms)."""
+        i = bisect_left(self.timestamps, int(min_timestamp))
+        if i:
+            del self.timestamps[:i]
+            del self.values[:i]
+
+    def points(self, since=None):
+        """Pares (timestamp, valor); con since, solo los posteriores a ese ms."""
+        i = 0 if since is None else bisect_right(self.timestamps, int(since))
+        return zip(self.timestamps[i:], self.values[i:])
+
+    def dumps(self):
+        through = -1 if self.fetched_through is None else int(self.fetched_through)
+        raw = _HEADER.pack(len(self.timestamps), through) + self.timestamps.tobytes() + self.values.tobytes()
+        return base64.b64encode(raw).decode("ascii")
+
+    @classmethod
+    def loads(cls, data):
+        raw = base64.b64decode(data)
+        count, through = _HEADER.unpack_from(raw)
+        buf = cls(fetched_through=None if through < 0 else through)
+        offset = _HEADER.size
+        buf.timestamps.frombytes(raw[offset:offset + 8 * count])
+        buf.values.frombytes(raw[offset + 8 * count:offset + 16 * count])
+        return buf
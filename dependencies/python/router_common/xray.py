@@ -0,0 +1,30 @@
+"""
+Instrumentación X-Ray bajo demanda.
+
+patch_all() importa el SDK completo y parchea todo lo que soporta (requests,
+httplib, sqlite3, pymysql...) aunque el handler solo use botocore. patch()
+parchea únicamente las librerías indicadas, una sola vez por contenedor, y con
+XRAY_ENABLED=false (o AWS_XRAY_SDK_ENABLED=false) ni siquiera importa el SDK.
+"""
+import os
+
+_patched = set()
+
+
+def enabled():
+    for var in ("XRAY_ENABLED", "AWS_XRAY_SDK_ENABLED"):
+        if os.environ.get(var, "true").strip().lower() in ("false", "0", "no"):
+            return False
+    return True
+
+
+def patch(libraries=("botocore",)):
+    """Parchea solo `libraries` (nombres de aws_xray_sdk.core.patch). Devuelve si X-Ray está activo."""
+    if not enabled():
+        return False
+    pending = [lib for lib in libraries if lib not in _patched]
+    if pending:
+        from aws_xray_sdk.core import patch as xray_patch
+        xray_patch(pending)
+        _patched.update(pending)
+    return True